@@ -5,44 +5,410 @@ AI整合系統
 整合優先推薦學習資源系統與AI生成學習計劃
 """
 
+import copy
 import json
 import asyncio
+import time
+import uuid
 import aiohttp
-from typing import List, Dict, Optional, Tuple
+from typing import AsyncIterator, List, Dict, Optional, Tuple
 from dataclasses import asdict
 from learning_resources import (
     LearningResourcesDB, LearningResource, ResourceType, 
     DifficultyLevel, ResourceStatus
 )
 from contributor_management import ExtendedLearningResourcesDB
+from llm_cache import LLMResponseCache
+from circuit_breaker import CircuitBreaker
+from prompt_builder import PromptBuilder, PromptPlan
+from lookup_cache import LRUCache
+
+class IncrementalJSONArrayParser:
+    """從流式文本中逐個解析JSON數組的頂層對象
+    
+    只跟踪花括號深度和字符串狀態，一個對象的右花括號到達時即可解析，
+    無需等待整個數組；數組外的文字（如markdown代碼塊標記）被忽略。
+    """
+    
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._start: Optional[int] = None
+    
+    def feed(self, text: str) -> List[Dict]:
+        """追加文本，返回新完成的對象"""
+        self._buffer += text
+        items = []
+        for i in range(self._pos, len(self._buffer)):
+            ch = self._buffer[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"' and self._depth > 0:
+                self._in_string = True
+            elif ch == '{':
+                if self._depth == 0:
+                    self._start = i
+                self._depth += 1
+            elif ch == '}' and self._depth > 0:
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        item = json.loads(self._buffer[self._start:i + 1])
+                    except ValueError:
+                        item = None
+                    if isinstance(item, dict):
+                        items.append(item)
+                    self._start = None
+        self._pos = len(self._buffer)
+        
+        # 丟棄已解析完的前綴
+        if self._depth == 0:
+            self._buffer = ""
+            self._pos = 0
+        elif self._start:
+            self._buffer = self._buffer[self._start:]
+            self._pos -= self._start
+            self._start = 0
+        return items
 
 class AIResourceRecommender:
     """AI資源推薦系統"""
     
-    def __init__(self, db: ExtendedLearningResourcesDB, api_key: str):
+    # 向量相似度（0-1）折算到相關性分數的權重
+    VECTOR_SIMILARITY_WEIGHT = 3.0
+    
+    # LLM API的HTTP超時（秒）：建立連接、兩次讀取之間、整個請求
+    CONNECT_TIMEOUT = 5.0
+    READ_TIMEOUT = 60.0
+    TOTAL_TIMEOUT = 90.0
+    
+    # 連接池：總連接數、單主機連接數、空閒連接保活秒數、DNS緩存秒數
+    POOL_LIMIT = 100
+    POOL_LIMIT_PER_HOST = 20
+    KEEPALIVE_TIMEOUT = 75.0
+    DNS_CACHE_TTL = 300
+    
+    # 每個推薦請求的延遲預算（秒，p99目標）；超時立即返回策展資源，LLM調用在後台完成
+    LATENCY_BUDGET = 8.0
+    
+    # 推薦結果的來源
+    RECOMMENDATION_SOURCES = ("curated", "llm", "cache", "fallback", "deadline", "circuit_open")
+    
+    # 策展覆蓋度路由：置信度不低於閾值時只返回策展資源，不調用LLM（閾值大於1即關閉）
+    COVERAGE_THRESHOLD = 0.75
+    # 需要覆蓋的策展推薦數（與merge_recommendations保留的策展資源數一致）及各分項權重
+    COVERAGE_SLOTS = 6
+    COVERAGE_WEIGHTS = {"relevance": 0.4, "count": 0.2, "difficulty": 0.15, "materials": 0.25}
+    LEVEL_DIFFICULTY = {
+        "beginner": DifficultyLevel.BEGINNER,
+        "intermediate": DifficultyLevel.INTERMEDIATE,
+        "advanced": DifficultyLevel.ADVANCED,
+        "expert": DifficultyLevel.EXPERT
+    }
+    
+    # 推薦句柄：/api/ai/recommend返回的結果在服務端保留的條數和秒數，供generate-plan復用
+    HANDLE_CACHE_SIZE = 10000
+    HANDLE_TTL = 1800.0
+    
+    def __init__(self, db: ExtendedLearningResourcesDB, api_key: str,
+                 connect_timeout: Optional[float] = None,
+                 read_timeout: Optional[float] = None,
+                 total_timeout: Optional[float] = None,
+                 response_cache: Optional[LLMResponseCache] = None,
+                 latency_budget: Optional[float] = None,
+                 circuit_breaker: Optional[CircuitBreaker] = None,
+                 prompt_builder: Optional[PromptBuilder] = None,
+                 coverage_threshold: Optional[float] = None):
         self.db = db
         self.api_key = api_key
         self.api_url = "https://api.aimlapi.com/v1/chat/completions"
+        self.response_cache = response_cache or LLMResponseCache(db)
+        self.prompt_builder = prompt_builder or PromptBuilder()
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+        self.latency_budget = self.LATENCY_BUDGET if latency_budget is None else latency_budget
+        self.coverage_threshold = self.COVERAGE_THRESHOLD if coverage_threshold is None else coverage_threshold
+        # 進行中的推薦任務（按規範化請求鍵），以及合併統計和各來源的請求數
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.coalescing_stats = {"started": 0, "coalesced": 0}
+        self.source_stats = {source: 0 for source in self.RECOMMENDATION_SOURCES}
+        self.recommendation_handles = LRUCache(self.HANDLE_CACHE_SIZE, self.HANDLE_TTL)
+        self.timeout = aiohttp.ClientTimeout(
+            total=total_timeout or self.TOTAL_TIMEOUT,
+            connect=connect_timeout or self.CONNECT_TIMEOUT,
+            sock_read=read_timeout or self.READ_TIMEOUT
+        )
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
     
-    async def get_ai_recommendations(self, user_description: str, 
+    async def start(self):
+        """建立共享的HTTP會話（服務啟動時調用；未調用時在首次請求時建立）"""
+        loop = asyncio.get_running_loop()
+        if self._session is not None and not self._session.closed:
+            if self._session_loop is loop:
+                return
+            # 會話綁定在創建它的事件循環上，換了循環需要重建
+            await self.close()
+        
+        connector = aiohttp.TCPConnector(
+            limit=self.POOL_LIMIT,
+            limit_per_host=self.POOL_LIMIT_PER_HOST,
+            keepalive_timeout=self.KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=self.DNS_CACHE_TTL,
+            use_dns_cache=True
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=self.timeout,
+            headers={
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {self.api_key}"
+            }
+        )
+        self._session_loop = loop
+    
+    async def close(self):
+        """關閉共享的HTTP會話及其連接池（服務退出時調用）"""
+        session, self._session = self._session, None
+        self._session_loop = None
+        if session is not None and not session.closed:
+            await session.close()
+    
+    async def get_session(self) -> aiohttp.ClientSession:
+        """返回共享的HTTP會話，連接在多次請求之間復用"""
+        if self._session is None or self._session.closed or self._session_loop is not asyncio.get_running_loop():
+            await self.start()
+        return self._session
+    
+    async def get_ai_recommendations(self, user_description: str,
                                    topic: str, level: str, duration: int,
                                    intensity: str, materials: List[str]) -> List[Dict]:
         """獲取AI推薦的學習資源"""
+        result = await self.get_recommendation_result(
+            user_description, topic, level, duration, intensity, materials
+        )
+        return result["recommendations"]
+    
+    async def get_recommendation_result(self, user_description: str,
+                                        topic: str, level: str, duration: int,
+                                        intensity: str, materials: List[str],
+                                        latency_budget: Optional[float] = None) -> Dict:
+        """獲取推薦及其來源，返回{"recommendations", "source", "elapsed_ms", "recommendation_id"}
+        
+        規範化後相同的並發請求共享同一個進行中的任務（single-flight），只調用一次LLM。
+        等待超過延遲預算（latency_budget，默認self.latency_budget，0表示不限）時立即返回
+        策展資源的降級推薦；任務不取消，在後台完成並寫入響應緩存，下一次相同請求即可命中。
+        
+        source：curated（策展資源覆蓋充分，未調用LLM）、llm（調用LLM）、cache（響應緩存）、
+        fallback（LLM調用失敗）、deadline（超出預算）、circuit_open（熔斷器打開，未調用LLM）
+        """
+        started = time.perf_counter()
+        key = self.request_key(user_description, topic, level, duration, intensity, materials)
+        loop = asyncio.get_running_loop()
+        
+        task = self._inflight.get(key)
+        if task is not None and task.get_loop() is loop:
+            self.coalescing_stats["coalesced"] += 1
+        else:
+            task = loop.create_task(self._generate_recommendations(
+                user_description, topic, level, duration, intensity, materials
+            ))
+            self._inflight[key] = task
+            self.coalescing_stats["started"] += 1
+            
+            def forget(finished: asyncio.Task):
+                if self._inflight.get(key) is finished:
+                    del self._inflight[key]
+            
+            task.add_done_callback(forget)
         
+        budget = self.latency_budget if latency_budget is None else latency_budget
+        try:
+            # shield：等待者超時或斷開時，任務繼續為其他等待者運行並寫入緩存
+            if budget and budget > 0:
+                recommendations, source = await asyncio.wait_for(asyncio.shield(task), budget)
+            else:
+                recommendations, source = await asyncio.shield(task)
+            # 結果是可變的字典列表，每個等待者拿到自己的副本
+            recommendations = copy.deepcopy(recommendations)
+        except asyncio.TimeoutError:
+            db_resources = await self.get_database_resources(user_description, topic, level)
+            recommendations = await self.get_fallback_recommendations(db_resources, user_description)
+            source = "deadline"
+        
+        self.source_stats[source] += 1
+        return {
+            "recommendations": recommendations,
+            "source": source,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+            "recommendation_id": self.store_recommendations(key, recommendations)
+        }
+    
+    def store_recommendations(self, request_key: str, recommendations: List[Dict]) -> str:
+        """保存推薦結果，返回句柄（HANDLE_TTL秒內有效）"""
+        handle = uuid.uuid4().hex
+        self.recommendation_handles.put(handle, (request_key, copy.deepcopy(recommendations)))
+        return handle
+    
+    def get_stored_recommendations(self, handle: str, request_key: str) -> Optional[List[Dict]]:
+        """按句柄取回推薦結果；句柄過期、不存在或屬於不同的請求時返回None"""
+        entry = self.recommendation_handles.get(handle)
+        if entry is None or entry[0] != request_key:
+            return None
+        return copy.deepcopy(entry[1])
+    
+    def get_routing_stats(self) -> Dict:
+        """各來源的請求數，以及只用策展資源、沒有調用上游的請求比例"""
+        sources = dict(self.source_stats)
+        total = sum(sources.values())
+        no_upstream = sources["curated"] + sources["cache"] + sources["circuit_open"]
+        return {
+            "requests": total,
+            "sources": sources,
+            "curated_only_ratio": sources["curated"] / total if total else 0.0,
+            "no_upstream_ratio": no_upstream / total if total else 0.0
+        }
+    
+    def curated_coverage(self, db_resources: List[LearningResource], interests: List[str],
+                         level: str, materials: List[str]) -> Dict:
+        """策展資源對請求的覆蓋度，返回各分項（0-1）和加權後的confidence
+        
+        - relevance：前COVERAGE_SLOTS個資源的相關性分數，以每個興趣都命中標籤和標題/描述為滿分
+        - count：相關性達到滿分一半的資源佔COVERAGE_SLOTS的比例
+        - difficulty：難度與用戶水平的接近程度（相差一級計一半）
+        - materials：資源類型屬於偏好材料類型的比例（未指定材料類型時為1）
+        """
+        top = db_resources[:self.COVERAGE_SLOTS]
+        if not top:
+            components = dict.fromkeys(self.COVERAGE_WEIGHTS, 0.0)
+            components["confidence"] = 0.0
+            return components
+        
+        full_score = 1.5 * max(1, len(interests))
+        relevance = [min(resource.ai_relevance_score / full_score, 1.0) for resource in top]
+        
+        target = self.LEVEL_DIFFICULTY.get(level.lower())
+        if target is None:
+            difficulty = 1.0
+        else:
+            difficulty = sum(
+                max(0.0, 1 - 0.5 * abs(resource.difficulty.value - target.value)) for resource in top
+            ) / len(top)
+        
+        wanted_types = {material.lower() for material in materials}
+        if wanted_types:
+            material_fit = sum(1 for resource in top if resource.resource_type.value in wanted_types) / len(top)
+        else:
+            material_fit = 1.0
+        
+        components = {
+            "relevance": sum(relevance) / self.COVERAGE_SLOTS,
+            "count": sum(1 for value in relevance if value >= 0.5) / self.COVERAGE_SLOTS,
+            "difficulty": difficulty,
+            "materials": material_fit
+        }
+        components["confidence"] = sum(
+            weight * components[name] for name, weight in self.COVERAGE_WEIGHTS.items()
+        )
+        return components
+    
+    def is_covered_by_curated(self, db_resources: List[LearningResource], user_description: str,
+                              topic: str, level: str, materials: List[str]) -> bool:
+        """策展資源是否足以單獨回答請求"""
+        interests = self.extract_interests(user_description, topic)
+        coverage = self.curated_coverage(db_resources, interests, level, materials)
+        return coverage["confidence"] >= self.coverage_threshold
+    
+    def request_key(self, user_description: str, topic: str, level: str, duration: int,
+                    intensity: str, materials: List[str]) -> str:
+        """規範化的請求鍵：忽略大小寫、多餘空白和材料類型的順序"""
+        def normalize(text) -> str:
+            return ' '.join(str(text).lower().split())
+        
+        return json.dumps([
+            normalize(user_description), normalize(topic), normalize(level), int(duration),
+            normalize(intensity), sorted(normalize(material) for material in materials)
+        ], ensure_ascii=False)
+    
+    async def _generate_recommendations(self, user_description: str, topic: str, level: str,
+                                        duration: int, intensity: str, materials: List[str]) -> Tuple[List[Dict], str]:
+        """生成推薦：數據庫檢索、LLM調用（經響應緩存）、合併；返回(推薦列表, 來源)"""
         # 首先從數據庫獲取相關資源
         db_resources = await self.get_database_resources(user_description, topic, level)
         
+        # 策展資源已充分覆蓋時不調用LLM
+        if self.is_covered_by_curated(db_resources, user_description, topic, level, materials):
+            return await self.get_fallback_recommendations(db_resources, user_description), "curated"
+        
         # 構建AI提示
-        prompt = self.create_ai_prompt(user_description, topic, level, duration, intensity, materials, db_resources)
+        plan = self.prompt_builder.build(user_description, topic, level, duration, intensity, materials, db_resources)
         
         try:
-            async with aiohttp.ClientSession() as session:
-                payload = {
-                    "model": "perplexity/sonar-pro",
-                    "messages": [
-                        {
-                            "role": "system",
-                            "content": """你是一個專業的學習顧問。你的任務是分析用戶的學習目標，並從提供的策展資源庫中選擇最相關的學習資源。
+            payload = self.build_llm_payload(plan.prompt, plan.max_tokens)
+            
+            # 相同的模型參數、提示詞和策展資源版本直接使用緩存的響應
+            cache_key = self.response_cache.make_key(payload, db_resources)
+            content = await asyncio.to_thread(self.response_cache.get, cache_key)
+            cached = content is not None
+            
+            if not cached:
+                # 熔斷器打開時不等待上游，直接降級
+                if not self.circuit_breaker.allow_request():
+                    return await self.get_fallback_recommendations(db_resources, user_description), "circuit_open"
+                
+                self.prompt_builder.record_sent(plan)
+                started = time.monotonic()
+                try:
+                    session = await self.get_session()
+                    async with session.post(self.api_url, json=payload) as response:
+                        if response.status != 200:
+                            self.circuit_breaker.record_failure(time.monotonic() - started)
+                            print(f"AI API錯誤: {response.status}")
+                            return await self.get_fallback_recommendations(db_resources, user_description), "fallback"
+                        data = await response.json()
+                        content = data["choices"][0]["message"]["content"]
+                except asyncio.CancelledError:
+                    self.circuit_breaker.release()
+                    raise
+                except Exception:
+                    self.circuit_breaker.record_failure(time.monotonic() - started)
+                    raise
+                self.circuit_breaker.record_success(time.monotonic() - started)
+            
+            # 清理JSON內容
+            json_content = self.clean_json_content(content)
+            
+            # 解析AI推薦（解析成功的響應才寫入緩存）
+            ai_recommendations = json.loads(json_content)
+            if not cached:
+                await asyncio.to_thread(self.response_cache.put, cache_key, content)
+            
+            # 合併數據庫資源和AI推薦
+            final_recommendations = await self.merge_recommendations(
+                db_resources, ai_recommendations, user_description
+            )
+            
+            return final_recommendations, "cache" if cached else "llm"
+        
+        except Exception as e:
+            print(f"AI API調用錯誤: {e}")
+            return await self.get_fallback_recommendations(db_resources, user_description), "fallback"
+    
+    def build_llm_payload(self, prompt: str, max_tokens: int) -> Dict:
+        """構建LLM請求體（也是響應緩存鍵的一部分）"""
+        return {
+            "model": "perplexity/sonar-pro",
+            "messages": [
+                {
+                    "role": "system",
+                    "content": """你是一個專業的學習顧問。你的任務是分析用戶的學習目標，並從提供的策展資源庫中選擇最相關的學習資源。
 
 優先級順序：
 1. 首先從策展資源庫中選擇最相關的資源
@@ -50,51 +416,136 @@ class AIResourceRecommender:
 3. 確保所有推薦的資源都是真實、可訪問的
 
 返回格式：只返回JSON數組，不要包含markdown代碼塊。"""
-                        },
-                        {
-                            "role": "user",
-                            "content": prompt
-                        }
-                    ],
-                    "temperature": 0.3,
-                    "top_p": 0.7,
-                    "frequency_penalty": 1,
-                    "max_tokens": 2000,
-                    "top_k": 50
+                },
+                {
+                    "role": "user",
+                    "content": prompt
                 }
-                
-                headers = {
-                    "Content-Type": "application/json",
-                    "Authorization": f"Bearer {self.api_key}"
-                }
-                
-                async with session.post(self.api_url, json=payload, headers=headers) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        content = data["choices"][0]["message"]["content"]
-                        
-                        # 清理JSON內容
-                        json_content = self.clean_json_content(content)
-                        
-                        # 解析AI推薦
-                        ai_recommendations = json.loads(json_content)
-                        
-                        # 合併數據庫資源和AI推薦
-                        final_recommendations = await self.merge_recommendations(
-                            db_resources, ai_recommendations, user_description
-                        )
-                        
-                        return final_recommendations
-                    else:
-                        print(f"AI API錯誤: {response.status}")
-                        return await self.get_fallback_recommendations(db_resources, user_description)
-                        
+            ],
+            "temperature": 0.3,
+            "top_p": 0.7,
+            "frequency_penalty": 1,
+            "max_tokens": max_tokens,
+            "top_k": 50
+        }
+    
+    async def stream_ai_recommendations(self, user_description: str,
+                                        topic: str, level: str, duration: int,
+                                        intensity: str, materials: List[str]) -> AsyncIterator[Tuple[str, object]]:
+        """流式生成推薦，依次產生(事件, 數據)：
+        
+        - ("curated", 推薦)：策展資源，數據庫檢索完成後立即產生
+        - ("ai", 推薦)：AI推薦，從LLM流式響應中每解析出一個就產生
+        - ("done", 推薦列表)：merge_recommendations合併後的最終結果
+        """
+        db_resources = await self.get_database_resources(user_description, topic, level)
+        
+        if self.is_covered_by_curated(db_resources, user_description, topic, level, materials):
+            recommendations = await self.get_fallback_recommendations(db_resources, user_description)
+            for recommendation in recommendations:
+                yield "curated", recommendation
+            yield "done", recommendations
+            return
+        
+        curated = [self.format_curated_resource(resource) for resource in db_resources[:6]]
+        for recommendation in curated:
+            yield "curated", recommendation
+        
+        plan = self.prompt_builder.build(user_description, topic, level, duration, intensity, materials, db_resources)
+        payload = self.build_llm_payload(plan.prompt, plan.max_tokens)
+        cache_key = self.response_cache.make_key(payload, db_resources)
+        
+        # 與merge_recommendations相同的過濾規則：跳過重複URL和無效URL，總數不超過8個
+        seen_urls = {recommendation["url"] for recommendation in curated}
+        emitted = len(curated)
+        ai_recommendations = []
+        
+        try:
+            async for ai_rec in self._stream_llm_items(payload, cache_key, plan):
+                ai_recommendations.append(ai_rec)
+                resource = self.resolve_curated_reference(ai_rec, plan.curated_ids)
+                if resource is not None:
+                    event, recommendation = "curated", self.format_curated_resource(resource)
+                else:
+                    event, recommendation = "ai", self.format_ai_recommendation(ai_rec)
+                url = recommendation["url"]
+                if emitted < 8 and url not in seen_urls and self.is_valid_url(url):
+                    seen_urls.add(url)
+                    emitted += 1
+                    yield event, recommendation
         except Exception as e:
-            print(f"AI API調用錯誤: {e}")
-            return await self.get_fallback_recommendations(db_resources, user_description)
+            print(f"AI API流式調用錯誤: {e}")
+        
+        if ai_recommendations:
+            final_recommendations = await self.merge_recommendations(
+                db_resources, ai_recommendations, user_description
+            )
+        else:
+            final_recommendations = await self.get_fallback_recommendations(db_resources, user_description)
+        yield "done", final_recommendations
     
-    async def get_database_resources(self, user_description: str, topic: str, level: str) -> List[LearningResource]:
-        """從數據庫獲取相關資源"""
+    async def _stream_llm_items(self, payload: Dict, cache_key: str,
+                                plan: Optional[PromptPlan] = None) -> AsyncIterator[Dict]:
+        """逐個產生LLM返回的推薦對象；命中響應緩存時直接解析緩存內容"""
+        cached = await asyncio.to_thread(self.response_cache.get, cache_key)
+        if cached is not None:
+            for ai_rec in json.loads(self.clean_json_content(cached)):
+                yield ai_rec
+            return
+        
+        if not self.circuit_breaker.allow_request():
+            raise RuntimeError("AI API熔斷中")
+        if plan is not None:
+            self.prompt_builder.record_sent(plan)
+        
+        parser = IncrementalJSONArrayParser()
+        chunks = []
+        started = time.monotonic()
+        try:
+            session = await self.get_session()
+            async with session.post(self.api_url, json=dict(payload, stream=True)) as response:
+                if response.status != 200:
+                    raise RuntimeError(f"AI API錯誤: {response.status}")
+                
+                # OpenAI兼容的SSE：每行"data: {...}"，以"data: [DONE]"結束
+                async for line in response.content:
+                    line = line.decode("utf-8").strip()
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    delta = json.loads(data)["choices"][0].get("delta", {}).get("content")
+                    if not delta:
+                        continue
+                    chunks.append(delta)
+                    for ai_rec in parser.feed(delta):
+                        yield ai_rec
+        except (asyncio.CancelledError, GeneratorExit):
+            # 客戶端斷開，調用沒有結果
+            self.circuit_breaker.release()
+            raise
+        except Exception:
+            self.circuit_breaker.record_failure(time.monotonic() - started)
+            raise
+        self.circuit_breaker.record_success(time.monotonic() - started)
+        
+        # 完整響應可解析時寫入緩存，供非流式接口復用
+        content = ''.join(chunks)
+        json.loads(self.clean_json_content(content))
+        await asyncio.to_thread(self.response_cache.put, cache_key, content)
+
+    async def get_database_resources(self, user_description: str, topic: str, level: str,
+                                     use_cache: bool = True) -> List[LearningResource]:
+        """從數據庫獲取相關資源（use_cache=False時繞過查詢結果緩存）
+        
+        SQLite查詢和向量檢索是同步的，在線程池中執行，不阻塞共享的事件循環。
+        """
+        return await asyncio.to_thread(self._load_database_resources, user_description, topic, level, use_cache)
+    
+    def _load_database_resources(self, user_description: str, topic: str, level: str,
+                                 use_cache: bool) -> List[LearningResource]:
+        """get_database_resources的同步實現"""
         # 提取用戶興趣關鍵詞
         interests = self.extract_interests(user_description, topic)
         
@@ -112,10 +563,21 @@ class AIResourceRecommender:
         resources = self.db.get_prioritized_resources(
             user_interests=interests,
             difficulty_levels=difficulty_levels,
-            limit=20
+            limit=20,
+            use_cache=use_cache
         )
         
-        return resources
+        # 向量檢索補充換了說法、沒有命中興趣關鍵詞的資源
+        by_id = {resource.id: resource for resource in resources}
+        for resource, similarity in self.db.vector_search(f"{topic} {user_description}", limit=20,
+                                                          difficulty_levels=difficulty_levels):
+            if resource.id not in by_id:
+                resource.ai_relevance_score = self.db.calculate_relevance_score(resource, interests)
+                by_id[resource.id] = resource
+            by_id[resource.id].ai_relevance_score += similarity * self.VECTOR_SIMILARITY_WEIGHT
+        
+        resources = sorted(by_id.values(), key=lambda x: (x.ai_relevance_score, x.priority_score), reverse=True)
+        return resources[:20]
     
     def extract_interests(self, description: str, topic: str) -> List[str]:
         """提取用戶興趣關鍵詞"""
@@ -144,60 +606,14 @@ class AIResourceRecommender:
         
         return list(set(interests))  # 去重
     
-    def create_ai_prompt(self, user_description: str, topic: str, level: str, 
-                        duration: int, intensity: str, materials: List[str], 
+    def create_ai_prompt(self, user_description: str, topic: str, level: str,
+                        duration: int, intensity: str, materials: List[str],
                         db_resources: List[LearningResource]) -> str:
-        """創建AI提示"""
-        
-        # 構建策展資源庫信息
-        curated_resources_text = ""
-        if db_resources:
-            curated_resources_text = "\n\n策展資源庫（優先推薦）：\n"
-            for i, resource in enumerate(db_resources[:10], 1):  # 只顯示前10個
-                curated_resources_text += f"{i}. {resource.title}\n"
-                curated_resources_text += f"   類型: {resource.resource_type.value}\n"
-                curated_resources_text += f"   難度: {resource.difficulty.value}/5\n"
-                curated_resources_text += f"   標籤: {', '.join(resource.hashtags)}\n"
-                curated_resources_text += f"   描述: {resource.description}\n"
-                curated_resources_text += f"   URL: {resource.url}\n"
-                curated_resources_text += f"   優先級: {resource.priority_score}\n\n"
-        
-        prompt = f"""用戶學習目標分析：
+        """創建AI提示（按token預算，見PromptBuilder）"""
+        return self.prompt_builder.build(
+            user_description, topic, level, duration, intensity, materials, db_resources
+        ).prompt
 
-用戶描述: "{user_description}"
-主題領域: {topic}
-技能水平: {level}
-學習時長: {duration} 天
-學習強度: {intensity}
-偏好材料類型: {', '.join(materials)}
-
-{curated_resources_text}
-
-任務：
-1. 仔細分析用戶的具體學習目標
-2. 優先從策展資源庫中選擇最相關的資源（4-8個）
-3. 如果策展資源庫資源不足，再補充其他高質量資源
-4. 確保推薦的資源符合用戶的學習目標、水平和時間安排
-
-返回格式：
-只返回JSON數組，每個資源包含：
-- title: 資源標題
-- type: 資源類型 (Course/Book/Video/Article/Project/Tutorial/Podcast/Tool/Documentation)
-- description: 簡要描述
-- duration: 預計學習時間
-- difficulty: 難度等級 (1-5)
-- url: 資源URL（必須是真實可訪問的）
-- icon: FontAwesome圖標類名
-- relevanceScore: 相關性分數 (1-10)
-- learningOutcome: 學習成果
-- prerequisites: 前置要求
-- isCurated: 是否來自策展資源庫 (true/false)
-- priorityScore: 優先級分數
-
-確保所有URL都是真實、可訪問的，不要生成虛假的URL。"""
-        
-        return prompt
-    
     def clean_json_content(self, content: str) -> str:
         """清理JSON內容"""
         content = content.strip()
@@ -210,51 +626,43 @@ class AIResourceRecommender:
     async def merge_recommendations(self, db_resources: List[LearningResource], 
                                   ai_recommendations: List[Dict], 
                                   user_description: str) -> List[Dict]:
-        """合併數據庫資源和AI推薦"""
+        """合併數據庫資源和AI推薦
+        
+        AI以短ID引用的策展資源按其相關性分數排在前面，其餘名額按數據庫順序補足。
+        """
         final_recommendations = []
         
+        # 將短ID引用映射回策展資源
+        curated_ids = self.prompt_builder.curated_ids(db_resources)
+        selected = {}
+        new_recommendations = []
+        for ai_rec in ai_recommendations:
+            resource = self.resolve_curated_reference(ai_rec, curated_ids)
+            if resource is None:
+                new_recommendations.append(ai_rec)
+            elif resource.id not in selected:
+                selected[resource.id] = (resource, ai_rec.get("relevanceScore"))
+        
         # 首先添加策展資源庫中的資源
-        for resource in db_resources[:6]:  # 最多6個策展資源
-            final_recommendations.append({
-                "title": resource.title,
-                "type": resource.resource_type.value.title(),
-                "description": resource.description,
-                "duration": resource.duration,
-                "difficulty": resource.difficulty.value,
-                "url": resource.url,
-                "icon": self.get_icon_for_type(resource.resource_type),
-                "relevanceScore": resource.ai_relevance_score,
-                "learningOutcome": resource.learning_outcomes[0] if resource.learning_outcomes else "掌握相關技能",
-                "prerequisites": resource.prerequisites,
-                "isCurated": True,
-                "priorityScore": resource.priority_score,
-                "provider": resource.provider,
-                "author": resource.author
-            })
+        for resource, score in sorted(selected.values(), key=lambda item: -(item[1] or 0))[:6]:
+            recommendation = self.format_curated_resource(resource)
+            if isinstance(score, (int, float)):
+                recommendation["relevanceScore"] = score
+            final_recommendations.append(recommendation)
+        for resource in db_resources:
+            if len(final_recommendations) >= 6:  # 最多6個策展資源
+                break
+            if resource.id not in selected:
+                final_recommendations.append(self.format_curated_resource(resource))
         
         # 添加AI推薦的資源（過濾掉重複的）
         existing_urls = {r["url"] for r in final_recommendations}
         
-        for ai_rec in ai_recommendations:
+        for ai_rec in new_recommendations:
             if ai_rec.get("url") not in existing_urls and len(final_recommendations) < 8:
                 # 驗證URL
                 if self.is_valid_url(ai_rec.get("url", "")):
-                    final_recommendations.append({
-                        "title": ai_rec.get("title", ""),
-                        "type": ai_rec.get("type", "Course"),
-                        "description": ai_rec.get("description", ""),
-                        "duration": ai_rec.get("duration", "1 week"),
-                        "difficulty": ai_rec.get("difficulty", 2),
-                        "url": ai_rec.get("url", ""),
-                        "icon": ai_rec.get("icon", "fas fa-book"),
-                        "relevanceScore": ai_rec.get("relevanceScore", 5),
-                        "learningOutcome": ai_rec.get("learningOutcome", "掌握相關技能"),
-                        "prerequisites": ai_rec.get("prerequisites", []),
-                        "isCurated": False,
-                        "priorityScore": 1.0,
-                        "provider": "AI推薦",
-                        "author": "AI系統"
-                    })
+                    final_recommendations.append(self.format_ai_recommendation(ai_rec))
         
         # 按相關性分數排序
         final_recommendations.sort(key=lambda x: (x["isCurated"], x["relevanceScore"]), reverse=True)
@@ -268,25 +676,56 @@ class AIResourceRecommender:
         
         # 使用數據庫資源
         for resource in db_resources[:8]:
-            recommendations.append({
-                "title": resource.title,
-                "type": resource.resource_type.value.title(),
-                "description": resource.description,
-                "duration": resource.duration,
-                "difficulty": resource.difficulty.value,
-                "url": resource.url,
-                "icon": self.get_icon_for_type(resource.resource_type),
-                "relevanceScore": resource.ai_relevance_score,
-                "learningOutcome": resource.learning_outcomes[0] if resource.learning_outcomes else "掌握相關技能",
-                "prerequisites": resource.prerequisites,
-                "isCurated": True,
-                "priorityScore": resource.priority_score,
-                "provider": resource.provider,
-                "author": resource.author
-            })
+            recommendations.append(self.format_curated_resource(resource))
         
         return recommendations
     
+    def resolve_curated_reference(self, ai_rec: Dict,
+                                  curated_ids: Dict[str, LearningResource]) -> Optional[LearningResource]:
+        """AI推薦若以短ID（如"C1"）引用策展資源，返回該資源"""
+        short_id = ai_rec.get("id")
+        if not isinstance(short_id, str):
+            return None
+        return curated_ids.get(short_id.strip().upper())
+    
+    def format_curated_resource(self, resource: LearningResource) -> Dict:
+        """策展資源的推薦格式"""
+        return {
+            "title": resource.title,
+            "type": resource.resource_type.value.title(),
+            "description": resource.description,
+            "duration": resource.duration,
+            "difficulty": resource.difficulty.value,
+            "url": resource.url,
+            "icon": self.get_icon_for_type(resource.resource_type),
+            "relevanceScore": resource.ai_relevance_score,
+            "learningOutcome": resource.learning_outcomes[0] if resource.learning_outcomes else "掌握相關技能",
+            "prerequisites": resource.prerequisites,
+            "isCurated": True,
+            "priorityScore": resource.priority_score,
+            "provider": resource.provider,
+            "author": resource.author
+        }
+    
+    def format_ai_recommendation(self, ai_rec: Dict) -> Dict:
+        """AI推薦的推薦格式"""
+        return {
+            "title": ai_rec.get("title", ""),
+            "type": ai_rec.get("type", "Course"),
+            "description": ai_rec.get("description", ""),
+            "duration": ai_rec.get("duration", "1 week"),
+            "difficulty": ai_rec.get("difficulty", 2),
+            "url": ai_rec.get("url", ""),
+            "icon": ai_rec.get("icon", "fas fa-book"),
+            "relevanceScore": ai_rec.get("relevanceScore", 5),
+            "learningOutcome": ai_rec.get("learningOutcome", "掌握相關技能"),
+            "prerequisites": ai_rec.get("prerequisites", []),
+            "isCurated": False,
+            "priorityScore": 1.0,
+            "provider": "AI推薦",
+            "author": "AI系統"
+        }
+    
     def get_icon_for_type(self, resource_type: ResourceType) -> str:
         """根據資源類型獲取圖標"""
         icon_mapping = {
@@ -333,17 +772,40 @@ class LearningPlanGenerator:
         self.ai_recommender = ai_recommender
     
     async def generate_learning_plan(self, user_data: Dict) -> Dict:
-        """生成學習計劃"""
+        """生成學習計劃
+        
+        user_data帶有recommendation_id（/api/ai/recommend返回的句柄）或recommendations
+        （客戶端已有的推薦列表）時直接使用這些推薦，不再調用get_recommendation_result。
+        句柄過期或與本次輸入不符時重新獲取推薦。
+        """
         try:
-            # 獲取AI推薦的資源
-            recommendations = await self.ai_recommender.get_ai_recommendations(
-                user_description=user_data["description"],
-                topic=user_data["topic"],
-                level=user_data["level"],
-                duration=user_data["duration"],
-                intensity=user_data["intensity"],
-                materials=user_data["materials"]
-            )
+            recommendations = None
+            source = None
+            if user_data.get("recommendation_id"):
+                request_key = self.ai_recommender.request_key(
+                    user_data["description"], user_data["topic"], user_data["level"],
+                    user_data["duration"], user_data["intensity"], user_data["materials"]
+                )
+                recommendations = self.ai_recommender.get_stored_recommendations(
+                    user_data["recommendation_id"], request_key
+                )
+                source = "handle"
+            if recommendations is None and user_data.get("recommendations"):
+                recommendations = self.normalize_materials(user_data["recommendations"])
+                source = "client"
+            
+            if not recommendations:
+                # 獲取AI推薦的資源
+                result = await self.ai_recommender.get_recommendation_result(
+                    user_description=user_data["description"],
+                    topic=user_data["topic"],
+                    level=user_data["level"],
+                    duration=user_data["duration"],
+                    intensity=user_data["intensity"],
+                    materials=user_data["materials"]
+                )
+                recommendations = result["recommendations"]
+                source = result["source"]
             
             # 生成每日學習計劃
             daily_plan = self.create_daily_plan(recommendations, user_data)
@@ -354,7 +816,8 @@ class LearningPlanGenerator:
                 "daily_plan": daily_plan,
                 "total_days": user_data["duration"],
                 "curated_count": sum(1 for r in recommendations if r.get("isCurated", False)),
-                "ai_count": sum(1 for r in recommendations if not r.get("isCurated", False))
+                "ai_count": sum(1 for r in recommendations if not r.get("isCurated", False)),
+                "source": source
             }
             
         except Exception as e:
@@ -365,6 +828,21 @@ class LearningPlanGenerator:
                 "daily_plan": []
             }
     
+    def normalize_materials(self, materials: List[Dict]) -> List[Dict]:
+        """客戶端傳回的推薦列表：只保留有標題和有效URL的項目，補齊create_daily_plan需要的欄位"""
+        normalized = []
+        for material in materials:
+            if not isinstance(material, dict) or not material.get("title"):
+                continue
+            if not self.ai_recommender.is_valid_url(material.get("url", "")):
+                continue
+            recommendation = self.ai_recommender.format_ai_recommendation(material)
+            for key in ("isCurated", "priorityScore", "provider", "author"):
+                if key in material:
+                    recommendation[key] = material[key]
+            normalized.append(recommendation)
+        return normalized
+    
     def create_daily_plan(self, materials: List[Dict], user_data: Dict) -> List[Dict]:
         """創建每日學習計劃"""
         daily_plan = []
@@ -557,6 +1035,7 @@ async def main():
     
     # 生成學習計劃
     result = await generator.generate_learning_plan(user_data)
+    await ai_recommender.close()
     
     if result["success"]:
         print(f"成功生成學習計劃！")
@@ -5,17 +5,24 @@ API Server for Prioritised Learning Resources System
 提供RESTful API接口供前端調用
 """
 
-from flask import Flask, request, jsonify, session
+from flask import Flask, Response, request, jsonify, session
 from flask_cors import CORS
-import asyncio
+import atexit
+import concurrent.futures
+import functools
 import json
+import os
+import socket
 from datetime import datetime
 from typing import Dict, List
 import uuid
 
 from learning_resources import LearningResourcesDB, ResourceType, DifficultyLevel
 from contributor_management import ContributorAuth, ContributorResourceManager
+from session_store import MemorySessionStore, SQLiteSessionStore, SignedTokenSessionStore
 from ai_integration import AIResourceRecommender, LearningPlanGenerator
+from background_loop import BackgroundEventLoop, RequestAbandoned
+from http_caching import catalog_etag, compress_response
 
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-here'  # 在生產環境中應該使用更安全的密鑰
@@ -27,16 +34,120 @@ CORS(app,
      allow_headers=['Content-Type', 'Authorization'],
      supports_credentials=True)
 
+def create_session_store(db: LearningResourcesDB):
+    """按SESSION_STORE環境變量選擇會話存儲：memory（默認，單進程）、sqlite、signed（需SESSION_SECRET）"""
+    backend = os.environ.get("SESSION_STORE", "memory")
+    if backend == "sqlite":
+        return SQLiteSessionStore(db)
+    if backend == "signed":
+        return SignedTokenSessionStore(os.environ.get("SESSION_SECRET", ""), db)
+    if backend == "memory":
+        return MemorySessionStore()
+    raise ValueError(f"未知的會話存儲: {backend}")
+
+# 只讀端點的ETag所用目錄代數可以是多舊的進程內快照（秒）；
+# 本進程的寫入立即生效，其他worker的寫入最多延遲這麼久
+CATALOG_ETAG_MAX_AGE = 1.0
+
 # 初始化系統組件
 db = LearningResourcesDB()
-auth = ContributorAuth(db)
+auth = ContributorAuth(db, create_session_store(db))
 resource_manager = ContributorResourceManager(db, auth)
 ai_recommender = AIResourceRecommender(db, "ce74038095d6469184af3b39e3eca7b3")  # 使用現有的API密鑰
 plan_generator = LearningPlanGenerator(db, ai_recommender)
 
-# 運行事件循環
-loop = asyncio.new_event_loop()
-asyncio.set_event_loop(loop)
+# 異步任務在專用線程的事件循環上運行，請求線程提交協程並等待各自的Future
+async_loop = BackgroundEventLoop("ai-event-loop")
+async_loop.start()
+
+# serve.py的worker退出時和atexit都會調用shutdown_async_loop，只執行第一次
+_async_loop_shut_down = False
+
+def shutdown_async_loop():
+    global _async_loop_shut_down
+    if _async_loop_shut_down:
+        return
+    # 先置位：清理中途失敗時，解釋器退出階段的再次調用也不會重試而拋錯
+    _async_loop_shut_down = True
+    # 保存向量索引，重啟後直接載入而不是從數據庫重建
+    db.save_vector_index()
+    async_loop.run(ai_recommender.close())
+    async_loop.stop()
+
+# 非流式AI請求的總超時（秒）；超時或客戶端斷開時取消事件循環上的協程
+AI_REQUEST_TIMEOUT = 60.0
+
+def client_disconnected(environ) -> bool:
+    """客戶端是否已關閉連接（只支持提供werkzeug.socket的服務器，其他服務器始終返回False）"""
+    sock = environ.get("werkzeug.socket")
+    if sock is None:
+        return False
+    try:
+        return sock.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT) == b""
+    except BlockingIOError:
+        return False
+    except OSError:
+        return True
+
+def run_ai_request(coro):
+    """在後台事件循環上運行AI協程，超時或客戶端斷開時取消"""
+    environ = request.environ
+    return async_loop.run(coro, timeout=AI_REQUEST_TIMEOUT,
+                          cancel_check=lambda: client_disconnected(environ))
+
+# AI推薦的HTTP會話在啟動時建立、退出時關閉，連接在請求之間復用
+async_loop.run(ai_recommender.start())
+atexit.register(shutdown_async_loop)
+
+def catalog_conditional(view):
+    """目錄只讀端點：按目錄代數和請求參數生成ETag，If-None-Match匹配時直接返回304，
+    否則執行端點並壓縮響應
+    
+    304判斷先用進程內的代數快照，不匹配時再讀取數據庫中的當前代數。
+    響應攜帶的ETag只來自執行端點之前從數據庫讀取的代數：響應內容不會比它舊，
+    端點執行期間的寫入只會讓該ETag更早失效；快照可能落後於已提交的寫入，不能用於200響應。
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        params = list(request.args.items(multi=True))
+        for max_age in (CATALOG_ETAG_MAX_AGE, 0.0):
+            etag = catalog_etag(db.get_catalog_generation(max_age=max_age), request.path, params)
+            if request.if_none_match.contains_weak(etag):
+                response = app.response_class(status=304)
+                response.set_etag(etag, weak=True)
+                response.vary.add("Accept-Encoding")
+                response.headers["Cache-Control"] = "no-cache"
+                return response
+        
+        response = app.make_response(view(*args, **kwargs))
+        if response.status_code == 200:
+            # 壓縮後的響應體因編碼而異，使用弱ETag
+            response.set_etag(etag, weak=True)
+            response.headers["Cache-Control"] = "no-cache"
+        return compress_response(response, request.accept_encodings)
+    return wrapper
+
+# 資源列表端點默認返回的欄位；fields參數只能從中選擇
+SEARCH_RESOURCE_FIELDS = (
+    "id", "title", "description", "url", "resource_type", "difficulty", "duration", "cost",
+    "provider", "author", "rating", "hashtags", "learning_outcomes", "priority_score",
+    "ai_relevance_score", "last_updated"
+)
+ADMIN_RESOURCE_FIELDS = (
+    "id", "title", "description", "url", "resource_type", "difficulty", "status",
+    "priority_score", "ai_relevance_score", "created_by", "last_updated"
+)
+
+def parse_fields(allowed) -> List[str]:
+    """解析fields查詢參數（逗號分隔，如fields=id,title,url），未提供時返回全部默認欄位"""
+    raw = request.args.get('fields')
+    if not raw:
+        return list(allowed)
+    fields = list(dict.fromkeys(name.strip() for name in raw.split(',') if name.strip()))
+    unknown = [name for name in fields if name not in allowed]
+    if not fields or unknown:
+        raise ValueError(f"不支持的欄位: {', '.join(unknown)}")
+    return fields
 
 # ==================== 貢獻者管理API ====================
 
@@ -138,6 +249,45 @@ def add_resource():
     except Exception as e:
         return jsonify({"success": False, "message": f"添加資源錯誤: {str(e)}"}), 500
 
+# 批量導入每個事務寫入的行數：默認值和上限
+BULK_DEFAULT_BATCH_SIZE = 1000
+BULK_MAX_BATCH_SIZE = 10000
+
+@app.route('/api/resources/bulk', methods=['POST'])
+def bulk_import_resources():
+    """批量導入學習資源（NDJSON，每行一個資源）"""
+    try:
+        session_id = session.get('contributor_session')
+        if not session_id:
+            return jsonify({"success": False, "message": "未登錄"}), 401
+        if not auth.verify_session(session_id):
+            return jsonify({"success": False, "message": "會話已過期"}), 401
+        
+        try:
+            batch_size = int(request.args.get('batch_size', BULK_DEFAULT_BATCH_SIZE))
+        except ValueError:
+            return jsonify({"success": False, "message": "batch_size必須是整數"}), 400
+        if batch_size < 1:
+            return jsonify({"success": False, "message": "batch_size必須大於0"}), 400
+        batch_size = min(batch_size, BULK_MAX_BATCH_SIZE)
+
+        # 逐行讀取請求體，不一次性載入整個文件
+        lines = (line.decode('utf-8') for line in request.stream)
+        outcomes = db.add_learning_resources_bulk(lines, batch_size=batch_size)
+
+        summary = {"inserted": 0, "updated": 0, "error": 0}
+        for outcome in outcomes:
+            summary[outcome["status"]] += 1
+
+        return jsonify({
+            "success": summary["error"] == 0,
+            "summary": summary,
+            "results": outcomes,
+            "total": len(outcomes)
+        })
+    except Exception as e:
+        return jsonify({"success": False, "message": f"批量導入錯誤: {str(e)}"}), 500
+
 @app.route('/api/resources/<resource_id>', methods=['PUT'])
 def update_resource(resource_id):
     """更新學習資源"""
@@ -182,43 +332,32 @@ def get_my_resources():
         return jsonify({"success": False, "message": f"獲取資源列表錯誤: {str(e)}"}), 500
 
 @app.route('/api/resources/search', methods=['GET'])
+@catalog_conditional
 def search_resources():
     """搜索學習資源"""
     try:
         query = request.args.get('q', '')
         limit = int(request.args.get('limit', 10))
-        
-        if query:
-            resources = db.semantic_search(query, limit)
+        cursor = request.args.get('cursor')
+        # 欄位投影下推到SQL列和行解碼，未選中的列不讀取也不解析
+        fields = parse_fields(SEARCH_RESOURCE_FIELDS)
+        
+        if query and not cursor:
+            # 第一頁經語義搜索：關鍵詞結果不足一頁時以向量相似度補充
+            result, next_cursor = db.semantic_search_page(query, limit, fields=fields)
+        elif query:
+            result, next_cursor = db.search_resources_page(query, limit, cursor, fields=fields)
         else:
-            resources = db.get_all_resources(limit)
-        
-        result = []
-        for resource in resources:
-            result.append({
-                "id": resource.id,
-                "title": resource.title,
-                "description": resource.description,
-                "url": resource.url,
-                "resource_type": resource.resource_type.value,
-                "difficulty": resource.difficulty.value,
-                "duration": resource.duration,
-                "cost": resource.cost,
-                "provider": resource.provider,
-                "author": resource.author,
-                "rating": resource.rating,
-                "hashtags": resource.hashtags,
-                "learning_outcomes": resource.learning_outcomes,
-                "priority_score": resource.priority_score,
-                "ai_relevance_score": resource.ai_relevance_score,
-                "last_updated": resource.last_updated
-            })
+            result, next_cursor = db.get_resources_page(limit=limit, cursor=cursor, fields=fields)
         
         return jsonify({
             "success": True,
             "resources": result,
-            "total": len(result)
+            "total": len(result),
+            "next_cursor": next_cursor
         })
+    except ValueError as e:
+        return jsonify({"success": False, "message": f"參數錯誤: {str(e)}"}), 400
     except Exception as e:
         return jsonify({"success": False, "message": f"搜索錯誤: {str(e)}"}), 500
 
@@ -231,27 +370,75 @@ def get_ai_recommendations():
         data = request.get_json()
         
         # 運行異步函數
-        recommendations = loop.run_until_complete(
-            ai_recommender.get_ai_recommendations(
+        result = run_ai_request(
+            ai_recommender.get_recommendation_result(
                 user_description=data['description'],
                 topic=data['topic'],
                 level=data['level'],
                 duration=data['duration'],
                 intensity=data['intensity'],
-                materials=data['materials']
+                materials=data['materials'],
+                latency_budget=data.get('latency_budget')
             )
         )
+        recommendations = result["recommendations"]
         
         return jsonify({
             "success": True,
             "recommendations": recommendations,
             "total": len(recommendations),
             "curated_count": sum(1 for r in recommendations if r.get("isCurated", False)),
-            "ai_count": sum(1 for r in recommendations if not r.get("isCurated", False))
+            "ai_count": sum(1 for r in recommendations if not r.get("isCurated", False)),
+            "source": result["source"],
+            "elapsed_ms": result["elapsed_ms"],
+            "recommendation_id": result["recommendation_id"]
         })
+    except RequestAbandoned:
+        # 客戶端已斷開，響應不會被讀取
+        return Response(status=499)
+    except concurrent.futures.TimeoutError:
+        return jsonify({"success": False, "message": "AI推薦超時"}), 504
     except Exception as e:
         return jsonify({"success": False, "message": f"AI推薦錯誤: {str(e)}"}), 500
 
+@app.route('/api/ai/recommend/stream', methods=['GET', 'POST'])
+def stream_ai_recommendations():
+    """以SSE流式返回AI推薦：先策展資源，再逐個AI推薦，最後是合併後的完整列表"""
+    try:
+        if request.method == 'POST':
+            data = request.get_json()
+            materials = data['materials']
+        else:
+            data = request.args
+            materials = [m for m in data.get('materials', '').split(',') if m]
+        
+        params = {
+            "user_description": data['description'],
+            "topic": data['topic'],
+            "level": data['level'],
+            "duration": int(data['duration']),
+            "intensity": data['intensity'],
+            "materials": materials
+        }
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"success": False, "message": f"請求參數錯誤: {str(e)}"}), 400
+    
+    def generate():
+        # 客戶端斷開時WSGI服務器關閉此生成器，iterate隨之取消事件循環上的流式任務
+        events = async_loop.iterate(ai_recommender.stream_ai_recommendations(**params))
+        try:
+            for event, payload in events:
+                if event == "done":
+                    payload = {"recommendations": payload, "total": len(payload)}
+                yield f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'message': f'AI推薦錯誤: {str(e)}'}, ensure_ascii=False)}\n\n"
+        finally:
+            events.close()
+    
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.route('/api/ai/generate-plan', methods=['POST'])
 def generate_learning_plan():
     """生成學習計劃"""
@@ -259,45 +446,43 @@ def generate_learning_plan():
         data = request.get_json()
         
         # 運行異步函數
-        result = loop.run_until_complete(
+        result = run_ai_request(
             plan_generator.generate_learning_plan(data)
         )
         
         return jsonify(result)
+    except RequestAbandoned:
+        # 客戶端已斷開，響應不會被讀取
+        return Response(status=499)
+    except concurrent.futures.TimeoutError:
+        return jsonify({"success": False, "message": "生成學習計劃超時"}), 504
     except Exception as e:
         return jsonify({"success": False, "message": f"生成學習計劃錯誤: {str(e)}"}), 500
 
 # ==================== 數據庫管理API ====================
 
 @app.route('/api/admin/resources', methods=['GET'])
+@catalog_conditional
 def get_all_resources_admin():
     """管理員獲取所有資源"""
     try:
         # 這裡應該添加管理員權限檢查
         limit = int(request.args.get('limit', 100))
-        resources = db.get_all_resources(limit)
-        
-        result = []
-        for resource in resources:
-            result.append({
-                "id": resource.id,
-                "title": resource.title,
-                "description": resource.description,
-                "url": resource.url,
-                "resource_type": resource.resource_type.value,
-                "difficulty": resource.difficulty.value,
-                "status": resource.status.value,
-                "priority_score": resource.priority_score,
-                "ai_relevance_score": resource.ai_relevance_score,
-                "created_by": resource.created_by,
-                "last_updated": resource.last_updated
-            })
+        cursor = request.args.get('cursor')
+        filters = {}
+        if request.args.get('status'):
+            filters['status'] = request.args.get('status')
+        fields = parse_fields(ADMIN_RESOURCE_FIELDS)
+        result, next_cursor = db.get_resources_page(filters, limit, cursor, fields=fields)
         
         return jsonify({
             "success": True,
             "resources": result,
-            "total": len(result)
+            "total": len(result),
+            "next_cursor": next_cursor
         })
+    except ValueError as e:
+        return jsonify({"success": False, "message": f"參數錯誤: {str(e)}"}), 400
     except Exception as e:
         return jsonify({"success": False, "message": f"獲取資源錯誤: {str(e)}"}), 500
 
@@ -321,46 +506,12 @@ def update_resource_priority(resource_id):
 # ==================== 統計API ====================
 
 @app.route('/api/stats/overview', methods=['GET'])
+@catalog_conditional
 def get_stats_overview():
     """獲取系統統計概覽"""
     try:
-        all_resources = db.get_all_resources(1000)  # 獲取更多資源用於統計
-        
-        stats = {
-            "total_resources": len(all_resources),
-            "active_resources": len([r for r in all_resources if r.status.value == "active"]),
-            "pending_resources": len([r for r in all_resources if r.status.value == "pending_review"]),
-            "resource_types": {},
-            "difficulty_distribution": {},
-            "top_providers": {},
-            "recent_resources": []
-        }
-        
-        # 統計資源類型
-        for resource in all_resources:
-            resource_type = resource.resource_type.value
-            stats["resource_types"][resource_type] = stats["resource_types"].get(resource_type, 0) + 1
-            
-            # 統計難度分佈
-            difficulty = resource.difficulty.value
-            stats["difficulty_distribution"][difficulty] = stats["difficulty_distribution"].get(difficulty, 0) + 1
-            
-            # 統計提供商
-            if resource.provider:
-                stats["top_providers"][resource.provider] = stats["top_providers"].get(resource.provider, 0) + 1
-        
-        # 最近添加的資源
-        recent_resources = sorted(all_resources, key=lambda x: x.last_updated, reverse=True)[:5]
-        stats["recent_resources"] = [
-            {
-                "id": r.id,
-                "title": r.title,
-                "resource_type": r.resource_type.value,
-                "provider": r.provider,
-                "last_updated": r.last_updated
-            }
-            for r in recent_resources
-        ]
+        # 計數由數據庫觸發器增量維護，這裡只讀取計數表
+        stats = db.get_stats_overview()
         
         return jsonify({
             "success": True,
@@ -373,11 +524,21 @@ def get_stats_overview():
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    """健康檢查"""
+    """健康檢查；上游LLM熔斷時狀態為degraded（推薦降級為策展資源）"""
+    circuit_breaker = ai_recommender.circuit_breaker.stats()
     return jsonify({
-        "status": "healthy",
+        "status": "degraded" if circuit_breaker["state"] != "closed" else "healthy",
         "timestamp": datetime.now().isoformat(),
-        "version": "1.0.0"
+        "version": "1.0.0",
+        "caches": db.get_cache_stats(),
+        "db_connections": db.get_connection_stats(),
+        "llm_cache": ai_recommender.response_cache.stats(),
+        "coalescing": ai_recommender.coalescing_stats,
+        "recommendation_routing": ai_recommender.get_routing_stats(),
+        "circuit_breaker": circuit_breaker,
+        "prompts": ai_recommender.prompt_builder.stats(),
+        "sessions": auth.sessions.stats(),
+        "worker_pid": os.getpid()
     })
 
 # ==================== 錯誤處理 ====================
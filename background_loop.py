@@ -0,0 +1,123 @@
+"""
+Background Event Loop
+後台事件循環
+
+在專用線程上運行一個asyncio事件循環，供同步的Flask請求線程提交協程：
+1. 每個請求得到自己的Future，請求之間不再串行地共用run_until_complete
+2. 等待超時、請求線程被中斷或客戶端斷開（cancel_check）時取消對應的協程
+3. 請求返回後，已shield的任務（如合併中的LLM調用）繼續在後台完成
+"""
+
+import asyncio
+import concurrent.futures
+import threading
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterator, Optional
+
+class RequestAbandoned(Exception):
+    """cancel_check報告調用方已放棄（如客戶端斷開），協程已被取消"""
+
+class BackgroundEventLoop:
+    """在守護線程上運行的事件循環"""
+    
+    def __init__(self, name: str = "asyncio-loop"):
+        self.name = name
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._started = threading.Event()
+    
+    def start(self):
+        """啟動循環線程（已啟動時不做任何事）"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._started.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        self._started.wait()
+    
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self._started.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            # 取消仍在運行的任務，讓它們有機會清理
+            pending = asyncio.all_tasks(self.loop)
+            for task in pending:
+                task.cancel()
+            if pending:
+                self.loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            self.loop.run_until_complete(self.loop.shutdown_asyncgens())
+            self.loop.close()
+    
+    def submit(self, coro: Awaitable) -> concurrent.futures.Future:
+        """提交協程，返回線程安全的Future；Future.cancel()會取消循環上的任務"""
+        if self.loop is None or not self.loop.is_running():
+            raise RuntimeError("後台事件循環未啟動")
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+    
+    # 等待期間調用cancel_check的間隔（秒）
+    CANCEL_POLL_INTERVAL = 0.25
+    
+    def run(self, coro: Awaitable, timeout: Optional[float] = None,
+            cancel_check: Optional[Callable[[], bool]] = None) -> Any:
+        """提交協程並阻塞等待結果；超時、等待被中斷或cancel_check返回True時取消協程
+        
+        超時拋出concurrent.futures.TimeoutError，cancel_check觸發時拋出RequestAbandoned。
+        """
+        future = self.submit(coro)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            while True:
+                wait = None if deadline is None else max(0.0, deadline - time.monotonic())
+                if cancel_check is not None:
+                    wait = self.CANCEL_POLL_INTERVAL if wait is None else min(wait, self.CANCEL_POLL_INTERVAL)
+                try:
+                    return future.result(wait)
+                except concurrent.futures.TimeoutError:
+                    # 協程自身拋出的TimeoutError（Future已完成）或總超時，直接拋出
+                    if future.done() or (deadline is not None and time.monotonic() >= deadline):
+                        raise
+                    if cancel_check is not None and cancel_check():
+                        raise RequestAbandoned()
+        except BaseException:
+            future.cancel()
+            raise
+    
+    def iterate(self, agen: AsyncIterator) -> Iterator:
+        """把異步生成器轉為同步迭代器（用於流式響應）
+        
+        同步迭代器被關閉（如客戶端斷開，WSGI服務器調用close）時，
+        取消正在等待的下一項，並在循環上關閉異步生成器。
+        """
+        future = None
+        try:
+            while True:
+                future = self.submit(self._next(agen))
+                try:
+                    item = future.result()
+                except StopAsyncIteration:
+                    return
+                future = None
+                yield item
+        finally:
+            if future is not None:
+                future.cancel()
+            try:
+                self.submit(agen.aclose()).result()
+            except (RuntimeError, asyncio.CancelledError, concurrent.futures.CancelledError):
+                pass
+    
+    @staticmethod
+    async def _next(agen: AsyncIterator) -> Any:
+        return await agen.__anext__()
+    
+    def stop(self, timeout: Optional[float] = 5.0):
+        """停止循環並等待線程退出"""
+        if self.loop is None or self._thread is None:
+            return
+        if self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
+        self._thread = None
@@ -0,0 +1,470 @@
+#!/usr/bin/env python3
+"""
+Learning Resources Benchmarks
+學習資源數據庫性能基準測試
+
+用法:
+    python benchmark_resources.py decode --rows 10000
+    python benchmark_resources.py prioritized --sizes 10000 100000 1000000
+    python benchmark_resources.py prompt --rows 10000
+    python benchmark_resources.py projection --rows 10000
+    python benchmark_resources.py lookup --rows 10000
+"""
+
+import argparse
+import asyncio
+import heapq
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from learning_resources import (
+    LearningResourcesDB, LearningResource, Contributor, ResourceType, DifficultyLevel, ResourceStatus
+)
+
+@dataclass
+class EagerLearningResource:
+    """舊版數據模型：普通dataclass，構建時解碼全部JSON欄位"""
+    id: str
+    title: str
+    description: str
+    url: str
+    resource_type: ResourceType
+    difficulty: DifficultyLevel
+    duration: str
+    cost: str
+    language: str = "en"
+    provider: str = ""
+    author: str = ""
+    rating: float = 0.0
+    review_count: int = 0
+    hashtags: List[str] = None
+    prerequisites: List[str] = None
+    learning_outcomes: List[str] = None
+    target_audience: str = ""
+    last_updated: str = ""
+    created_by: str = ""
+    status: ResourceStatus = ResourceStatus.ACTIVE
+    priority_score: float = 1.0
+    ai_relevance_score: float = 0.0
+
+def eager_decode(row) -> EagerLearningResource:
+    """舊版行解碼（各查詢方法中複製的寫法）"""
+    return EagerLearningResource(
+        id=row[0],
+        title=row[1],
+        description=row[2],
+        url=row[3],
+        resource_type=ResourceType(row[4]),
+        difficulty=DifficultyLevel(row[5]),
+        duration=row[6],
+        cost=row[7],
+        language=row[8],
+        provider=row[9],
+        author=row[10],
+        rating=row[11],
+        review_count=row[12],
+        hashtags=json.loads(row[13]) if row[13] else [],
+        prerequisites=json.loads(row[14]) if row[14] else [],
+        learning_outcomes=json.loads(row[15]) if row[15] else [],
+        target_audience=row[16],
+        last_updated=row[17],
+        created_by=row[18],
+        status=ResourceStatus(row[19]),
+        priority_score=row[20],
+        ai_relevance_score=row[21]
+    )
+
+def legacy_prioritized_resources(db: LearningResourcesDB, user_interests: List[str],
+                                 difficulty_levels: Optional[List[DifficultyLevel]] = None,
+                                 limit: int = 10) -> List[LearningResource]:
+    """舊版get_prioritized_resources：只對priority_score最高的limit行計算相關性"""
+    conditions = ["status = 'active'"]
+    params = []
+    if difficulty_levels:
+        conditions.append(f"difficulty IN ({', '.join('?' for _ in difficulty_levels)})")
+        params.extend(dl.value for dl in difficulty_levels)
+    params.append(limit)
+    
+    with db.transaction() as cursor:
+        cursor.execute(f'''
+            SELECT * FROM learning_resources
+            WHERE {' AND '.join(conditions)}
+            ORDER BY priority_score DESC, ai_relevance_score DESC
+            LIMIT ?
+        ''', params)
+        rows = cursor.fetchall()
+    
+    resources = []
+    for row in rows:
+        resource = LearningResource.from_row(row)
+        resource.ai_relevance_score = db.calculate_relevance_score(resource, user_interests)
+        resources.append(resource)
+    resources.sort(key=lambda x: (x.ai_relevance_score, x.priority_score), reverse=True)
+    return resources[:limit]
+
+def exact_top_scores(db: LearningResourcesDB, user_interests: List[str],
+                     difficulty_levels: Optional[List[DifficultyLevel]] = None,
+                     limit: int = 10) -> List[float]:
+    """全表掃描得到的真實top-k相關性分數（作為召回質量的參照）"""
+    scores = (
+        db.calculate_relevance_score(resource, user_interests)
+        for resource in db.iter_resources(filters={"status": "active"}, page_size=5000)
+        if not difficulty_levels or resource.difficulty in difficulty_levels
+    )
+    return heapq.nlargest(limit, scores)
+
+def legacy_ai_prompt(user_description: str, topic: str, level: str,
+                     duration: int, intensity: str, materials: List[str],
+                     db_resources: List[LearningResource]) -> str:
+    """舊版create_ai_prompt：最多10個策展資源的全部欄位和完整用戶描述，max_tokens固定為2000"""
+    
+    # 構建策展資源庫信息
+    curated_resources_text = ""
+    if db_resources:
+        curated_resources_text = "\n\n策展資源庫（優先推薦）：\n"
+        for i, resource in enumerate(db_resources[:10], 1):  # 只顯示前10個
+            curated_resources_text += f"{i}. {resource.title}\n"
+            curated_resources_text += f"   類型: {resource.resource_type.value}\n"
+            curated_resources_text += f"   難度: {resource.difficulty.value}/5\n"
+            curated_resources_text += f"   標籤: {', '.join(resource.hashtags)}\n"
+            curated_resources_text += f"   描述: {resource.description}\n"
+            curated_resources_text += f"   URL: {resource.url}\n"
+            curated_resources_text += f"   優先級: {resource.priority_score}\n\n"
+    
+    prompt = f"""用戶學習目標分析：
+
+用戶描述: "{user_description}"
+主題領域: {topic}
+技能水平: {level}
+學習時長: {duration} 天
+學習強度: {intensity}
+偏好材料類型: {', '.join(materials)}
+
+{curated_resources_text}
+
+任務：
+1. 仔細分析用戶的具體學習目標
+2. 優先從策展資源庫中選擇最相關的資源（4-8個）
+3. 如果策展資源庫資源不足，再補充其他高質量資源
+4. 確保推薦的資源符合用戶的學習目標、水平和時間安排
+
+返回格式：
+只返回JSON數組，每個資源包含：
+- title: 資源標題
+- type: 資源類型 (Course/Book/Video/Article/Project/Tutorial/Podcast/Tool/Documentation)
+- description: 簡要描述
+- duration: 預計學習時間
+- difficulty: 難度等級 (1-5)
+- url: 資源URL（必須是真實可訪問的）
+- icon: FontAwesome圖標類名
+- relevanceScore: 相關性分數 (1-10)
+- learningOutcome: 學習成果
+- prerequisites: 前置要求
+- isCurated: 是否來自策展資源庫 (true/false)
+- priorityScore: 優先級分數
+
+確保所有URL都是真實、可訪問的，不要生成虛假的URL。"""
+    
+    return prompt
+
+LEGACY_MAX_TOKENS = 2000
+
+def generate_resources(count: int):
+    """生成測試資源（NDJSON字典）"""
+    resource_types = [t.value for t in ResourceType]
+    for i in range(count):
+        yield {
+            "title": f"Resource {i}: machine learning for topic {i % 97}",
+            "description": f"A practical guide to topic {i % 97} covering theory and projects. " * 3,
+            "url": f"https://resources.test/{i}",
+            "resource_type": resource_types[i % len(resource_types)],
+            "difficulty": i % 5 + 1,
+            "duration": f"{i % 12 + 1} weeks",
+            "cost": "Free",
+            "provider": f"provider-{i % 50}",
+            "author": f"author-{i % 200}",
+            "hashtags": [f"tag{i % 31}", f"tag{i % 47}", "machine-learning", "python"],
+            "prerequisites": ["Python基礎", f"topic {i % 13}"],
+            "learning_outcomes": [f"outcome {i % 17}", f"outcome {i % 23}", "build projects"],
+            "target_audience": "developers",
+            "priority_score": (i % 50) / 10.0
+        }
+
+def create_benchmark_db(rows: int, directory: str) -> LearningResourcesDB:
+    """創建並填充基準測試數據庫"""
+    db = LearningResourcesDB(os.path.join(directory, f"bench_{rows}.db"))
+    db.add_learning_resources_bulk(generate_resources(rows), batch_size=5000)
+    return db
+
+def measure(func: Callable, repeat: int = 5) -> Dict:
+    """返回最佳耗時（毫秒）和單次執行的內存峰值（KB）"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    
+    tracemalloc.start()
+    result = func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return {"ms": best * 1000, "peak_kb": peak / 1024}
+
+def bench_decode(args):
+    """比較舊版逐欄位解碼與from_row延遲解碼"""
+    with tempfile.TemporaryDirectory() as directory:
+        db = create_benchmark_db(args.rows, directory)
+        with db.transaction() as cursor:
+            cursor.execute("SELECT * FROM learning_resources")
+            rows = cursor.fetchall()
+        
+        def list_fields(resource):
+            # 列表端點（如/api/stats/overview）只讀取標量欄位
+            return (resource.id, resource.title, resource.resource_type, resource.provider)
+        
+        def all_fields(resource):
+            return (resource.id, resource.hashtags, resource.prerequisites, resource.learning_outcomes)
+        
+        def run(decode, access):
+            resources = [decode(row) for row in rows]
+            for resource in resources:
+                access(resource)
+            return resources
+        
+        cases = [
+            ("eager decode, list fields", eager_decode, list_fields),
+            ("from_row, list fields", LearningResource.from_row, list_fields),
+            ("eager decode, all fields", eager_decode, all_fields),
+            ("from_row, all fields", LearningResource.from_row, all_fields),
+        ]
+        
+        print(f"Decoding {len(rows)} rows")
+        print(f"{'case':<28}{'time (ms)':>12}{'peak (KB)':>14}")
+        for name, decode, access in cases:
+            result = measure(lambda: run(decode, access), args.repeat)
+            print(f"{name:<28}{result['ms']:>12.1f}{result['peak_kb']:>14.0f}")
+        db.close()
+
+PRIORITIZED_QUERIES = [
+    (["tag7", "outcome 5"], None),
+    (["topic 42", "projects"], [DifficultyLevel.BEGINNER, DifficultyLevel.INTERMEDIATE]),
+    (["python", "machine learning"], None),
+    (["ml", "projects"], None),  # 短於3個字符的興趣需逐行掃描
+]
+
+def bench_prioritized(args):
+    """比較舊版（按優先級取前N再打分）、兩階段全目錄檢索與全表掃描（--exact）"""
+    print(f"{'rows':>9}  {'interests':<28}{'legacy (ms)':>12}{'two-stage (ms)':>16}{'full scan (ms)':>15}"
+          f"{'legacy score':>14}{'two-stage score':>17}{'exact score':>13}")
+    for rows in args.sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            db = create_benchmark_db(rows, directory)
+            for interests, difficulty_levels in PRIORITIZED_QUERIES:
+                legacy = measure(lambda: legacy_prioritized_resources(
+                    db, interests, difficulty_levels, args.limit), args.repeat)
+                # 不經查詢緩存，測量實際的檢索代價
+                two_stage = measure(lambda: db.get_prioritized_resources(
+                    interests, difficulty_levels=difficulty_levels, limit=args.limit, use_cache=False), args.repeat)
+                
+                # 以返回結果的相關性分數總和衡量質量
+                legacy_score = sum(r.ai_relevance_score for r in legacy_prioritized_resources(
+                    db, interests, difficulty_levels, args.limit))
+                two_stage_score = sum(r.ai_relevance_score for r in db.get_prioritized_resources(
+                    interests, difficulty_levels=difficulty_levels, limit=args.limit))
+                exact_score = scan_ms = float("nan")
+                if args.exact:
+                    start = time.perf_counter()
+                    exact_score = sum(exact_top_scores(db, interests, difficulty_levels, args.limit))
+                    scan_ms = (time.perf_counter() - start) * 1000
+                
+                print(f"{rows:>9}  {', '.join(interests):<28}{legacy['ms']:>12.1f}{two_stage['ms']:>16.1f}"
+                      f"{scan_ms:>15.1f}{legacy_score:>14.1f}{two_stage_score:>17.1f}{exact_score:>13.1f}")
+            db.close()
+
+# 推薦請求樣本（前端學習計劃表單的典型輸入）
+PROMPT_TRAFFIC = [
+    {"description": "我想學習AI交易策略，能夠用Python回測自己的量化模型", "topic": "AI Trading",
+     "level": "intermediate", "duration": 30, "intensity": "moderate", "materials": ["Course", "Video", "Project"]},
+    {"description": "learn machine learning from scratch", "topic": "Machine Learning",
+     "level": "beginner", "duration": 14, "intensity": "light", "materials": ["Course", "Book"]},
+    {"description": "I am a backend developer who wants to move into data science. I know Python and SQL well "
+                    "but have never trained a model, and I want a practical path with projects I can show "
+                    "in interviews, ideally focusing on pandas, scikit-learn and deep learning basics.",
+     "topic": "Data Science", "level": "intermediate", "duration": 60, "intensity": "intensive",
+     "materials": ["Course", "Project", "Article", "Video"]},
+    {"description": "網頁開發入門，想做自己的作品集網站", "topic": "Web Development",
+     "level": "beginner", "duration": 21, "intensity": "moderate", "materials": ["Tutorial", "Video"]},
+    {"description": "deep learning for computer vision research", "topic": "Deep Learning",
+     "level": "advanced", "duration": 45, "intensity": "intensive", "materials": ["Book", "Documentation", "Project"]},
+]
+
+def bench_prompt(args):
+    """比較舊版提示詞與按token預算構建的提示詞（近似token數）"""
+    from ai_integration import AIResourceRecommender
+    from prompt_builder import estimate_tokens
+    
+    with tempfile.TemporaryDirectory() as directory:
+        db = create_benchmark_db(args.rows, directory)
+        recommender = AIResourceRecommender(db, "")
+        builder = recommender.prompt_builder
+        
+        print(f"{'topic':<18}{'legacy prompt':>15}{'budgeted':>10}{'saved':>8}"
+              f"{'legacy max_tokens':>19}{'max_tokens':>12}{'coverage':>10}")
+        totals = [0, 0, 0, 0]
+        curated_only = 0
+        for request in PROMPT_TRAFFIC:
+            db_resources = asyncio.run(recommender.get_database_resources(
+                request["description"], request["topic"], request["level"]))
+            inputs = (request["description"], request["topic"], request["level"], request["duration"],
+                      request["intensity"], request["materials"], db_resources)
+            legacy_tokens = estimate_tokens(legacy_ai_prompt(*inputs))
+            plan = builder.build(*inputs)
+            coverage = recommender.curated_coverage(
+                db_resources, recommender.extract_interests(request["description"], request["topic"]),
+                request["level"], request["materials"])["confidence"]
+            # 覆蓋度達到閾值的請求只返回策展資源，不發送提示詞
+            routed = coverage >= recommender.coverage_threshold
+            curated_only += routed
+            totals[0] += legacy_tokens
+            totals[1] += plan.prompt_tokens
+            totals[2] += LEGACY_MAX_TOKENS
+            totals[3] += plan.max_tokens
+            print(f"{request['topic']:<18}{legacy_tokens:>15}{plan.prompt_tokens:>10}"
+                  f"{1 - plan.prompt_tokens / legacy_tokens:>8.0%}{LEGACY_MAX_TOKENS:>19}{plan.max_tokens:>12}"
+                  f"{coverage:>9.2f}{'*' if routed else ' '}")
+        print(f"{'total':<18}{totals[0]:>15}{totals[1]:>10}{1 - totals[1] / totals[0]:>8.0%}"
+              f"{totals[2]:>19}{totals[3]:>12}")
+        print(f"curated-only (*): {curated_only}/{len(PROMPT_TRAFFIC)} requests")
+        db.close()
+
+# /api/resources/search的默認欄位與列表組件使用的投影
+SEARCH_FIELDS = [
+    "id", "title", "description", "url", "resource_type", "difficulty", "duration", "cost",
+    "provider", "author", "rating", "hashtags", "learning_outcomes", "priority_score",
+    "ai_relevance_score", "last_updated"
+]
+LISTING_FIELDS = ["id", "title", "url", "priority_score"]
+
+def bench_projection(args):
+    """比較完整欄位與fields投影的分頁讀取和JSON序列化"""
+    with tempfile.TemporaryDirectory() as directory:
+        db = create_benchmark_db(args.rows, directory)
+        
+        def run(fields):
+            pages = []
+            resources, cursor = db.get_resources_page(limit=args.page_size, fields=fields)
+            pages.append(json.dumps(resources, ensure_ascii=False))
+            while cursor and len(pages) < args.pages:
+                resources, cursor = db.get_resources_page(limit=args.page_size, cursor=cursor, fields=fields)
+                pages.append(json.dumps(resources, ensure_ascii=False))
+            return pages
+        
+        print(f"{args.pages} pages x {args.page_size} resources")
+        print(f"{'fields':<12}{'time (ms)':>12}{'peak (KB)':>14}{'payload (KB)':>15}")
+        for name, fields in (("all (16)", SEARCH_FIELDS), ("listing (4)", LISTING_FIELDS)):
+            result = measure(lambda: run(fields), args.repeat)
+            payload = sum(len(page.encode("utf-8")) for page in run(fields)) / 1024
+            print(f"{name:<12}{result['ms']:>12.1f}{result['peak_kb']:>14.0f}{payload:>15.0f}")
+        db.close()
+
+def bench_lookup(args):
+    """比較按ID查詢資源：不經緩存、緩存命中、其他worker持續登錄時的緩存命中
+    
+    在所有連接上跟蹤執行的SQL語句，區分讀表的查詢與PRAGMA data_version檢查。
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        db = create_benchmark_db(args.rows, directory)
+        # 另一個worker：登錄時更新last_active
+        other = LearningResourcesDB(db.db_path)
+        other.add_contributor(Contributor(id="bench-user", name="Bench", email="bench@example.com",
+                                          expertise_areas=[]))
+        with db.transaction() as cursor:
+            cursor.execute("SELECT id FROM learning_resources LIMIT ?", (args.keys,))
+            ids = [row[0] for row in cursor.fetchall()]
+        
+        def uncached():
+            for resource_id in ids:
+                LearningResource.from_row(db._fetch_one("SELECT * FROM learning_resources WHERE id = ?", resource_id))
+        
+        def cached():
+            for resource_id in ids:
+                db.get_learning_resource(resource_id)
+        
+        def cached_with_logins():
+            for i, resource_id in enumerate(ids):
+                if i % args.login_every == 0:
+                    other.update_contributor_last_active("bench-user")
+                db.get_learning_resource(resource_id)
+        
+        cached()  # 預熱緩存和連接
+        statements = []
+        connections = list(db._pool) + [db._sync_conn]
+        
+        print(f"{len(ids)} lookups over {args.rows} resources, login write every {args.login_every} lookups")
+        print(f"{'case':<28}{'us/lookup':>11}{'table queries':>15}{'pragmas':>9}{'hit rate':>10}")
+        for name, run in (("no cache", uncached), ("cache hit", cached),
+                          ("cache hit + logins", cached_with_logins)):
+            result = measure(run, args.repeat)
+            
+            before = db.get_cache_stats()["resources"]
+            statements.clear()
+            for conn in connections:
+                conn.set_trace_callback(statements.append)
+            run()
+            for conn in connections:
+                conn.set_trace_callback(None)
+            after = db.get_cache_stats()["resources"]
+            
+            pragmas = sum(1 for statement in statements if statement.startswith("PRAGMA"))
+            lookups = (after["hits"] + after["misses"]) - (before["hits"] + before["misses"])
+            hit_rate = (after["hits"] - before["hits"]) / lookups if lookups else 0.0
+            print(f"{name:<28}{result['ms'] * 1000 / len(ids):>11.1f}{(len(statements) - pragmas) / len(ids):>15.2f}"
+                  f"{pragmas / len(ids):>9.2f}{hit_rate:>10.0%}")
+        other.close()
+        db.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Learning resources benchmarks")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+    
+    decode_parser = subparsers.add_parser("decode", help="row decoding")
+    decode_parser.add_argument("--rows", type=int, default=10000)
+    decode_parser.add_argument("--repeat", type=int, default=5)
+    decode_parser.set_defaults(func=bench_decode)
+    
+    prioritized_parser = subparsers.add_parser("prioritized", help="get_prioritized_resources retrieval")
+    prioritized_parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    prioritized_parser.add_argument("--limit", type=int, default=10)
+    prioritized_parser.add_argument("--repeat", type=int, default=3)
+    prioritized_parser.add_argument("--exact", action="store_true", help="全表掃描計算真實top-k分數（大目錄較慢）")
+    prioritized_parser.set_defaults(func=bench_prioritized)
+    
+    prompt_parser = subparsers.add_parser("prompt", help="AI prompt token budget")
+    prompt_parser.add_argument("--rows", type=int, default=10000)
+    prompt_parser.set_defaults(func=bench_prompt)
+    
+    projection_parser = subparsers.add_parser("projection", help="fields projection on resource listing")
+    projection_parser.add_argument("--rows", type=int, default=10000)
+    projection_parser.add_argument("--page-size", type=int, default=100)
+    projection_parser.add_argument("--pages", type=int, default=20)
+    projection_parser.add_argument("--repeat", type=int, default=5)
+    projection_parser.set_defaults(func=bench_projection)
+    
+    lookup_parser = subparsers.add_parser("lookup", help="row cache hits on id lookups")
+    lookup_parser.add_argument("--rows", type=int, default=10000)
+    lookup_parser.add_argument("--keys", type=int, default=1000)
+    lookup_parser.add_argument("--login-every", type=int, default=50)
+    lookup_parser.add_argument("--repeat", type=int, default=5)
+    lookup_parser.set_defaults(func=bench_lookup)
+    
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Circuit Breaker
+熔斷器
+
+保護對上游LLM API的調用：上游降級時直接走降級路徑，而不是每個請求都等到錯誤或超時：
+1. 關閉（closed）：正常放行，在滑動窗口內統計錯誤率和慢調用率
+2. 打開（open）：任一比率超過閾值後拒絕調用，持續open_duration秒
+3. 半開（half_open）：放行少量探測請求，全部成功則關閉，任一失敗則重新打開
+4. 線程安全（健康檢查與請求在不同線程讀取狀態）
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+class CircuitBreaker:
+    """基於滑動窗口錯誤率和慢調用率的熔斷器"""
+    
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    
+    # 默認參數：窗口大小、計算比率所需的最少調用數、錯誤率和慢調用率閾值、
+    # 慢調用時長（秒）、打開持續時長（秒）、半開時的探測請求數
+    DEFAULT_WINDOW_SIZE = 20
+    DEFAULT_MIN_CALLS = 5
+    DEFAULT_FAILURE_RATE_THRESHOLD = 0.5
+    DEFAULT_SLOW_CALL_RATE_THRESHOLD = 0.8
+    DEFAULT_SLOW_CALL_DURATION = 20.0
+    DEFAULT_OPEN_DURATION = 30.0
+    DEFAULT_HALF_OPEN_PROBES = 2
+    
+    def __init__(self, window_size: int = DEFAULT_WINDOW_SIZE,
+                 min_calls: int = DEFAULT_MIN_CALLS,
+                 failure_rate_threshold: float = DEFAULT_FAILURE_RATE_THRESHOLD,
+                 slow_call_rate_threshold: float = DEFAULT_SLOW_CALL_RATE_THRESHOLD,
+                 slow_call_duration: float = DEFAULT_SLOW_CALL_DURATION,
+                 open_duration: float = DEFAULT_OPEN_DURATION,
+                 half_open_probes: int = DEFAULT_HALF_OPEN_PROBES):
+        self.window_size = window_size
+        self.min_calls = min_calls
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.slow_call_duration = slow_call_duration
+        self.open_duration = open_duration
+        self.half_open_probes = half_open_probes
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        # 窗口中每次調用記為(是否失敗, 是否慢調用)
+        self._window: "deque[tuple]" = deque(maxlen=window_size)
+        self._opened_at: Optional[float] = None
+        self._probes_started = 0
+        self._probes_succeeded = 0
+        self.rejected = 0
+        self.times_opened = 0
+    
+    @property
+    def state(self) -> str:
+        """當前狀態；打開時間已滿時視為半開"""
+        with self._lock:
+            self._refresh_state()
+            return self._state
+    
+    def allow_request(self) -> bool:
+        """是否放行一次上游調用；放行後必須調用record_success/record_failure/release之一"""
+        with self._lock:
+            self._refresh_state()
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and self._probes_started < self.half_open_probes:
+                self._probes_started += 1
+                return True
+            self.rejected += 1
+            return False
+    
+    def record_success(self, duration: float):
+        """記錄一次成功的調用（超過慢調用時長的仍計為慢調用）"""
+        self._record(False, duration)
+    
+    def record_failure(self, duration: float):
+        """記錄一次失敗的調用（網絡錯誤、超時或上游錯誤狀態碼）"""
+        self._record(True, duration)
+    
+    def release(self):
+        """放行後調用被取消、沒有結果時歸還探測名額"""
+        with self._lock:
+            if self._state == self.HALF_OPEN and self._probes_started > self._probes_succeeded:
+                self._probes_started -= 1
+    
+    def reset(self):
+        """恢復為關閉狀態並清空窗口"""
+        with self._lock:
+            self._close()
+    
+    def stats(self) -> Dict:
+        """返回熔斷器狀態和窗口統計"""
+        with self._lock:
+            self._refresh_state()
+            calls = len(self._window)
+            failures = sum(1 for failed, _ in self._window if failed)
+            slow = sum(1 for _, is_slow in self._window if is_slow)
+            return {
+                "state": self._state,
+                "window_calls": calls,
+                "failure_rate": failures / calls if calls else 0.0,
+                "slow_call_rate": slow / calls if calls else 0.0,
+                "rejected": self.rejected,
+                "times_opened": self.times_opened,
+                "retry_after": (
+                    max(0.0, self._opened_at + self.open_duration - time.monotonic())
+                    if self._state == self.OPEN else 0.0
+                )
+            }
+    
+    def _record(self, failed: bool, duration: float):
+        slow = duration >= self.slow_call_duration
+        with self._lock:
+            self._refresh_state()
+            if self._state == self.HALF_OPEN:
+                if failed or slow:
+                    self._open()
+                else:
+                    self._probes_succeeded += 1
+                    if self._probes_succeeded >= self.half_open_probes:
+                        self._close()
+                return
+            if self._state == self.OPEN:
+                # 打開前已放行的調用，結果不再影響狀態
+                return
+            
+            self._window.append((failed, slow))
+            calls = len(self._window)
+            if calls < self.min_calls:
+                return
+            failures = sum(1 for was_failed, _ in self._window if was_failed)
+            slow_calls = sum(1 for _, was_slow in self._window if was_slow)
+            if (failures / calls >= self.failure_rate_threshold
+                    or slow_calls / calls >= self.slow_call_rate_threshold):
+                self._open()
+    
+    def _refresh_state(self):
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.open_duration:
+            self._state = self.HALF_OPEN
+            self._probes_started = 0
+            self._probes_succeeded = 0
+    
+    def _open(self):
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._window.clear()
+        self.times_opened += 1
+    
+    def _close(self):
+        self._state = self.CLOSED
+        self._opened_at = None
+        self._window.clear()
+        self._probes_started = 0
+        self._probes_succeeded = 0
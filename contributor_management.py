@@ -5,31 +5,28 @@ Contributor Management System
 提供貢獻者註冊、登錄、資源管理等功能
 """
 
-import json
 import hashlib
 import secrets
-import sqlite3
+import time
 from datetime import datetime, timedelta
 from typing import Optional, List, Dict
-from dataclasses import dataclass
 import uuid
-from learning_resources import LearningResourcesDB, Contributor, LearningResource, ResourceType, DifficultyLevel, ResourceStatus
-
-@dataclass
-class ContributorSession:
-    """貢獻者會話"""
-    session_id: str
-    contributor_id: str
-    expires_at: datetime
-    created_at: datetime
+from learning_resources import LearningResourcesDB, Contributor, LearningResource, ResourceType, DifficultyLevel, ResourceStatus, encode_json_list
+from session_store import SessionStore, MemorySessionStore
 
 class ContributorAuth:
     """貢獻者認證系統"""
     
-    def __init__(self, db: LearningResourcesDB):
+    # 會話上緩存的貢獻者快照的刷新間隔（秒）
+    CONTRIBUTOR_REFRESH_INTERVAL = 30.0
+    
+    def __init__(self, db: LearningResourcesDB, session_store: Optional[SessionStore] = None,
+                 contributor_refresh_interval: float = CONTRIBUTOR_REFRESH_INTERVAL):
         self.db = db
-        self.sessions: Dict[str, ContributorSession] = {}
+        # 會話存儲：默認在進程內；多worker部署時使用SQLiteSessionStore或SignedTokenSessionStore
+        self.sessions: SessionStore = session_store or MemorySessionStore()
         self.session_duration = timedelta(hours=24)
+        self.contributor_refresh_interval = contributor_refresh_interval
     
     def hash_password(self, password: str) -> str:
         """密碼哈希"""
@@ -88,15 +85,8 @@ class ContributorAuth:
             # 在實際應用中，應該存儲密碼哈希並進行驗證
             
             # 創建會話
-            session_id = self.generate_session_id()
-            session = ContributorSession(
-                session_id=session_id,
-                contributor_id=contributor.id,
-                expires_at=datetime.now() + self.session_duration,
-                created_at=datetime.now()
-            )
-            
-            self.sessions[session_id] = session
+            session = self.sessions.create(contributor.id, self.session_duration)
+            session_id = session.session_id
             
             # 更新最後活躍時間
             self.db.update_contributor_last_active(contributor.id)
@@ -119,23 +109,28 @@ class ContributorAuth:
             return {"success": False, "message": f"登錄錯誤: {str(e)}"}
     
     def verify_session(self, session_id: str) -> Optional[Contributor]:
-        """驗證會話"""
-        if session_id not in self.sessions:
-            return None
+        """驗證會話
         
-        session = self.sessions[session_id]
-        if datetime.now() > session.expires_at:
-            del self.sessions[session_id]
+        返回會話上緩存的貢獻者快照，超過刷新間隔才重新讀取數據庫。
+        進程內存儲的會話對象常駐內存，快照在請求之間復用；
+        共享存儲每次返回新的會話對象，仍按ID讀取貢獻者（經數據庫的查詢緩存）。
+        """
+        session = self.sessions.get(session_id)
+        if session is None:
             return None
         
-        return self.db.get_contributor(session.contributor_id)
+        now = time.monotonic()
+        if session.contributor is None or now - session.contributor_loaded_at > self.contributor_refresh_interval:
+            contributor = self.db.get_contributor(session.contributor_id)
+            if contributor is None:
+                return None
+            session.contributor = contributor
+            session.contributor_loaded_at = now
+        return session.contributor
     
     def logout_contributor(self, session_id: str) -> bool:
         """登出貢獻者"""
-        if session_id in self.sessions:
-            del self.sessions[session_id]
-            return True
-        return False
+        return self.sessions.delete(session_id)
 
 class ContributorResourceManager:
     """貢獻者資源管理器"""
@@ -285,115 +280,41 @@ class ContributorResourceManager:
 class ExtendedLearningResourcesDB(LearningResourcesDB):
     """擴展的學習資源數據庫"""
     
-    def get_contributor_by_email(self, email: str) -> Optional[Contributor]:
-        """根據郵箱獲取貢獻者"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM contributors WHERE email = ?', (email,))
-        row = cursor.fetchone()
-        conn.close()
-        
-        if row:
-            return Contributor(
-                id=row[0],
-                name=row[1],
-                email=row[2],
-                expertise_areas=json.loads(row[3]) if row[3] else [],
-                organization=row[4] or "",
-                bio=row[5] or "",
-                is_verified=bool(row[6]),
-                created_at=row[7],
-                last_active=row[8]
-            )
-        return None
-    
-    def update_contributor_last_active(self, contributor_id: str) -> bool:
-        """更新貢獻者最後活躍時間"""
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                UPDATE contributors 
-                SET last_active = ?
-                WHERE id = ?
-            ''', (datetime.now().isoformat(), contributor_id))
-            
-            conn.commit()
-            conn.close()
-            return True
-        except Exception:
-            return False
-    
     def get_resources_by_contributor(self, contributor_id: str) -> List[LearningResource]:
         """獲取貢獻者的所有資源"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT * FROM learning_resources 
-            WHERE created_by = ?
-            ORDER BY last_updated DESC
-        ''', (contributor_id,))
-        
-        rows = cursor.fetchall()
-        conn.close()
-        
-        resources = []
-        for row in rows:
-            resources.append(LearningResource(
-                id=row[0],
-                title=row[1],
-                description=row[2],
-                url=row[3],
-                resource_type=ResourceType(row[4]),
-                difficulty=DifficultyLevel(row[5]),
-                duration=row[6],
-                cost=row[7],
-                language=row[8],
-                provider=row[9],
-                author=row[10],
-                rating=row[11],
-                review_count=row[12],
-                hashtags=json.loads(row[13]) if row[13] else [],
-                prerequisites=json.loads(row[14]) if row[14] else [],
-                learning_outcomes=json.loads(row[15]) if row[15] else [],
-                target_audience=row[16],
-                last_updated=row[17],
-                created_by=row[18],
-                status=ResourceStatus(row[19]),
-                priority_score=row[20],
-                ai_relevance_score=row[21]
-            ))
+        with self.transaction() as cursor:
+            cursor.execute('''
+                SELECT * FROM learning_resources 
+                WHERE created_by = ?
+                ORDER BY last_updated DESC
+            ''', (contributor_id,))
+            
+            rows = cursor.fetchall()
         
-        return resources
+        return [LearningResource.from_row(row) for row in rows]
     
     def update_learning_resource(self, resource: LearningResource) -> bool:
         """更新學習資源"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                UPDATE learning_resources 
-                SET title = ?, description = ?, url = ?, resource_type = ?, 
-                    difficulty = ?, duration = ?, cost = ?, language = ?, 
-                    provider = ?, author = ?, hashtags = ?, prerequisites = ?, 
-                    learning_outcomes = ?, target_audience = ?, last_updated = ?, 
-                    status = ?, priority_score = ?, ai_relevance_score = ?
-                WHERE id = ?
-            ''', (
-                resource.title, resource.description, resource.url, resource.resource_type.value,
-                resource.difficulty.value, resource.duration, resource.cost, resource.language,
-                resource.provider, resource.author, json.dumps(resource.hashtags),
-                json.dumps(resource.prerequisites), json.dumps(resource.learning_outcomes),
-                resource.target_audience, resource.last_updated, resource.status.value,
-                resource.priority_score, resource.ai_relevance_score, resource.id
-            ))
-            
-            conn.commit()
-            conn.close()
+            with self.transaction() as cursor:
+                cursor.execute('''
+                    UPDATE learning_resources 
+                    SET title = ?, description = ?, url = ?, resource_type = ?, 
+                        difficulty = ?, duration = ?, cost = ?, language = ?, 
+                        provider = ?, author = ?, hashtags = ?, prerequisites = ?, 
+                        learning_outcomes = ?, target_audience = ?, last_updated = ?, 
+                        status = ?, priority_score = ?, ai_relevance_score = ?
+                    WHERE id = ?
+                ''', (
+                    resource.title, resource.description, resource.url, resource.resource_type.value,
+                    resource.difficulty.value, resource.duration, resource.cost, resource.language,
+                    resource.provider, resource.author, encode_json_list(resource.hashtags),
+                    encode_json_list(resource.prerequisites), encode_json_list(resource.learning_outcomes),
+                    resource.target_audience, resource.last_updated, resource.status.value,
+                    resource.priority_score, resource.ai_relevance_score, resource.id
+                ))
+                self._invalidate_cached(self._resource_cache, resource.id)
+            self._index_resource(resource.id, resource)
             return True
         except Exception:
             return False
@@ -401,13 +322,10 @@ class ExtendedLearningResourcesDB(LearningResourcesDB):
     def delete_learning_resource(self, resource_id: str) -> bool:
         """刪除學習資源"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('DELETE FROM learning_resources WHERE id = ?', (resource_id,))
-            
-            conn.commit()
-            conn.close()
+            with self.transaction() as cursor:
+                cursor.execute('DELETE FROM learning_resources WHERE id = ?', (resource_id,))
+                self._invalidate_cached(self._resource_cache, resource_id)
+            self._unindex_resource(resource_id)
             return True
         except Exception:
             return False
@@ -0,0 +1,63 @@
+"""
+HTTP Caching
+HTTP條件請求與響應壓縮
+
+供只讀端點使用：
+1. 由目錄代數和請求參數生成弱ETag，目錄未變時以304響應，無需重新查詢和序列化
+2. 客戶端接受時以brotli（可用時）或gzip壓縮較大的響應
+"""
+
+import gzip
+import hashlib
+from typing import Iterable, Tuple
+
+try:
+    import brotli
+except ImportError:  # 未安裝brotli時只使用gzip
+    brotli = None
+
+BROTLI_AVAILABLE = brotli is not None
+
+# 小於此大小（字節）的響應不壓縮
+MIN_COMPRESS_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+def catalog_etag(generation: int, path: str, params: Iterable[Tuple[str, str]]) -> str:
+    """由目錄代數、路徑和查詢參數（與順序無關）生成ETag值"""
+    digest = hashlib.sha1()
+    digest.update(f"{generation}|{path}".encode("utf-8"))
+    for key, value in sorted(params):
+        digest.update(f"|{key}={value}".encode("utf-8"))
+    return f"{generation}-{digest.hexdigest()[:16]}"
+
+def choose_encoding(accept_encoding) -> str:
+    """按Accept-Encoding選擇壓縮格式，不壓縮時返回空字符串"""
+    if BROTLI_AVAILABLE and accept_encoding["br"]:
+        return "br"
+    if accept_encoding["gzip"]:
+        return "gzip"
+    return ""
+
+def compress_response(response, accept_encoding):
+    """原地壓縮響應體（流式響應、已編碼或過小的響應保持不變）"""
+    response.vary.add("Accept-Encoding")
+    if (response.direct_passthrough or response.is_streamed
+            or "Content-Encoding" in response.headers):
+        return response
+    
+    body = response.get_data()
+    if len(body) < MIN_COMPRESS_SIZE:
+        return response
+    
+    encoding = choose_encoding(accept_encoding)
+    if encoding == "br":
+        body = brotli.compress(body, quality=BROTLI_QUALITY)
+    elif encoding == "gzip":
+        body = gzip.compress(body, compresslevel=GZIP_LEVEL)
+    else:
+        return response
+    
+    response.set_data(body)
+    response.headers["Content-Encoding"] = encoding
+    return response
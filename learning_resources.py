@@ -10,16 +10,24 @@ Prioritised Learning Resources Database System
 5. 降級機制
 """
 
+import base64
 import json
 import sqlite3
 import hashlib
 import re
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
-from typing import List, Dict, Optional, Tuple
+from itertools import islice
+from typing import Any, Callable, Hashable, List, Dict, Optional, Sequence, Tuple, Iterable, Iterator, Union
 from dataclasses import dataclass, asdict
 from enum import Enum
 import uuid
 
+from lookup_cache import LRUCache
+from vector_index import NUMPY_AVAILABLE, ResourceVectorIndex
+
 class ResourceType(Enum):
     COURSE = "course"
     BOOK = "book"
@@ -44,41 +52,142 @@ class ResourceStatus(Enum):
     PENDING_REVIEW = "pending_review"
     ARCHIVED = "archived"
 
-@dataclass
+# 數據庫值到枚舉的直接映射，避免逐行調用Enum構造函數
+_RESOURCE_TYPES = {member.value: member for member in ResourceType}
+_DIFFICULTY_LEVELS = {member.value: member for member in DifficultyLevel}
+_RESOURCE_STATUSES = {member.value: member for member in ResourceStatus}
+
+def _json_list_property(slot: str) -> property:
+    """JSON列表欄位：數據庫原文在首次訪問時才解碼，解碼結果緩存在同一slot中"""
+    def getter(self):
+        value = getattr(self, slot)
+        if isinstance(value, str):
+            value = json.loads(value) if value else []
+            setattr(self, slot, value)
+        return value
+    
+    def setter(self, value):
+        setattr(self, slot, [] if value is None else value)
+    
+    return property(getter, setter)
+
 class LearningResource:
-    """學習資源數據模型"""
-    id: str
-    title: str
-    description: str
-    url: str
-    resource_type: ResourceType
-    difficulty: DifficultyLevel
-    duration: str  # e.g., "2 weeks", "40 hours"
-    cost: str  # e.g., "Free", "Paid ($99)", "Freemium"
-    language: str = "en"
-    provider: str = ""  # e.g., "Coursera", "YouTube", "GitHub"
-    author: str = ""
-    rating: float = 0.0  # 0-5 stars
-    review_count: int = 0
-    hashtags: List[str] = None
-    prerequisites: List[str] = None
-    learning_outcomes: List[str] = None
-    target_audience: str = ""
-    last_updated: str = ""
-    created_by: str = ""  # contributor ID
-    status: ResourceStatus = ResourceStatus.ACTIVE
-    priority_score: float = 1.0  # 基礎優先級分數
-    ai_relevance_score: float = 0.0  # AI計算的相關性分數
+    """學習資源數據模型
     
-    def __post_init__(self):
-        if self.hashtags is None:
-            self.hashtags = []
-        if self.prerequisites is None:
-            self.prerequisites = []
-        if self.learning_outcomes is None:
-            self.learning_outcomes = []
-        if not self.last_updated:
-            self.last_updated = datetime.now().isoformat()
+    使用__slots__以減少大量結果集的內存佔用；從數據庫讀取時由from_row構建，
+    hashtags、prerequisites、learning_outcomes保留JSON原文，首次訪問時才解碼。
+    """
+    
+    FIELDS = (
+        'id', 'title', 'description', 'url', 'resource_type', 'difficulty', 'duration', 'cost',
+        'language', 'provider', 'author', 'rating', 'review_count', 'hashtags', 'prerequisites',
+        'learning_outcomes', 'target_audience', 'last_updated', 'created_by', 'status',
+        'priority_score', 'ai_relevance_score'
+    )
+    
+    # 以JSON原文存儲的列表欄位
+    JSON_FIELDS = frozenset(('hashtags', 'prerequisites', 'learning_outcomes'))
+    
+    __slots__ = (
+        'id', 'title', 'description', 'url', 'resource_type', 'difficulty', 'duration', 'cost',
+        'language', 'provider', 'author', 'rating', 'review_count', '_hashtags', '_prerequisites',
+        '_learning_outcomes', 'target_audience', 'last_updated', 'created_by', 'status',
+        'priority_score', 'ai_relevance_score'
+    )
+    
+    hashtags = _json_list_property('_hashtags')
+    prerequisites = _json_list_property('_prerequisites')
+    learning_outcomes = _json_list_property('_learning_outcomes')
+    
+    def __init__(self, id: str, title: str, description: str, url: str,
+                 resource_type: ResourceType, difficulty: DifficultyLevel,
+                 duration: str,  # e.g., "2 weeks", "40 hours"
+                 cost: str,  # e.g., "Free", "Paid ($99)", "Freemium"
+                 language: str = "en",
+                 provider: str = "",  # e.g., "Coursera", "YouTube", "GitHub"
+                 author: str = "",
+                 rating: float = 0.0,  # 0-5 stars
+                 review_count: int = 0,
+                 hashtags: List[str] = None,
+                 prerequisites: List[str] = None,
+                 learning_outcomes: List[str] = None,
+                 target_audience: str = "",
+                 last_updated: str = "",
+                 created_by: str = "",  # contributor ID
+                 status: ResourceStatus = ResourceStatus.ACTIVE,
+                 priority_score: float = 1.0,  # 基礎優先級分數
+                 ai_relevance_score: float = 0.0):  # AI計算的相關性分數
+        self.id = id
+        self.title = title
+        self.description = description
+        self.url = url
+        self.resource_type = resource_type
+        self.difficulty = difficulty
+        self.duration = duration
+        self.cost = cost
+        self.language = language
+        self.provider = provider
+        self.author = author
+        self.rating = rating
+        self.review_count = review_count
+        self.hashtags = hashtags
+        self.prerequisites = prerequisites
+        self.learning_outcomes = learning_outcomes
+        self.target_audience = target_audience
+        self.last_updated = last_updated or datetime.now().isoformat()
+        self.created_by = created_by
+        self.status = status
+        self.priority_score = priority_score
+        self.ai_relevance_score = ai_relevance_score
+    
+    @classmethod
+    def from_row(cls, row: Tuple) -> "LearningResource":
+        """從learning_resources的SELECT *行構建資源（所有讀取路徑共用）"""
+        resource = cls.__new__(cls)
+        (resource.id, resource.title, resource.description, resource.url, resource_type,
+         difficulty, resource.duration, resource.cost, resource.language, resource.provider,
+         resource.author, resource.rating, resource.review_count, hashtags, prerequisites,
+         learning_outcomes, resource.target_audience, resource.last_updated,
+         resource.created_by, status, resource.priority_score, resource.ai_relevance_score) = row
+        resource.resource_type = _RESOURCE_TYPES[resource_type]
+        resource.difficulty = _DIFFICULTY_LEVELS[difficulty]
+        resource.status = _RESOURCE_STATUSES[status]
+        # JSON原文留待首次訪問時解碼
+        resource._hashtags = hashtags or []
+        resource._prerequisites = prerequisites or []
+        resource._learning_outcomes = learning_outcomes or []
+        return resource
+    
+    @classmethod
+    def project_row(cls, row: Tuple, fields: Sequence[str]) -> Dict[str, Any]:
+        """把以fields開頭的投影行解碼為字典（多出的列如分頁鍵被忽略）
+        
+        枚舉列在數據庫中已是對外使用的值，只有被選中的JSON列需要解碼。
+        """
+        projected = dict(zip(fields, row))
+        for name in cls.JSON_FIELDS.intersection(projected):
+            value = projected[name]
+            projected[name] = json.loads(value) if value else []
+        return projected
+    
+    def __eq__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.FIELDS)
+    
+    __hash__ = None
+    
+    def copy(self) -> "LearningResource":
+        """返回副本；已解碼的列表欄位一併複製，修改副本不影響原對象"""
+        resource = self.__class__.__new__(self.__class__)
+        for slot in self.__slots__:
+            value = getattr(self, slot)
+            setattr(resource, slot, list(value) if isinstance(value, list) else value)
+        return resource
+    
+    def __repr__(self):
+        fields = ', '.join(f'{name}={getattr(self, name)!r}' for name in self.FIELDS)
+        return f'{self.__class__.__name__}({fields})'
 
 @dataclass
 class Contributor:
@@ -96,19 +205,349 @@ class Contributor:
     def __post_init__(self):
         if not self.created_at:
             self.created_at = datetime.now().isoformat()
+    
+    @classmethod
+    def from_row(cls, row: Tuple) -> "Contributor":
+        """從contributors的SELECT *行構建貢獻者"""
+        return cls(
+            id=row[0],
+            name=row[1],
+            email=row[2],
+            expertise_areas=json.loads(row[3]) if row[3] else [],
+            organization=row[4] or "",
+            bio=row[5] or "",
+            is_verified=bool(row[6]),
+            created_at=row[7],
+            last_active=row[8]
+        )
+
+def encode_json_list(values: Optional[List[str]]) -> str:
+    """編碼JSON列表欄位；保留非ASCII字符原文，使全文索引和子串匹配能直接命中CJK文本"""
+    return json.dumps(values if values is not None else [], ensure_ascii=False)
+
+def encode_cursor(*values) -> str:
+    """將分頁位置編碼為不透明的游標字符串"""
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> List:
+    """解碼分頁游標；格式錯誤時拋出ValueError"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise ValueError("無效的分頁游標")
+    if not isinstance(values, list) or len(values) != 2:
+        raise ValueError("無效的分頁游標")
+    return values
 
 class LearningResourcesDB:
     """學習資源數據庫管理系統"""
     
+    # 每個連接建立時執行一次的調優參數
+    CONNECTION_PRAGMAS = (
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA mmap_size=268435456",  # 256MB
+        "PRAGMA cache_size=-65536",  # 64MB
+        "PRAGMA temp_store=MEMORY",
+    )
+    
+    # semantic_search的BM25欄位權重（title, description, hashtags, learning_outcomes）
+    SEARCH_BM25_WEIGHTS = (10.0, 2.0, 5.0, 3.0)
+    # 混合排序中priority_score的權重
+    SEARCH_PRIORITY_WEIGHT = 0.5
+    
+    # get_resources_page / iter_resources允許的過濾欄位
+    RESOURCE_FILTER_COLUMNS = ("status", "resource_type", "difficulty", "created_by", "provider", "language")
+    
+    # 批量導入使用的upsert語句：URL已存在時更新內容，保留原ID、創建者和評分
+    _UPSERT_RESOURCE_SQL = '''
+        INSERT INTO learning_resources 
+        (id, title, description, url, resource_type, difficulty, duration, cost,
+         language, provider, author, rating, review_count, hashtags, prerequisites,
+         learning_outcomes, target_audience, last_updated, created_by, status,
+         priority_score, ai_relevance_score)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(url) DO UPDATE SET
+            title = excluded.title, description = excluded.description,
+            resource_type = excluded.resource_type, difficulty = excluded.difficulty,
+            duration = excluded.duration, cost = excluded.cost, language = excluded.language,
+            provider = excluded.provider, author = excluded.author, hashtags = excluded.hashtags,
+            prerequisites = excluded.prerequisites, learning_outcomes = excluded.learning_outcomes,
+            target_audience = excluded.target_audience, last_updated = excluded.last_updated,
+            status = excluded.status, priority_score = excluded.priority_score
+    '''
+    
+    # 向量索引維度（每個資源佔用 VECTOR_DIM * 4 字節）
+    VECTOR_DIM = 512
+    
+    # get_prioritized_resources：候選估計超過目錄的該比例時改為全表順序掃描打分
+    PRIORITIZED_SCAN_RATIO = 0.3
+    # 估計全文索引匹配數時抽樣的匹配個數
+    PRIORITIZED_SAMPLE_SIZE = 1000
+    # 匹配的標籤不超過該數時直接在hashtags JSON原文上打分，不逐行查倒排表
+    PRIORITIZED_INLINE_TAGS = 8
+    
+    # 按ID/郵箱查詢的行緩存：每個緩存的條目上限和存活秒數
+    LOOKUP_CACHE_SIZE = 4096
+    LOOKUP_CACHE_TTL = 300.0
+    # 行緩存失效日誌保留的記錄數
+    LOOKUP_INVALIDATION_LOG_SIZE = 10000
+    
+    # 搜索/推薦結果緩存的條目上限（每條為一次查詢的結果列表）
+    QUERY_CACHE_SIZE = 512
+    
+    # 連接池保留的空閒連接上限；並發事務超出時臨時建立的連接在歸還時關閉
+    CONNECTION_POOL_SIZE = 8
+    
     def __init__(self, db_path: str = "learning_resources.db"):
         self.db_path = db_path
+        self.fts_enabled = False
+        self._local = threading.local()
+        self._pool: List[sqlite3.Connection] = []
+        self._pool_lock = threading.Lock()
+        self._opened_connections = 0
+        self._vector_index: Optional[ResourceVectorIndex] = None
+        self._vector_index_lock = threading.Lock()
+        # 緩存數據庫原始行（不可變元組），每次命中都構建新對象，調用方修改不會污染緩存；
+        # 其他worker的寫入經cache_invalidations日誌逐鍵失效
+        self._resource_cache = LRUCache(self.LOOKUP_CACHE_SIZE, self.LOOKUP_CACHE_TTL)
+        self._contributor_cache = LRUCache(self.LOOKUP_CACHE_SIZE, self.LOOKUP_CACHE_TTL)
+        # 檢查其他連接提交的專用連接，及已處理到的(data_version, 失效日誌序號)
+        self._sync_conn: Optional[sqlite3.Connection] = None
+        self._sync_lock = threading.Lock()
+        self._synced_data_version: Optional[int] = None
+        self._synced_invalidation = 0
+        # 鍵包含目錄代數，寫入後舊條目不再命中，無需逐鍵失效和TTL
+        self._query_cache = LRUCache(self.QUERY_CACHE_SIZE, ttl=None)
+        # 目錄代數的進程內快照(代數, 讀取時間)，本進程提交寫入時清空
+        self._generation_snapshot: Optional[Tuple[int, float]] = None
         self.init_database()
     
+    def _open_connection(self) -> sqlite3.Connection:
+        """建立新連接並套用調優參數"""
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        for pragma in self.CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        with self._pool_lock:
+            self._opened_connections += 1
+        return conn
+    
+    def _acquire_connection(self) -> sqlite3.Connection:
+        """從連接池借出連接，池空時建立新連接"""
+        with self._pool_lock:
+            if self._pool:
+                return self._pool.pop()
+        return self._open_connection()
+    
+    def _release_connection(self, conn: sqlite3.Connection):
+        """歸還連接；池已滿時關閉"""
+        if conn.in_transaction:
+            conn.rollback()
+        with self._pool_lock:
+            if len(self._pool) < self.CONNECTION_POOL_SIZE:
+                self._pool.append(conn)
+                return
+        conn.close()
+    
+    def get_connection(self) -> sqlite3.Connection:
+        """獲取當前線程事務中的連接（只在transaction內有效）"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            raise RuntimeError("get_connection只能在transaction內調用")
+        return conn
+    
+    @contextmanager
+    def transaction(self):
+        """事務上下文：最外層從連接池借出連接，正常結束時提交、出錯時回滾，隨後歸還；可嵌套
+        
+        連接只在事務期間被線程佔用，打開的連接數受並發事務數限制，
+        不會隨服務器創建的請求線程數增長。
+        """
+        local = self._local
+        if getattr(local, "depth", 0) == 0:
+            local.conn = self._acquire_connection()
+            local.depth = 0
+            local.pending_invalidations = []
+        conn = local.conn
+        local.depth += 1
+        try:
+            yield conn.cursor()
+        except BaseException:
+            local.depth -= 1
+            if local.depth == 0:
+                self._end_transaction(conn, commit=False)
+            raise
+        else:
+            local.depth -= 1
+            if local.depth == 0:
+                self._end_transaction(conn, commit=True)
+    
+    def _end_transaction(self, conn: sqlite3.Connection, commit: bool):
+        """結束最外層事務：提交或回滾，歸還連接，執行登記的緩存失效"""
+        self._local.conn = None
+        try:
+            if commit:
+                # 只有執行過寫語句時連接才處於事務中
+                wrote = conn.in_transaction
+                conn.commit()
+                if wrote:
+                    self._generation_snapshot = None
+            else:
+                conn.rollback()
+        finally:
+            self._release_connection(conn)
+            self._flush_invalidations()
+    
+    def _invalidate_cached(self, cache: LRUCache, *keys):
+        """使緩存條目失效；在事務中時，最外層事務結束後再失效一次
+        
+        第二次失效覆蓋了其他線程在提交前讀到舊行並寫回緩存的情況。
+        """
+        cache.invalidate(*keys)
+        if getattr(self._local, "depth", 0) > 0:
+            self._local.pending_invalidations.append((cache, keys))
+    
+    def _flush_invalidations(self):
+        """執行當前線程事務期間登記的緩存失效"""
+        pending, self._local.pending_invalidations = self._local.pending_invalidations, []
+        for cache, keys in pending:
+            cache.invalidate(*keys)
+    
+    def get_cache_stats(self) -> Dict:
+        """返回查詢緩存的命中統計"""
+        return {
+            "resources": self._resource_cache.stats(),
+            "contributors": self._contributor_cache.stats(),
+            "queries": self._query_cache.stats()
+        }
+    
+    def get_connection_stats(self) -> Dict:
+        """返回連接池統計：空閒連接數和累計建立的連接數"""
+        with self._pool_lock:
+            return {"idle": len(self._pool), "pool_size": self.CONNECTION_POOL_SIZE,
+                    "opened": self._opened_connections}
+    
+    def get_catalog_generation(self, max_age: float = 0.0) -> int:
+        """目錄代數：learning_resources每寫入一行，觸發器都會將其加一（對其他進程的寫入同樣有效）
+        
+        max_age > 0時可返回不超過max_age秒的進程內快照而不查詢數據庫；
+        本進程的寫入提交後快照立即失效，其他worker的寫入最多延遲max_age秒可見。
+        """
+        if max_age > 0:
+            snapshot = self._generation_snapshot
+            if snapshot is not None and time.monotonic() - snapshot[1] <= max_age:
+                return snapshot[0]
+        
+        generation = self._read_state("generation")
+        self._generation_snapshot = (generation, time.monotonic())
+        return generation
+    
+    def _read_state(self, name: str) -> int:
+        """讀取catalog_state中的計數器"""
+        return self._fetch_one("SELECT value FROM catalog_state WHERE name = ?", name)[0]
+    
+    def _cached_lookup(self, cache: LRUCache, key: Hashable,
+                       loader: Callable[[], Optional[Any]]) -> Optional[Any]:
+        """經行緩存的單行查詢
+        
+        先同步其他連接的失效再讀行：並發寫入提交後，下次查詢會使加載中或已緩存的舊行失效。
+        事務內不讀寫緩存，理由同cached_query。
+        """
+        if getattr(self._local, "depth", 0) > 0:
+            return loader()
+        self._sync_lookup_caches()
+        return cache.get_or_load(key, loader)
+    
+    def _sync_lookup_caches(self):
+        """按cache_invalidations中其他連接新提交的記錄逐鍵失效行緩存
+        
+        PRAGMA data_version只檢查WAL索引頭，其他連接沒有提交過寫入時不讀取任何表，
+        因此緩存命中不產生數據庫查詢。
+        """
+        with self._sync_lock:
+            if self._sync_conn is None:
+                self._sync_conn = self._open_connection()
+            data_version = self._sync_conn.execute('PRAGMA data_version').fetchone()[0]
+            if data_version == self._synced_data_version:
+                return
+            
+            if self._synced_data_version is None:
+                # 首次同步或連接重建：之前的寫入無從得知，清空後從日誌末尾開始
+                self._resource_cache.clear()
+                self._contributor_cache.clear()
+                self._synced_invalidation = self._sync_conn.execute(
+                    'SELECT COALESCE(MAX(seq), 0) FROM cache_invalidations'
+                ).fetchone()[0]
+            else:
+                rows = self._sync_conn.execute(
+                    'SELECT seq, cache, key FROM cache_invalidations WHERE seq > ? ORDER BY seq',
+                    (self._synced_invalidation,)
+                ).fetchall()
+                if rows and rows[0][0] != self._synced_invalidation + 1:
+                    # 日誌已截斷掉未處理的記錄，無法逐鍵重放
+                    self._resource_cache.clear()
+                    self._contributor_cache.clear()
+                elif rows:
+                    keys = {"resource": [], "contributor": [], "contributor_email": []}
+                    for _, cache, key in rows:
+                        keys[cache].append(key)
+                    self._resource_cache.invalidate(*keys["resource"])
+                    self._contributor_cache.invalidate(
+                        *[("id", key) for key in keys["contributor"]],
+                        *[("email", key) for key in keys["contributor_email"]]
+                    )
+                if rows:
+                    self._synced_invalidation = rows[-1][0]
+            self._synced_data_version = data_version
+    
+    def cached_query(self, key: Tuple, loader: Callable[[], Any], use_cache: bool = True) -> Any:
+        """按(目錄代數, key)緩存查詢結果
+        
+        事務內不讀寫緩存：未提交的寫入已使代數遞增，若回滾，緩存中會留下與代數不符的結果。
+        """
+        if not use_cache or getattr(self._local, "depth", 0) > 0:
+            return loader()
+        
+        cache_key = (self.get_catalog_generation(),) + key
+        cached = self._query_cache.get(cache_key)
+        if cached is not None:
+            return self._copy_result(cached)
+        
+        result = loader()
+        self._query_cache.put(cache_key, self._copy_result(result))
+        return result
+    
+    def _copy_result(self, result: Any) -> Any:
+        """複製查詢結果中的資源對象，使調用方的修改（如ai_relevance_score）不會影響緩存"""
+        if isinstance(result, LearningResource):
+            return result.copy()
+        if isinstance(result, dict):
+            return {key: list(value) if isinstance(value, list) else value for key, value in result.items()}
+        if isinstance(result, (list, tuple)):
+            return type(result)(self._copy_result(item) for item in result)
+        return result
+    
+    def close(self):
+        """保存向量索引並關閉連接池中的連接（正在事務中的連接歸還時按池容量處理）"""
+        self.save_vector_index()
+        with self._pool_lock:
+            connections, self._pool = self._pool, []
+        with self._sync_lock:
+            if self._sync_conn is not None:
+                connections.append(self._sync_conn)
+                self._sync_conn = None
+                self._synced_data_version = None
+        for conn in connections:
+            conn.close()
+    
     def init_database(self):
         """初始化數據庫表結構"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
+        with self.transaction() as cursor:
+            self._create_schema(cursor)
+    
+    def _create_schema(self, cursor: sqlite3.Cursor):
+        """創建表和索引"""
         # 創建貢獻者表
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS contributors (
@@ -167,208 +606,588 @@ class LearningResourcesDB:
         ''')
         
         # 創建索引
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_resources_hashtags ON learning_resources(hashtags)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_resources_type ON learning_resources(resource_type)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_resources_difficulty ON learning_resources(difficulty)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_resources_status ON learning_resources(status)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_resources_priority ON learning_resources(priority_score)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_resources_last_updated ON learning_resources(last_updated, id)')
         
-        conn.commit()
-        conn.close()
+        # hashtags為JSON字符串，該索引無法服務LIKE查詢，由resource_hashtags表取代
+        cursor.execute('DROP INDEX IF EXISTS idx_resources_hashtags')
+        self._create_hashtag_index(cursor)
+        self._create_stats_table(cursor)
+        self._create_generation_counter(cursor)
+        self._create_invalidation_log(cursor)
+        self._create_revision_log(cursor)
+        
+        self.fts_enabled = self._create_search_index(cursor)
+        self._unescape_json_lists(cursor)
+    
+    def _unescape_json_lists(self, cursor: sqlite3.Cursor):
+        """把舊版以\\uXXXX轉義存儲的JSON列表欄位改寫為原文（只更新有變化的行）"""
+        cursor.execute('''
+            SELECT rowid, hashtags, prerequisites, learning_outcomes FROM learning_resources
+            WHERE hashtags LIKE '%\\u%' OR prerequisites LIKE '%\\u%' OR learning_outcomes LIKE '%\\u%'
+        ''')
+        updates = []
+        for rowid, *columns in cursor.fetchall():
+            rewritten = [encode_json_list(json.loads(value)) if value else value for value in columns]
+            if rewritten != columns:
+                updates.append((*rewritten, rowid))
+        if updates:
+            cursor.executemany(
+                'UPDATE learning_resources SET hashtags = ?, prerequisites = ?, learning_outcomes = ? WHERE rowid = ?',
+                updates
+            )
+    
+    def _create_hashtag_index(self, cursor: sqlite3.Cursor):
+        """創建hashtag倒排表及同步觸發器"""
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'resource_hashtags'"
+        )
+        is_new = cursor.fetchone() is None
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS resource_hashtags (
+                resource_id TEXT NOT NULL,
+                tag TEXT NOT NULL,
+                PRIMARY KEY (tag, resource_id)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_resource_hashtags_resource ON resource_hashtags(resource_id)')
+        
+        # 標籤統一小寫存儲；非法JSON按空數組處理。
+        # 用DISTINCT去掉僅大小寫不同的重複標籤，而非OR IGNORE：觸發器內的衝突策略會被外層語句
+        # （如批量導入的ON CONFLICT DO UPDATE）覆蓋，重複標籤會使整條語句失敗
+        for name in ("resource_hashtags_ai", "resource_hashtags_ad", "resource_hashtags_au"):
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+        cursor.execute('''
+            CREATE TRIGGER resource_hashtags_ai AFTER INSERT ON learning_resources BEGIN
+                INSERT INTO resource_hashtags(resource_id, tag)
+                SELECT DISTINCT new.id, LOWER(value) FROM json_each(
+                    CASE WHEN json_valid(new.hashtags) THEN new.hashtags ELSE '[]' END
+                );
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER resource_hashtags_ad AFTER DELETE ON learning_resources BEGIN
+                DELETE FROM resource_hashtags WHERE resource_id = old.id;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER resource_hashtags_au AFTER UPDATE OF id, hashtags ON learning_resources BEGIN
+                DELETE FROM resource_hashtags WHERE resource_id = old.id;
+                INSERT INTO resource_hashtags(resource_id, tag)
+                SELECT DISTINCT new.id, LOWER(value) FROM json_each(
+                    CASE WHEN json_valid(new.hashtags) THEN new.hashtags ELSE '[]' END
+                );
+            END
+        ''')
+        
+        # 一次性遷移已有數據
+        if is_new:
+            cursor.execute('''
+                INSERT INTO resource_hashtags(resource_id, tag)
+                SELECT DISTINCT r.id, LOWER(j.value) FROM learning_resources r, json_each(
+                    CASE WHEN json_valid(r.hashtags) THEN r.hashtags ELSE '[]' END
+                ) j
+            ''')
+    
+    def _create_generation_counter(self, cursor: sqlite3.Cursor):
+        """創建目錄代數計數器：任何對learning_resources的寫入都會使其遞增"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS catalog_state (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute("INSERT OR IGNORE INTO catalog_state (name, value) VALUES ('generation', 0)")
+        
+        for suffix, event in (("ai", "INSERT"), ("au", "UPDATE"), ("ad", "DELETE")):
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS catalog_generation_{suffix} AFTER {event} ON learning_resources BEGIN
+                    UPDATE catalog_state SET value = value + 1 WHERE name = 'generation';
+                END
+            ''')
+            # 貢獻者的行緩存已改為按鍵失效（見_create_invalidation_log）
+            cursor.execute(f'DROP TRIGGER IF EXISTS contributors_generation_{suffix}')
+    
+    def _create_invalidation_log(self, cursor: sqlite3.Cursor):
+        """創建行緩存失效日誌：資源和貢獻者被修改或刪除時記錄其緩存鍵
+        
+        各worker只在其他連接提交過寫入時讀取新增的記錄並逐鍵失效（見_sync_lookup_caches），
+        登錄時更新last_active只使該貢獻者的條目失效。插入不需記錄：行緩存不保存不存在的行。
+        日誌只保留最近LOOKUP_INVALIDATION_LOG_SIZE條，落後更多的worker清空行緩存。
+        """
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS cache_invalidations (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                cache TEXT NOT NULL,
+                key TEXT NOT NULL
+            )
+        ''')
+        
+        for suffix, event in (("au", "UPDATE"), ("ad", "DELETE")):
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS resource_invalidation_{suffix} AFTER {event} ON learning_resources BEGIN
+                    INSERT INTO cache_invalidations (cache, key) VALUES ('resource', OLD.id);
+                END
+            ''')
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS contributor_invalidation_{suffix} AFTER {event} ON contributors BEGIN
+                    INSERT INTO cache_invalidations (cache, key) VALUES ('contributor', OLD.id);
+                END
+            ''')
+        # 郵箱到ID的映射只在郵箱改變或貢獻者被刪除時失效
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS contributor_email_invalidation_au
+            AFTER UPDATE OF email ON contributors WHEN OLD.email IS NOT NEW.email BEGIN
+                INSERT INTO cache_invalidations (cache, key) VALUES ('contributor_email', OLD.email);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS contributor_email_invalidation_ad AFTER DELETE ON contributors BEGIN
+                INSERT INTO cache_invalidations (cache, key) VALUES ('contributor_email', OLD.email);
+            END
+        ''')
+        
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS cache_invalidations_trim AFTER INSERT ON cache_invalidations BEGIN
+                DELETE FROM cache_invalidations WHERE seq <= NEW.seq - {self.LOOKUP_INVALIDATION_LOG_SIZE};
+            END
+        ''')
+    
+    def _create_revision_log(self, cursor: sqlite3.Cursor):
+        """創建資源修訂記錄：每個資源最近一次文本改動（含刪除）的遞增修訂號
+        
+        各worker的向量索引據此增量同步其他進程的寫入。
+        觸發器用UPSERT子句寫入：觸發器內的OR REPLACE會被外層語句（如批量導入的ON CONFLICT）的衝突策略覆蓋。
+        """
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS resource_revisions (
+                resource_id TEXT PRIMARY KEY,
+                revision INTEGER NOT NULL
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_resource_revisions_revision ON resource_revisions(revision)')
+        
+        next_revision = "(SELECT COALESCE(MAX(revision), 0) + 1 FROM resource_revisions)"
+        for suffix, event, row in (
+            ("ai", "INSERT", "NEW"),
+            ("au", "UPDATE OF title, description, hashtags, learning_outcomes", "NEW"),
+            ("ad", "DELETE", "OLD"),
+        ):
+            cursor.execute(f'DROP TRIGGER IF EXISTS resource_revision_{suffix}')
+            cursor.execute(f'''
+                CREATE TRIGGER resource_revision_{suffix} AFTER {event} ON learning_resources BEGIN
+                    INSERT INTO resource_revisions (resource_id, revision)
+                    VALUES ({row}.id, {next_revision})
+                    ON CONFLICT(resource_id) DO UPDATE SET revision = excluded.revision;
+                END
+            ''')
+    
+    def _create_stats_table(self, cursor: sqlite3.Cursor):
+        """創建統計計數表及維護觸發器，使統計概覽成為O(1)讀取"""
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'resource_stats'"
+        )
+        is_new = cursor.fetchone() is None
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS resource_stats (
+                dimension TEXT NOT NULL,  -- total / status / resource_type / difficulty / provider
+                value TEXT NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (dimension, value)
+            ) WITHOUT ROWID
+        ''')
+        
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS resource_stats_ai AFTER INSERT ON learning_resources BEGIN
+                {self._stats_delta_sql('new', 1)}
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS resource_stats_ad AFTER DELETE ON learning_resources BEGIN
+                {self._stats_delta_sql('old', -1)}
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS resource_stats_au
+            AFTER UPDATE OF status, resource_type, difficulty, provider ON learning_resources BEGIN
+                {self._stats_delta_sql('old', -1)}
+                {self._stats_delta_sql('new', 1)}
+            END
+        ''')
+        
+        # 首次創建時從已有數據統計
+        if is_new:
+            self._recompute_stats(cursor)
+    
+    def _stats_delta_sql(self, alias: str, delta: int) -> str:
+        """生成按行增減各統計維度計數的SQL（alias為new或old）"""
+        return f'''
+                INSERT INTO resource_stats(dimension, value, count)
+                SELECT 'total', '', {delta}
+                UNION ALL SELECT 'status', {alias}.status, {delta}
+                UNION ALL SELECT 'resource_type', {alias}.resource_type, {delta}
+                UNION ALL SELECT 'difficulty', {alias}.difficulty, {delta}
+                UNION ALL SELECT 'provider', {alias}.provider, {delta} WHERE COALESCE({alias}.provider, '') <> ''
+                ON CONFLICT(dimension, value) DO UPDATE SET count = count + excluded.count;
+        '''
+    
+    def _recompute_stats(self, cursor: sqlite3.Cursor):
+        """用GROUP BY查詢重新計算全部統計計數"""
+        cursor.execute('DELETE FROM resource_stats')
+        cursor.execute("INSERT INTO resource_stats SELECT 'total', '', COUNT(*) FROM learning_resources")
+        for column in ("status", "resource_type", "difficulty"):
+            cursor.execute(f'''
+                INSERT INTO resource_stats
+                SELECT '{column}', {column}, COUNT(*) FROM learning_resources GROUP BY {column}
+            ''')
+        cursor.execute('''
+            INSERT INTO resource_stats
+            SELECT 'provider', provider, COUNT(*) FROM learning_resources
+            WHERE COALESCE(provider, '') <> '' GROUP BY provider
+        ''')
+    
+    def recompute_resource_stats(self):
+        """重新計算統計計數（用於校正或繞過觸發器的批量修改之後）"""
+        with self.transaction() as cursor:
+            self._recompute_stats(cursor)
+    
+    def get_stats_overview(self, top_providers: int = 10, recent: int = 5) -> Dict:
+        """獲取系統統計概覽（讀取計數表，不掃描資源表）"""
+        with self.transaction() as cursor:
+            cursor.execute('''
+                SELECT dimension, value, count FROM resource_stats
+                WHERE count > 0 AND dimension <> 'provider'
+            ''')
+            counters = cursor.fetchall()
+            cursor.execute('''
+                SELECT value, count FROM resource_stats
+                WHERE dimension = 'provider' AND count > 0
+                ORDER BY count DESC, value
+                LIMIT ?
+            ''', (top_providers,))
+            providers = cursor.fetchall()
+        
+        by_dimension: Dict[str, Dict] = {"total": {}, "status": {}, "resource_type": {}, "difficulty": {}}
+        for dimension, value, count in counters:
+            by_dimension[dimension][value] = count
+        
+        recent_resources = self.get_resources_page(limit=recent)[0]
+        
+        return {
+            "total_resources": by_dimension["total"].get("", 0),
+            "active_resources": by_dimension["status"].get(ResourceStatus.ACTIVE.value, 0),
+            "pending_resources": by_dimension["status"].get(ResourceStatus.PENDING_REVIEW.value, 0),
+            "resource_types": by_dimension["resource_type"],
+            "difficulty_distribution": {int(k): v for k, v in by_dimension["difficulty"].items()},
+            "top_providers": dict(providers),
+            "recent_resources": [
+                {
+                    "id": r.id,
+                    "title": r.title,
+                    "resource_type": r.resource_type.value,
+                    "provider": r.provider,
+                    "last_updated": r.last_updated
+                }
+                for r in recent_resources
+            ]
+        }
+    
+    def _create_search_index(self, cursor: sqlite3.Cursor) -> bool:
+        """創建FTS5全文索引及同步觸發器；SQLite不支持FTS5或trigram分詞器時返回False
+        
+        使用trigram分詞器：查詢按子串匹配，與LIKE搜索和相關性打分的語義一致，
+        中日韓等不以空格分詞的文本也能按任意子串命中（unicode61會把整段CJK當作一個詞）。
+        """
+        cursor.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'learning_resources_fts'"
+        )
+        row = cursor.fetchone()
+        if row is not None and "trigram" not in row[0]:
+            # 舊版unicode61索引：刪除後按trigram重建
+            cursor.execute("DROP TABLE learning_resources_fts")
+            row = None
+        is_new = row is None
+        
+        try:
+            # 外部內容表：索引與learning_resources按rowid對應，不重複存儲原文
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS learning_resources_fts USING fts5(
+                    title, description, hashtags, learning_outcomes,
+                    content='learning_resources', content_rowid='rowid',
+                    tokenize='trigram case_sensitive 0'
+                )
+            ''')
+        except sqlite3.OperationalError:
+            return False
+        
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS learning_resources_fts_ai AFTER INSERT ON learning_resources BEGIN
+                INSERT INTO learning_resources_fts(rowid, title, description, hashtags, learning_outcomes)
+                VALUES (new.rowid, new.title, new.description, new.hashtags, new.learning_outcomes);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS learning_resources_fts_ad AFTER DELETE ON learning_resources BEGIN
+                INSERT INTO learning_resources_fts(learning_resources_fts, rowid, title, description, hashtags, learning_outcomes)
+                VALUES ('delete', old.rowid, old.title, old.description, old.hashtags, old.learning_outcomes);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS learning_resources_fts_au AFTER UPDATE ON learning_resources BEGIN
+                INSERT INTO learning_resources_fts(learning_resources_fts, rowid, title, description, hashtags, learning_outcomes)
+                VALUES ('delete', old.rowid, old.title, old.description, old.hashtags, old.learning_outcomes);
+                INSERT INTO learning_resources_fts(rowid, title, description, hashtags, learning_outcomes)
+                VALUES (new.rowid, new.title, new.description, new.hashtags, new.learning_outcomes);
+            END
+        ''')
+        
+        # 首次創建時為已有數據建立索引
+        if is_new:
+            cursor.execute("INSERT INTO learning_resources_fts(learning_resources_fts) VALUES ('rebuild')")
+        return True
+    
+    def rebuild_search_index(self) -> bool:
+        """重建全文索引（VACUUM可能改變rowid，執行後需調用）"""
+        if not self.fts_enabled:
+            return False
+        with self.transaction() as cursor:
+            cursor.execute("INSERT INTO learning_resources_fts(learning_resources_fts) VALUES ('rebuild')")
+        return True
     
     def add_contributor(self, contributor: Contributor) -> bool:
         """添加貢獻者"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT INTO contributors 
-                (id, name, email, expertise_areas, organization, bio, is_verified, created_at, last_active)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                contributor.id,
-                contributor.name,
-                contributor.email,
-                json.dumps(contributor.expertise_areas),
-                contributor.organization,
-                contributor.bio,
-                contributor.is_verified,
-                contributor.created_at,
-                contributor.last_active
-            ))
-            
-            conn.commit()
-            conn.close()
+            with self.transaction() as cursor:
+                cursor.execute('''
+                    INSERT INTO contributors 
+                    (id, name, email, expertise_areas, organization, bio, is_verified, created_at, last_active)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (
+                    contributor.id,
+                    contributor.name,
+                    contributor.email,
+                    json.dumps(contributor.expertise_areas),
+                    contributor.organization,
+                    contributor.bio,
+                    contributor.is_verified,
+                    contributor.created_at,
+                    contributor.last_active
+                ))
+                self._invalidate_cached(self._contributor_cache, ("id", contributor.id), ("email", contributor.email))
             return True
         except sqlite3.IntegrityError:
             return False
     
     def get_contributor(self, contributor_id: str) -> Optional[Contributor]:
-        """獲取貢獻者信息"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM contributors WHERE id = ?', (contributor_id,))
-        row = cursor.fetchone()
-        conn.close()
-        
-        if row:
-            return Contributor(
-                id=row[0],
-                name=row[1],
-                email=row[2],
-                expertise_areas=json.loads(row[3]) if row[3] else [],
-                organization=row[4] or "",
-                bio=row[5] or "",
-                is_verified=bool(row[6]),
-                created_at=row[7],
-                last_active=row[8]
-            )
-        return None
+        """獲取貢獻者信息（經查詢緩存）"""
+        row = self._cached_lookup(
+            self._contributor_cache, ("id", contributor_id),
+            lambda: self._fetch_one('SELECT * FROM contributors WHERE id = ?', contributor_id)
+        )
+        return Contributor.from_row(row) if row else None
     
     def get_contributor_by_email(self, email: str) -> Optional[Contributor]:
-        """根據郵箱獲取貢獻者"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM contributors WHERE email = ?', (email,))
-        row = cursor.fetchone()
-        conn.close()
-        
-        if row:
-            return Contributor(
-                id=row[0],
-                name=row[1],
-                email=row[2],
-                expertise_areas=json.loads(row[3]) if row[3] else [],
-                organization=row[4] or "",
-                bio=row[5] or "",
-                is_verified=bool(row[6]),
-                created_at=row[7],
-                last_active=row[8]
-            )
-        return None
+        """根據郵箱獲取貢獻者（緩存郵箱到ID的映射，再按ID讀取）"""
+        contributor_id = self._cached_lookup(
+            self._contributor_cache, ("email", email),
+            lambda: (self._fetch_one('SELECT id FROM contributors WHERE email = ?', email) or (None,))[0]
+        )
+        return self.get_contributor(contributor_id) if contributor_id else None
     
     def update_contributor_last_active(self, contributor_id: str) -> bool:
         """更新貢獻者最後活躍時間"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                UPDATE contributors 
-                SET last_active = ?
-                WHERE id = ?
-            ''', (datetime.now().isoformat(), contributor_id))
-            
-            conn.commit()
-            conn.close()
+            with self.transaction() as cursor:
+                cursor.execute('''
+                    UPDATE contributors
+                    SET last_active = ?
+                    WHERE id = ?
+                ''', (datetime.now().isoformat(), contributor_id))
+                self._invalidate_cached(self._contributor_cache, ("id", contributor_id))
             return True
         except Exception:
             return False
     
+    def _fetch_one(self, query: str, *params) -> Optional[Tuple]:
+        """執行查詢並返回第一行"""
+        with self.transaction() as cursor:
+            cursor.execute(query, params)
+            return cursor.fetchone()
+
     def add_learning_resource(self, resource: LearningResource) -> bool:
         """添加學習資源"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT INTO learning_resources 
-                (id, title, description, url, resource_type, difficulty, duration, cost,
-                 language, provider, author, rating, review_count, hashtags, prerequisites,
-                 learning_outcomes, target_audience, last_updated, created_by, status,
-                 priority_score, ai_relevance_score)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                resource.id,
-                resource.title,
-                resource.description,
-                resource.url,
-                resource.resource_type.value,
-                resource.difficulty.value,
-                resource.duration,
-                resource.cost,
-                resource.language,
-                resource.provider,
-                resource.author,
-                resource.rating,
-                resource.review_count,
-                json.dumps(resource.hashtags),
-                json.dumps(resource.prerequisites),
-                json.dumps(resource.learning_outcomes),
-                resource.target_audience,
-                resource.last_updated,
-                resource.created_by,
-                resource.status.value,
-                resource.priority_score,
-                resource.ai_relevance_score
-            ))
-            
-            conn.commit()
-            conn.close()
+            with self.transaction() as cursor:
+                cursor.execute('''
+                    INSERT INTO learning_resources 
+                    (id, title, description, url, resource_type, difficulty, duration, cost,
+                     language, provider, author, rating, review_count, hashtags, prerequisites,
+                     learning_outcomes, target_audience, last_updated, created_by, status,
+                     priority_score, ai_relevance_score)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', self._resource_params(resource))
+                self._invalidate_cached(self._resource_cache, resource.id)
+            self._index_resource(resource.id, resource)
             return True
         except sqlite3.IntegrityError:
             return False
     
-    def get_learning_resource(self, resource_id: str) -> Optional[LearningResource]:
-        """獲取學習資源"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def add_learning_resources_bulk(self, resources: Iterable[Union[LearningResource, Dict, str]],
+                                    batch_size: int = 1000) -> List[Dict]:
+        """批量導入學習資源
         
-        cursor.execute('SELECT * FROM learning_resources WHERE id = ?', (resource_id,))
-        row = cursor.fetchone()
-        conn.close()
+        resources可以是LearningResource、字典或NDJSON行（如直接傳入打開的文件）。
+        每批在一個事務中逐行寫入，URL已存在時更新該資源（保留原ID）。
+        返回每行的結果：{"index", "status": inserted|updated|error, "id", "url", "message"}
+        """
+        outcomes = []
+        items = iter(enumerate(resources))
         
-        if row:
-            return LearningResource(
-                id=row[0],
-                title=row[1],
-                description=row[2],
-                url=row[3],
-                resource_type=ResourceType(row[4]),
-                difficulty=DifficultyLevel(row[5]),
-                duration=row[6],
-                cost=row[7],
-                language=row[8],
-                provider=row[9],
-                author=row[10],
-                rating=row[11],
-                review_count=row[12],
-                hashtags=json.loads(row[13]) if row[13] else [],
-                prerequisites=json.loads(row[14]) if row[14] else [],
-                learning_outcomes=json.loads(row[15]) if row[15] else [],
-                target_audience=row[16],
-                last_updated=row[17],
-                created_by=row[18],
-                status=ResourceStatus(row[19]),
-                priority_score=row[20],
-                ai_relevance_score=row[21]
-            )
-        return None
+        while True:
+            batch = list(islice(items, batch_size))
+            if not batch:
+                break
+            
+            rows = []
+            batch_outcomes = []
+            for index, item in batch:
+                try:
+                    resource = self._coerce_resource(item)
+                except (ValueError, KeyError, TypeError) as e:
+                    batch_outcomes.append({"index": index, "status": "error", "message": str(e)})
+                    continue
+                if resource is not None:
+                    rows.append((index, resource))
+            
+            batch_outcomes.extend(self._upsert_resource_batch(rows))
+            outcomes.extend(sorted(batch_outcomes, key=lambda outcome: outcome["index"]))
+            
+            resources_by_index = dict(rows)
+            written = [outcome for outcome in batch_outcomes if outcome["status"] != "error"]
+            self._invalidate_cached(self._resource_cache, *(outcome["id"] for outcome in written))
+            for outcome in written:
+                self._index_resource(outcome["id"], resources_by_index[outcome["index"]])
+        
+        self.save_vector_index()
+        return outcomes
     
-    def search_resources_by_hashtags(self, hashtags: List[str], limit: int = 10) -> List[LearningResource]:
-        """根據hashtag搜索資源"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def _upsert_resource_batch(self, rows: List[Tuple[int, LearningResource]]) -> List[Dict]:
+        """在單個事務中寫入一批資源"""
+        if not rows:
+            return []
+        with self.transaction() as cursor:
+            return [self._upsert_resource_row(cursor, index, resource) for index, resource in rows]
+    
+    def _upsert_resource_row(self, cursor: sqlite3.Cursor, index: int, resource: LearningResource) -> Dict:
+        """寫入單個資源並返回結果
         
-        # 構建搜索查詢
-        hashtag_conditions = []
-        params = []
+        插入還是更新由寫入前數據庫中是否已有該URL決定，同批中的重複URL也會看到前面的行。
+        約束錯誤只回滾出錯的語句，不影響同一事務中的其他行。
+        """
+        cursor.execute('SELECT id FROM learning_resources WHERE url = ?', (resource.url,))
+        existing = cursor.fetchone()
+        try:
+            cursor.execute(self._UPSERT_RESOURCE_SQL, self._resource_params(resource))
+        except sqlite3.IntegrityError as e:
+            return {"index": index, "status": "error", "id": resource.id, "url": resource.url, "message": str(e)}
+        return {"index": index, "status": "updated" if existing else "inserted",
+                "id": existing[0] if existing else resource.id, "url": resource.url}
+    
+    def _coerce_resource(self, item: Union[LearningResource, Dict, str]) -> Optional[LearningResource]:
+        """將批量導入的輸入轉換為LearningResource；空行返回None"""
+        if isinstance(item, LearningResource):
+            return item
+        if isinstance(item, (str, bytes)):
+            if not item.strip():
+                return None
+            item = json.loads(item)
+        if not isinstance(item, dict):
+            raise TypeError("每行必須是JSON對象")
         
-        for hashtag in hashtags:
-            hashtag_conditions.append("hashtags LIKE ?")
-            params.append(f'%"{hashtag}"%')
+        return LearningResource(
+            id=item.get("id") or str(uuid.uuid4()),
+            title=item["title"],
+            description=item.get("description", ""),
+            url=item["url"],
+            resource_type=ResourceType(item["resource_type"]),
+            difficulty=DifficultyLevel(item["difficulty"]),
+            duration=item.get("duration", ""),
+            cost=item.get("cost", "Free"),
+            language=item.get("language", "en"),
+            provider=item.get("provider", ""),
+            author=item.get("author", ""),
+            rating=item.get("rating", 0.0),
+            review_count=item.get("review_count", 0),
+            hashtags=item.get("hashtags", []),
+            prerequisites=item.get("prerequisites", []),
+            learning_outcomes=item.get("learning_outcomes", []),
+            target_audience=item.get("target_audience", ""),
+            last_updated=item.get("last_updated", ""),
+            created_by=item.get("created_by", ""),
+            status=ResourceStatus(item.get("status", ResourceStatus.ACTIVE.value)),
+            priority_score=item.get("priority_score", 1.0)
+        )
+    
+    def _resource_params(self, resource: LearningResource) -> Tuple:
+        """資源寫入參數（與INSERT列順序一致）"""
+        return (
+            resource.id,
+            resource.title,
+            resource.description,
+            resource.url,
+            resource.resource_type.value,
+            resource.difficulty.value,
+            resource.duration,
+            resource.cost,
+            resource.language,
+            resource.provider,
+            resource.author,
+            resource.rating,
+            resource.review_count,
+            encode_json_list(resource.hashtags),
+            encode_json_list(resource.prerequisites),
+            encode_json_list(resource.learning_outcomes),
+            resource.target_audience,
+            resource.last_updated,
+            resource.created_by,
+            resource.status.value,
+            resource.priority_score,
+            resource.ai_relevance_score
+        )
+    
+    def get_learning_resource(self, resource_id: str) -> Optional[LearningResource]:
+        """獲取學習資源（經查詢緩存）"""
+        row = self._cached_lookup(
+            self._resource_cache, resource_id,
+            lambda: self._fetch_one('SELECT * FROM learning_resources WHERE id = ?', resource_id)
+        )
+        return LearningResource.from_row(row) if row else None
+    
+    def search_resources_by_hashtags(self, hashtags: List[str], limit: int = 10) -> List[LearningResource]:
+        """根據hashtag搜索資源（按匹配標籤數排序）"""
+        # 構建搜索查詢
+        tags = list(dict.fromkeys(tag.lower() for tag in hashtags))
         
-        if hashtag_conditions:
+        if tags:
+            placeholders = ', '.join('?' for _ in tags)
             query = f'''
-                SELECT * FROM learning_resources 
-                WHERE status = 'active' AND ({' OR '.join(hashtag_conditions)})
-                ORDER BY priority_score DESC, ai_relevance_score DESC
+                SELECT r.* FROM (
+                    SELECT resource_id, COUNT(*) AS match_count
+                    FROM resource_hashtags
+                    WHERE tag IN ({placeholders})
+                    GROUP BY resource_id
+                ) m
+                JOIN learning_resources r ON r.id = m.resource_id
+                WHERE r.status = 'active'
+                ORDER BY m.match_count DESC, r.priority_score DESC, r.ai_relevance_score DESC
                 LIMIT ?
             '''
-            params.append(limit)
+            params = tags + [limit]
         else:
             query = '''
                 SELECT * FROM learning_resources 
@@ -378,112 +1197,322 @@ class LearningResourcesDB:
             '''
             params = [limit]
         
-        cursor.execute(query, params)
-        rows = cursor.fetchall()
-        conn.close()
+        with self.transaction() as cursor:
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
         
-        resources = []
-        for row in rows:
-            resources.append(LearningResource(
-                id=row[0],
-                title=row[1],
-                description=row[2],
-                url=row[3],
-                resource_type=ResourceType(row[4]),
-                difficulty=DifficultyLevel(row[5]),
-                duration=row[6],
-                cost=row[7],
-                language=row[8],
-                provider=row[9],
-                author=row[10],
-                rating=row[11],
-                review_count=row[12],
-                hashtags=json.loads(row[13]) if row[13] else [],
-                prerequisites=json.loads(row[14]) if row[14] else [],
-                learning_outcomes=json.loads(row[15]) if row[15] else [],
-                target_audience=row[16],
-                last_updated=row[17],
-                created_by=row[18],
-                status=ResourceStatus(row[19]),
-                priority_score=row[20],
-                ai_relevance_score=row[21]
-            ))
-        
-        return resources
+        return [LearningResource.from_row(row) for row in rows]
     
     def semantic_search(self, query: str, limit: int = 10) -> List[LearningResource]:
-        """語義搜索（基於標題和描述的文本匹配）"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        """語義搜索（FTS5全文索引，按BM25相關性與優先級的混合分數排序）
         
-        # 使用LIKE進行文本搜索
-        search_terms = query.lower().split()
-        conditions = []
-        params = []
+        關鍵詞匹配不足limit個時，用向量相似度補充換了說法的相關資源。
+        """
+        return self.semantic_search_page(query, limit)[0]
+    
+    def semantic_search_page(self, query: str, limit: int = 10,
+                             fields: Optional[Sequence[str]] = None) -> Tuple[List, Optional[str]]:
+        """語義搜索的第一頁，返回(資源列表, 下一頁游標)；之後的頁用search_resources_page按游標讀取
         
-        for term in search_terms:
-            conditions.append("(LOWER(title) LIKE ? OR LOWER(description) LIKE ? OR LOWER(hashtags) LIKE ?)")
-            params.extend([f'%{term}%', f'%{term}%', f'%{term}%'])
+        關鍵詞結果不足limit個時已沒有下一頁，用向量相似度補充換了說法的相關資源。
+        fields: 欄位投影；給定時返回字典列表，補充的資源按同樣的欄位投影
+        """
+        if fields:
+            fields = self._validate_fields(fields)
+        # 去重需要id，未請求時臨時加入投影
+        projection = fields + ["id"] if fields and "id" not in fields else fields
+        resources, next_cursor = self.search_resources_page(query, limit, fields=projection)
+        if len(resources) < limit and query.strip():
+            seen = {resource["id"] if projection else resource.id for resource in resources}
+            for resource, _ in self.vector_search(query, limit):
+                if len(resources) >= limit:
+                    break
+                if resource.id not in seen:
+                    if projection:
+                        values = dict(zip(LearningResource.FIELDS, self._resource_params(resource)))
+                        resource = LearningResource.project_row(tuple(values[name] for name in projection), projection)
+                    resources.append(resource)
+        if projection is not fields:
+            for resource in resources:
+                del resource["id"]
+        return resources, next_cursor
+    
+    # ---------- 向量索引 ----------
+    
+    def get_vector_index(self) -> Optional[ResourceVectorIndex]:
+        """獲取向量索引（首次使用時從文件載入，文件過期則從數據庫重建）；無NumPy時返回None
         
-        if conditions:
-            query_sql = f'''
-                SELECT * FROM learning_resources 
-                WHERE status = 'active' AND ({' OR '.join(conditions)})
-                ORDER BY priority_score DESC, ai_relevance_score DESC
-                LIMIT ?
+        每次獲取時按resource_revisions應用其他進程的寫入。
+        """
+        if not NUMPY_AVAILABLE:
+            return None
+        
+        with self._vector_index_lock:
+            if self._vector_index is None:
+                path = None if self.db_path == ":memory:" else f"{self.db_path}.vectors"
+                index = ResourceVectorIndex(path, self.VECTOR_DIM)
+                # 在讀取資源之前記下修訂號，之後的改動由下次同步補上
+                revision = self._latest_revision()
+                signature = self._catalog_signature()
+                if index.load() and index.signature == signature:
+                    # 文件記錄了保存時已應用的修訂號，簽名計算之前提交的改動在此補上
+                    self._sync_vector_index(index)
+                else:
+                    index.rebuild(
+                        ((r.id, self._embedding_text(r)) for r in self.iter_resources(page_size=2000)),
+                        signature
+                    )
+                    index.revision = revision
+                    index.save()
+                self._vector_index = index
+            else:
+                self._sync_vector_index(self._vector_index)
+        return self._vector_index
+    
+    def _latest_revision(self) -> int:
+        """已提交的最大資源修訂號"""
+        return self._fetch_one('SELECT COALESCE(MAX(revision), 0) FROM resource_revisions')[0]
+    
+    def _sync_vector_index(self, index: ResourceVectorIndex):
+        """把修訂號大於index.revision的資源重新向量化，已刪除的從索引移除"""
+        revision = self._latest_revision()
+        if revision <= index.revision:
+            return
+        
+        with self.transaction() as cursor:
+            cursor.execute('''
+                SELECT v.resource_id, r.* FROM resource_revisions v
+                LEFT JOIN learning_resources r ON r.id = v.resource_id
+                WHERE v.revision > ? AND v.revision <= ?
+            ''', (index.revision, revision))
+            rows = cursor.fetchall()
+        
+        for row in rows:
+            if row[1] is None:
+                index.remove(row[0])
+            else:
+                index.upsert(row[0], self._embedding_text(LearningResource.from_row(row[1:])))
+        index.revision = revision
+    
+    def save_vector_index(self):
+        """將有改動的向量索引寫回文件（服務關閉時調用，重啟後無需重建）
+        
+        先應用其他進程的寫入再計算簽名；文件已由其他worker保存到相同修訂號時不再重寫。
+        """
+        with self._vector_index_lock:
+            index = self._vector_index
+            if index is None or not index.dirty:
+                return
+            self._sync_vector_index(index)
+            signature = self._catalog_signature()
+            stored = index.stored_meta()
+            if stored is not None and stored.get("revision") == index.revision and stored.get("signature") == signature:
+                index.dirty = False
+                return
+            index.signature = signature
+            index.save()
+    
+    def vector_search(self, query: str, limit: int = 10, min_similarity: float = 0.05,
+                      difficulty_levels: List[DifficultyLevel] = None) -> List[Tuple[LearningResource, float]]:
+        """向量相似度檢索，返回按相似度排序的(有效資源, 相似度)"""
+        index = self.get_vector_index()
+        if index is None:
+            return []
+        
+        # 多取一些候選以抵消狀態和難度過濾
+        hits = index.search(query, limit * 3, min_similarity)
+        resources = self._get_resources_by_ids([resource_id for resource_id, _ in hits])
+        
+        results = []
+        for resource_id, similarity in hits:
+            resource = resources.get(resource_id)
+            if resource is None or resource.status != ResourceStatus.ACTIVE:
+                continue
+            if difficulty_levels and resource.difficulty not in difficulty_levels:
+                continue
+            results.append((resource, similarity))
+            if len(results) >= limit:
+                break
+        return results
+    
+    def _get_resources_by_ids(self, resource_ids: List[str]) -> Dict[str, LearningResource]:
+        """按ID批量獲取資源"""
+        if not resource_ids:
+            return {}
+        placeholders = ', '.join('?' for _ in resource_ids)
+        with self.transaction() as cursor:
+            cursor.execute(f'SELECT * FROM learning_resources WHERE id IN ({placeholders})', resource_ids)
+            rows = cursor.fetchall()
+        return {row[0]: LearningResource.from_row(row) for row in rows}
+    
+    def _catalog_signature(self) -> List:
+        """資源表的輕量指紋，用於判斷向量索引文件是否過期"""
+        with self.transaction() as cursor:
+            cursor.execute('SELECT COUNT(*), MAX(last_updated), TOTAL(rowid) FROM learning_resources')
+            return list(cursor.fetchone())
+    
+    def _embedding_text(self, resource: LearningResource) -> str:
+        """用於向量化的資源文本"""
+        return ' '.join([
+            resource.title or "",
+            resource.description or "",
+            ' '.join(resource.hashtags),
+            ' '.join(resource.learning_outcomes)
+        ])
+    
+    def _index_resource(self, resource_id: str, resource: LearningResource):
+        """資源寫入後更新已載入的向量索引（未載入時下次載入會按指紋重建）"""
+        if self._vector_index is not None:
+            self._vector_index.upsert(resource_id, self._embedding_text(resource))
+    
+    def _unindex_resource(self, resource_id: str):
+        """資源刪除後從已載入的向量索引中移除"""
+        if self._vector_index is not None:
+            self._vector_index.remove(resource_id)
+    
+    def search_resources_page(self, query: str, limit: int = 10, cursor: Optional[str] = None,
+                              use_cache: bool = True,
+                              fields: Optional[Sequence[str]] = None) -> Tuple[List, Optional[str]]:
+        """語義搜索分頁：按(排序分數, id)做keyset分頁，返回(資源列表, 下一頁游標)；結果經查詢緩存
+        
+        fields: 欄位投影；給定時只讀取這些列（加上分頁所需的id），返回字典列表
+        """
+        if cursor:
+            decode_cursor(cursor)  # 無效游標在查詢緩存之前報錯
+        if fields:
+            fields = self._validate_fields(fields)
+        key = ("search", ' '.join(query.lower().split()), limit, cursor, tuple(fields) if fields else None)
+        return self.cached_query(key, lambda: self._search_resources_page(query, limit, cursor, fields), use_cache)
+    
+    def _search_resources_page(self, query: str, limit: int, cursor: Optional[str],
+                               fields: Optional[Sequence[str]] = None) -> Tuple[List, Optional[str]]:
+        """執行語義搜索分頁查詢"""
+        match_query = self._build_match_query(query) if self.fts_enabled else ""
+        columns = self._projection_columns(fields, ("id",)) if fields else None
+        
+        if match_query:
+            bm25_weights = ', '.join(str(w) for w in self.SEARCH_BM25_WEIGHTS)
+            select = ', '.join(f'r.{column}' for column in columns) if columns else 'r.*'
+            inner_sql = f'''
+                SELECT {select}, (-bm25(learning_resources_fts, {bm25_weights}) + ? * r.priority_score) AS sort_score
+                FROM learning_resources_fts
+                JOIN learning_resources r ON r.rowid = learning_resources_fts.rowid
+                WHERE learning_resources_fts MATCH ? AND r.status = 'active'
             '''
-            params.append(limit)
+            params = [self.SEARCH_PRIORITY_WEIGHT, match_query]
+            
+            # trigram無法匹配的短詞用LIKE補充全文索引未命中的行
+            short_terms = [term for term in query.lower().split() if len(term) < self.FTS_MIN_TERM_LENGTH]
+            if short_terms:
+                like_sql, like_params = self._build_like_search_query(' '.join(short_terms), columns, match_query)
+                inner_sql = f'{inner_sql} UNION ALL {like_sql}'
+                params.extend(like_params)
         else:
-            query_sql = '''
-                SELECT * FROM learning_resources 
-                WHERE status = 'active'
-                ORDER BY priority_score DESC, ai_relevance_score DESC
-                LIMIT ?
-            '''
-            params = [limit]
+            # 無FTS5支持或查詢中沒有可索引的詞時，使用LIKE文本搜索
+            inner_sql, params = self._build_like_search_query(query, columns)
         
-        cursor.execute(query_sql, params)
-        rows = cursor.fetchall()
-        conn.close()
+        seek = ""
+        if cursor:
+            sort_score, resource_id = decode_cursor(cursor)
+            seek = "WHERE (sort_score, id) < (?, ?)"
+            params.extend([sort_score, resource_id])
         
-        resources = []
-        for row in rows:
-            resources.append(LearningResource(
-                id=row[0],
-                title=row[1],
-                description=row[2],
-                url=row[3],
-                resource_type=ResourceType(row[4]),
-                difficulty=DifficultyLevel(row[5]),
-                duration=row[6],
-                cost=row[7],
-                language=row[8],
-                provider=row[9],
-                author=row[10],
-                rating=row[11],
-                review_count=row[12],
-                hashtags=json.loads(row[13]) if row[13] else [],
-                prerequisites=json.loads(row[14]) if row[14] else [],
-                learning_outcomes=json.loads(row[15]) if row[15] else [],
-                target_audience=row[16],
-                last_updated=row[17],
-                created_by=row[18],
-                status=ResourceStatus(row[19]),
-                priority_score=row[20],
-                ai_relevance_score=row[21]
-            ))
-        
-        return resources
+        query_sql = f'''
+            SELECT * FROM ({inner_sql}) {seek}
+            ORDER BY sort_score DESC, id DESC
+            LIMIT ?
+        '''
+        params.append(limit)
+        
+        with self.transaction() as db_cursor:
+            db_cursor.execute(query_sql, params)
+            rows = db_cursor.fetchall()
+        
+        # 最後一列為sort_score
+        if columns:
+            resources = [LearningResource.project_row(row, fields) for row in rows]
+        else:
+            resources = [LearningResource.from_row(row[:-1]) for row in rows]
+        id_index = columns.index("id") if columns else 0
+        next_cursor = encode_cursor(rows[-1][-1], rows[-1][id_index]) if rows and len(rows) == limit else None
+        return resources, next_cursor
+    
+    def _validate_fields(self, fields: Sequence[str]) -> List[str]:
+        """校驗投影欄位（只允許資源表的列名，因為會拼接進SQL），去重並保持順序"""
+        fields = list(dict.fromkeys(fields))
+        unknown = [name for name in fields if name not in LearningResource.FIELDS]
+        if not fields or unknown:
+            raise ValueError(f"不支持的欄位: {', '.join(unknown)}")
+        return fields
+    
+    def _projection_columns(self, fields: Sequence[str], required: Sequence[str]) -> List[str]:
+        """投影的SQL列：請求的欄位在前，再補上分頁所需但未請求的列"""
+        columns = self._validate_fields(fields)
+        return columns + [column for column in required if column not in columns]
+    
+    # trigram索引能匹配的最短子串
+    FTS_MIN_TERM_LENGTH = 3
+    
+    def _build_match_query(self, query: str) -> str:
+        """將用戶輸入轉換為FTS5查詢：每個詞作子串匹配，詞之間為OR
+        
+        只包含trigram能匹配的詞，短詞由LIKE搜索補充；沒有這樣的詞時返回空字符串，由LIKE搜索處理整個查詢。
+        """
+        terms = [term for term in query.lower().split() if len(term) >= self.FTS_MIN_TERM_LENGTH]
+        return ' OR '.join(self._fts_phrase(term) for term in terms)
+    
+    def _fts_indexable(self, text: str) -> bool:
+        """trigram索引能否按子串匹配該文本（學習成果以JSON存儲，引號和反斜杠會被轉義）"""
+        return len(text) >= self.FTS_MIN_TERM_LENGTH and '"' not in text and '\\' not in text
+    
+    @staticmethod
+    def _fts_phrase(text: str) -> str:
+        """將文本轉為FTS5短語（trigram分詞下即子串匹配）"""
+        return '"' + text.replace('"', '""') + '"'
+    
+    def _build_like_search_query(self, query: str, columns: Optional[Sequence[str]] = None,
+                                 exclude_match: str = "") -> Tuple[str, List]:
+        """構建LIKE文本搜索子查詢（以priority_score作為排序分數）
+        
+        exclude_match: 與該全文查詢的結果合併時排除已被其匹配的行；
+        這些行沒有bm25分數，排序分數與全文匹配的結果一致地取SEARCH_PRIORITY_WEIGHT * priority_score
+        """
+        search_terms = query.lower().split()
+        conditions = ["status = 'active'"]
+        params = []
+        sort_score = "priority_score"
+        if exclude_match:
+            sort_score = "? * priority_score"
+            params.append(self.SEARCH_PRIORITY_WEIGHT)
+        
+        term_conditions = []
+        for term in search_terms:
+            term_conditions.append("(LOWER(title) LIKE ? OR LOWER(description) LIKE ? OR LOWER(hashtags) LIKE ?)")
+            params.extend([f'%{term}%', f'%{term}%', f'%{term}%'])
+        if term_conditions:
+            conditions.append(f"({' OR '.join(term_conditions)})")
+        if exclude_match:
+            conditions.append(
+                "rowid NOT IN (SELECT rowid FROM learning_resources_fts WHERE learning_resources_fts MATCH ?)"
+            )
+            params.append(exclude_match)
+        
+        query_sql = f'''
+            SELECT {', '.join(columns) if columns else '*'}, {sort_score} AS sort_score FROM learning_resources 
+            WHERE {' AND '.join(conditions)}
+        '''
+        return query_sql, params
     
     def calculate_relevance_score(self, resource: LearningResource, user_interests: List[str]) -> float:
         """計算資源與用戶興趣的相關性分數"""
         score = 0.0
         
-        # 基於hashtag匹配
+        # 基於hashtag匹配（標籤不分大小寫，僅大小寫不同的重複標籤只計一次）
+        hashtags = set(hashtag.lower() for hashtag in resource.hashtags)
         for interest in user_interests:
             interest_lower = interest.lower()
-            for hashtag in resource.hashtags:
-                if interest_lower in hashtag.lower() or hashtag.lower() in interest_lower:
+            for hashtag in hashtags:
+                if interest_lower in hashtag or hashtag in interest_lower:
                     score += 1.0
         
         # 基於標題和描述匹配
@@ -501,141 +1530,332 @@ class LearningResourcesDB:
         
         return score
     
-    def get_prioritized_resources(self, user_interests: List[str], 
+    def get_prioritized_resources(self, user_interests: List[str],
                                 resource_types: List[ResourceType] = None,
                                 difficulty_levels: List[DifficultyLevel] = None,
-                                limit: int = 10) -> List[LearningResource]:
-        """獲取優先推薦的學習資源"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+                                limit: int = 10, use_cache: bool = True) -> List[LearningResource]:
+        """獲取優先推薦的學習資源（結果經查詢緩存）"""
+        # 相關性分數與興趣順序無關，但重複的興趣會重複計分，因此排序而不去重
+        key = (
+            "prioritized",
+            tuple(sorted(interest.strip().lower() for interest in user_interests if interest and interest.strip())),
+            tuple(sorted(rt.value for rt in resource_types or [])),
+            tuple(sorted(dl.value for dl in difficulty_levels or [])),
+            limit
+        )
+        return self.cached_query(
+            key,
+            lambda: self._rank_prioritized_resources(user_interests, resource_types, difficulty_levels, limit),
+            use_cache
+        )
+    
+    def _rank_prioritized_resources(self, user_interests: List[str],
+                                    resource_types: Optional[List[ResourceType]],
+                                    difficulty_levels: Optional[List[DifficultyLevel]],
+                                    limit: int) -> List[LearningResource]:
+        """兩階段檢索優先推薦的資源
         
+        先用hashtag倒排表和全文索引從整個目錄召回候選，再在SQLite中為所有候選打分並選出top-k；
+        相關資源不足limit個時按優先級補足。
+        """
         # 構建查詢條件
         conditions = ["status = 'active'"]
         params = []
         
         if resource_types:
-            type_conditions = []
-            for rt in resource_types:
-                type_conditions.append("resource_type = ?")
-                params.append(rt.value)
-            conditions.append(f"({' OR '.join(type_conditions)})")
+            conditions.append(f"resource_type IN ({', '.join('?' for _ in resource_types)})")
+            params.extend(rt.value for rt in resource_types)
         
         if difficulty_levels:
-            diff_conditions = []
-            for dl in difficulty_levels:
-                diff_conditions.append("difficulty = ?")
-                params.append(dl.value)
-            conditions.append(f"({' OR '.join(diff_conditions)})")
-        
-        query = f'''
-            SELECT * FROM learning_resources 
-            WHERE {' AND '.join(conditions)}
-            ORDER BY priority_score DESC, ai_relevance_score DESC
-            LIMIT ?
-        '''
-        params.append(limit)
+            conditions.append(f"difficulty IN ({', '.join('?' for _ in difficulty_levels)})")
+            params.extend(dl.value for dl in difficulty_levels)
         
-        cursor.execute(query, params)
-        rows = cursor.fetchall()
-        conn.close()
+        interests = [interest.strip().lower() for interest in user_interests if interest and interest.strip()]
         
+        # 召回候選並在數據庫中打分，只為入選的top-k讀取完整行
+        top = self._get_top_relevance(interests, conditions, params, limit) if interests else []
+        selected = self._get_resources_by_ids([resource_id for resource_id, _ in top])
         resources = []
-        for row in rows:
-            resource = LearningResource(
-                id=row[0],
-                title=row[1],
-                description=row[2],
-                url=row[3],
-                resource_type=ResourceType(row[4]),
-                difficulty=DifficultyLevel(row[5]),
-                duration=row[6],
-                cost=row[7],
-                language=row[8],
-                provider=row[9],
-                author=row[10],
-                rating=row[11],
-                review_count=row[12],
-                hashtags=json.loads(row[13]) if row[13] else [],
-                prerequisites=json.loads(row[14]) if row[14] else [],
-                learning_outcomes=json.loads(row[15]) if row[15] else [],
-                target_audience=row[16],
-                last_updated=row[17],
-                created_by=row[18],
-                status=ResourceStatus(row[19]),
-                priority_score=row[20],
-                ai_relevance_score=row[21]
-            )
-            
-            # 計算相關性分數
-            relevance_score = self.calculate_relevance_score(resource, user_interests)
-            resource.ai_relevance_score = relevance_score
+        for resource_id, score in top:
+            resource = selected[resource_id]
+            resource.ai_relevance_score = score
             resources.append(resource)
+
+        # 相關資源不足時按優先級補足
+        if len(resources) < limit:
+            fill_conditions = list(conditions)
+            fill_params = list(params)
+            if resources:
+                fill_conditions.append(f"id NOT IN ({', '.join('?' for _ in resources)})")
+                fill_params.extend(r.id for r in resources)
+            fill_params.append(limit - len(resources))
+            
+            with self.transaction() as cursor:
+                cursor.execute(f'''
+                    SELECT * FROM learning_resources
+                    WHERE {' AND '.join(fill_conditions)}
+                    ORDER BY priority_score DESC, ai_relevance_score DESC
+                    LIMIT ?
+                ''', fill_params)
+                rows = cursor.fetchall()
+            
+            for row in rows:
+                resource = LearningResource.from_row(row)
+                resource.ai_relevance_score = self.calculate_relevance_score(resource, interests)
+                resources.append(resource)
         
         # 按相關性分數排序
         resources.sort(key=lambda x: (x.ai_relevance_score, x.priority_score), reverse=True)
         
         return resources[:limit]
     
+    def _get_top_relevance(self, interests: List[str], conditions: List[str],
+                           params: List, limit: int) -> List[Tuple[str, float]]:
+        """為整個目錄中可能與興趣相關的資源打分，返回分數最高的limit個(id, 分數)
+        
+        召回的匹配規則與打分相同（子串）：
+        hashtag經resource_hashtags倒排表匹配（支持雙向子串）；
+        標題、描述和學習成果經trigram全文索引按子串匹配；
+        trigram無法匹配的興趣（短於3個字符，或含JSON中會被轉義的引號、反斜杠）逐行按子串掃描。
+        候選估計超過目錄的PRIORITIZED_SCAN_RATIO時，直接順序掃描全表打分，比逐個按rowid回表更快。
+        """
+        sources = []
+        source_params = []
+        
+        indexed = [interest for interest in interests if self.fts_enabled and self._fts_indexable(interest)]
+        scanned = [interest for interest in interests if interest not in indexed]
+        
+        matched_tags = self._match_hashtag_vocabulary(interests)
+        tag_source = f'''
+            SELECT resource_id FROM resource_hashtags
+            WHERE tag IN ({', '.join('?' for _ in matched_tags)})
+        '''
+        if matched_tags:
+            sources.append(f'SELECT r.rowid FROM ({tag_source}) h JOIN learning_resources r ON r.id = h.resource_id')
+            source_params.extend(matched_tags)
+        
+        # hashtags欄位已由上面的倒排表匹配
+        match_query = '{title description learning_outcomes} : (%s)' % ' OR '.join(
+            self._fts_phrase(interest) for interest in indexed)
+        if indexed:
+            sources.append('SELECT rowid FROM learning_resources_fts WHERE learning_resources_fts MATCH ?')
+            source_params.append(match_query)
+        
+        if not sources and not scanned:
+            return []
+        
+        score_sql, score_params = self._relevance_score_sql(interests, matched_tags)
+        with self.transaction() as cursor:
+            catalog_size = cursor.execute('SELECT COALESCE(MAX(rowid), 0) FROM learning_resources').fetchone()[0]
+            threshold = int(catalog_size * self.PRIORITIZED_SCAN_RATIO)
+            
+            full_scan = bool(scanned)
+            if not full_scan and matched_tags:
+                cursor.execute(f'SELECT COUNT(*) FROM ({tag_source} LIMIT ?)', matched_tags + [threshold + 1])
+                estimate = cursor.fetchone()[0]
+                full_scan = estimate > threshold
+            else:
+                estimate = 0
+            if not full_scan and indexed:
+                # 全文索引按rowid升序返回：由前若干個匹配的rowid跨度外推匹配總數
+                cursor.execute('''
+                    SELECT COUNT(*), MAX(rowid) FROM (
+                        SELECT rowid FROM learning_resources_fts WHERE learning_resources_fts MATCH ? LIMIT ?
+                    )
+                ''', (match_query, self.PRIORITIZED_SAMPLE_SIZE))
+                sampled, last_rowid = cursor.fetchone()
+                if sampled >= self.PRIORITIZED_SAMPLE_SIZE:
+                    sampled = sampled * catalog_size / last_rowid
+                full_scan = estimate + sampled > threshold
+            
+            if full_scan:
+                # 不相關的行得0分，排在相關行之後，與按優先級補足的順序一致
+                query = f'''
+                    SELECT r.id, {score_sql} AS score
+                    FROM learning_resources r
+                    WHERE {' AND '.join(conditions)}
+                    ORDER BY score DESC, r.priority_score DESC
+                    LIMIT ?
+                '''
+                cursor.execute(query, score_params + params + [limit])
+                return [row for row in cursor.fetchall() if row[1] > 0]
+            
+            query = f'''
+                WITH candidates(candidate_rowid) AS ({' UNION '.join(sources)})
+                SELECT r.id, {score_sql} AS score
+                FROM learning_resources r
+                WHERE r.rowid IN candidates AND {' AND '.join(conditions)}
+                ORDER BY score DESC, r.priority_score DESC
+                LIMIT ?
+            '''
+            cursor.execute(query, source_params + score_params + params + [limit])
+            return cursor.fetchall()
+    
+    def _relevance_score_sql(self, interests: List[str], matched_tags: List[str]) -> Tuple[str, List]:
+        """構建與calculate_relevance_score等價的SQL打分表達式（引用learning_resources r）
+        
+        每行只做C層面的匹配，不把候選行讀回Python：
+        hashtag分數按標籤權重（匹配該標籤的興趣數）求和，標籤少時直接在JSON原文上LIKE，否則查resource_hashtags索引；
+        標題和描述用LIKE匹配；學習成果先對JSON原文做LIKE預篩，命中時才展開逐條計數。
+        LIKE與LOWER一樣只忽略ASCII字母的大小寫。
+        """
+        terms = []
+        params = []
+        
+        weights = {}
+        for tag in matched_tags:
+            weight = sum(1 for interest in interests if interest in tag or tag in interest)
+            if weight:
+                weights.setdefault(weight, []).append(tag)
+        for weight, tags in weights.items():
+            if len(matched_tags) <= self.PRIORITIZED_INLINE_TAGS and all(self._json_literal(tag) for tag in tags):
+                # 詞表中的標籤已小寫且去重，JSON原文中的"tag"（忽略大小寫）即對應一條索引記錄
+                for tag in tags:
+                    terms.append(f"(CASE WHEN r.hashtags LIKE ? ESCAPE '\\' THEN {weight} ELSE 0 END)")
+                    params.append(self._like_pattern(f'"{tag}"'))
+            else:
+                terms.append(f'''{weight} * (SELECT COUNT(*) FROM resource_hashtags h
+                    WHERE h.resource_id = r.id AND h.tag IN ({', '.join('?' for _ in tags)}))''')
+                params.extend(tags)
+        
+        outcomes = "CASE WHEN json_valid(r.learning_outcomes) THEN r.learning_outcomes ELSE '[]' END"
+        for interest in interests:
+            pattern = self._like_pattern(interest)
+            if ' ' in interest:
+                # 興趣可能跨越標題和描述的邊界
+                terms.append("(CASE WHEN (r.title || ' ' || COALESCE(r.description, '')) LIKE ? ESCAPE '\\'"
+                             " THEN 0.5 ELSE 0 END)")
+                params.append(pattern)
+            else:
+                terms.append("(CASE WHEN r.title LIKE ? ESCAPE '\\' THEN 0.5"
+                             " WHEN r.description LIKE ? ESCAPE '\\' THEN 0.5 ELSE 0 END)")
+                params.extend([pattern, pattern])
+            
+            count_outcomes = f"(SELECT COUNT(*) FROM json_each({outcomes}) WHERE value LIKE ? ESCAPE '\\')"
+            if self._json_literal(interest):
+                # 不含JSON轉義字符時，學習成果中的匹配必然出現在JSON原文中
+                terms.append(f"(CASE WHEN r.learning_outcomes LIKE ? ESCAPE '\\' THEN 0.3 * {count_outcomes} ELSE 0 END)")
+                params.extend([pattern, pattern])
+            else:
+                terms.append(f"0.3 * {count_outcomes}")
+                params.append(pattern)
+        
+        return f"({' + '.join(terms)})", params
+    
+    @staticmethod
+    def _json_literal(text: str) -> bool:
+        """文本在JSON原文中是否原樣出現（不含會被json.dumps轉義的字符）"""
+        return text.isascii() and text.isprintable() and '"' not in text and '\\' not in text
+    
+    @staticmethod
+    def _like_pattern(text: str) -> str:
+        """子串匹配的LIKE模式（轉義\\、%、_）"""
+        escaped = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        return f'%{escaped}%'
+    
+    def _match_hashtag_vocabulary(self, interests: List[str]) -> List[str]:
+        """返回與任一興趣互為子串的hashtag"""
+        conditions = ' OR '.join('instr(tag, ?) > 0 OR instr(?, tag) > 0' for _ in interests)
+        params = [value for interest in interests for value in (interest, interest)]
+        
+        # 遞歸CTE沿主鍵逐個跳到下一個不同的tag，代價與不同tag數成正比而不是與關聯行數成正比
+        with self.transaction() as cursor:
+            cursor.execute(f'''
+                WITH RECURSIVE vocabulary(tag) AS (
+                    SELECT MIN(tag) FROM resource_hashtags
+                    UNION ALL
+                    SELECT (SELECT MIN(tag) FROM resource_hashtags WHERE tag > vocabulary.tag)
+                    FROM vocabulary WHERE tag IS NOT NULL
+                )
+                SELECT tag FROM vocabulary WHERE tag IS NOT NULL AND ({conditions})
+            ''', params)
+            return [row[0] for row in cursor.fetchall()]
+    
     def update_resource_priority(self, resource_id: str, priority_score: float) -> bool:
         """更新資源優先級分數"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                UPDATE learning_resources 
-                SET priority_score = ?, last_updated = ?
-                WHERE id = ?
-            ''', (priority_score, datetime.now().isoformat(), resource_id))
-            
-            conn.commit()
-            conn.close()
+            with self.transaction() as cursor:
+                cursor.execute('''
+                    UPDATE learning_resources 
+                    SET priority_score = ?, last_updated = ?
+                    WHERE id = ?
+                ''', (priority_score, datetime.now().isoformat(), resource_id))
+                self._invalidate_cached(self._resource_cache, resource_id)
             return True
         except Exception:
             return False
     
     def get_all_resources(self, limit: int = 100) -> List[LearningResource]:
         """獲取所有資源（用於管理）"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        return self.get_resources_page(limit=limit)[0]
+    
+    def get_resources_page(self, filters: Optional[Dict] = None, limit: int = 100,
+                           cursor: Optional[str] = None, order: str = "desc",
+                           fields: Optional[Sequence[str]] = None) -> Tuple[List, Optional[str]]:
+        """按(last_updated, id)做keyset分頁，返回(資源列表, 下一頁游標)
         
-        cursor.execute('''
-            SELECT * FROM learning_resources 
-            ORDER BY last_updated DESC
+        filters: 欄位到值（或值列表）的映射，支持RESOURCE_FILTER_COLUMNS中的欄位
+        fields: 欄位投影；給定時只讀取這些列（加上分頁所需的last_updated、id），返回字典列表
+        """
+        if order not in ("asc", "desc"):
+            raise ValueError(f"無效的排序方向: {order}")
+        columns = None
+        if fields:
+            fields = self._validate_fields(fields)
+            columns = self._projection_columns(fields, ("last_updated", "id"))
+        
+        conditions, params = self._build_filter_conditions(filters)
+        if cursor:
+            last_updated, resource_id = decode_cursor(cursor)
+            conditions.append(f"(last_updated, id) {'<' if order == 'desc' else '>'} (?, ?)")
+            params.extend([last_updated, resource_id])
+        
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        query = f'''
+            SELECT {', '.join(columns) if columns else '*'} FROM learning_resources 
+            {where}
+            ORDER BY last_updated {order.upper()}, id {order.upper()}
             LIMIT ?
-        ''', (limit,))
+        '''
+        params.append(limit)
         
-        rows = cursor.fetchall()
-        conn.close()
+        with self.transaction() as db_cursor:
+            db_cursor.execute(query, params)
+            rows = db_cursor.fetchall()
         
-        resources = []
-        for row in rows:
-            resources.append(LearningResource(
-                id=row[0],
-                title=row[1],
-                description=row[2],
-                url=row[3],
-                resource_type=ResourceType(row[4]),
-                difficulty=DifficultyLevel(row[5]),
-                duration=row[6],
-                cost=row[7],
-                language=row[8],
-                provider=row[9],
-                author=row[10],
-                rating=row[11],
-                review_count=row[12],
-                hashtags=json.loads(row[13]) if row[13] else [],
-                prerequisites=json.loads(row[14]) if row[14] else [],
-                learning_outcomes=json.loads(row[15]) if row[15] else [],
-                target_audience=row[16],
-                last_updated=row[17],
-                created_by=row[18],
-                status=ResourceStatus(row[19]),
-                priority_score=row[20],
-                ai_relevance_score=row[21]
-            ))
-        
-        return resources
+        if columns:
+            resources = [LearningResource.project_row(row, fields) for row in rows]
+        else:
+            resources = [LearningResource.from_row(row) for row in rows]
+        next_cursor = None
+        if rows and len(rows) == limit:
+            names = columns or LearningResource.FIELDS
+            last = rows[-1]
+            next_cursor = encode_cursor(last[names.index("last_updated")], last[names.index("id")])
+        return resources, next_cursor
+    
+    def iter_resources(self, filters: Optional[Dict] = None, order: str = "desc",
+                       page_size: int = 500) -> Iterator[LearningResource]:
+        """逐頁遍歷資源目錄；每頁單獨查詢，內存佔用與目錄大小無關"""
+        cursor = None
+        while True:
+            page, cursor = self.get_resources_page(filters, page_size, cursor, order)
+            yield from page
+            if cursor is None:
+                return
+    
+    def _build_filter_conditions(self, filters: Optional[Dict]) -> Tuple[List[str], List]:
+        """將過濾條件轉換為SQL條件（只允許白名單欄位）"""
+        conditions = []
+        params = []
+        for column, value in (filters or {}).items():
+            if column not in self.RESOURCE_FILTER_COLUMNS:
+                raise ValueError(f"不支持的過濾欄位: {column}")
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            values = [v.value if isinstance(v, Enum) else v for v in values]
+            conditions.append(f"{column} IN ({', '.join('?' for _ in values)})")
+            params.extend(values)
+        return conditions, params
 
 # 示例使用
 if __name__ == "__main__":
@@ -0,0 +1,135 @@
+"""
+LLM Response Cache
+LLM響應緩存
+
+以SQLite表保存LLM響應（與資源目錄同一數據庫文件），按內容尋址：
+1. 鍵為模型、參數、提示詞及提示中策展資源版本的哈希
+2. 條目TTL過期
+3. 超出條目上限時按最近訪問時間淘汰
+4. 命中率統計
+"""
+
+import hashlib
+import json
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+from learning_resources import LearningResourcesDB, LearningResource
+
+class LLMResponseCache:
+    """LLM響應的磁盤緩存"""
+    
+    # 默認存活時間（秒）和條目上限
+    DEFAULT_TTL = 24 * 3600
+    DEFAULT_MAX_ENTRIES = 5000
+    
+    def __init__(self, db: LearningResourcesDB, ttl: float = DEFAULT_TTL,
+                 max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.db = db
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.init_table()
+    
+    def init_table(self):
+        """創建緩存表"""
+        with self.db.transaction() as cursor:
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS llm_response_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    hit_count INTEGER NOT NULL DEFAULT 0
+                )
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_llm_response_cache_access ON llm_response_cache(last_access)')
+    
+    def make_key(self, payload: Dict, resources: Iterable[LearningResource] = ()) -> str:
+        """計算緩存鍵
+        
+        payload包含模型、採樣參數和完整消息；另外加入策展資源的(id, last_updated)，
+        資源更新後即使提示詞中可見的內容不變，也會得到新的鍵。
+        """
+        material = {
+            "payload": payload,
+            "resources": [[resource.id, resource.last_updated] for resource in resources]
+        }
+        encoded = json.dumps(material, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+        return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+    
+    def get(self, cache_key: str) -> Optional[str]:
+        """返回未過期的緩存響應"""
+        now = time.time()
+        with self.db.transaction() as cursor:
+            cursor.execute(
+                'SELECT response FROM llm_response_cache WHERE cache_key = ? AND expires_at > ?',
+                (cache_key, now)
+            )
+            row = cursor.fetchone()
+            if row:
+                cursor.execute('''
+                    UPDATE llm_response_cache
+                    SET last_access = ?, hit_count = hit_count + 1
+                    WHERE cache_key = ?
+                ''', (now, cache_key))
+        
+        with self._stats_lock:
+            if row:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return row[0] if row else None
+    
+    def put(self, cache_key: str, response: str):
+        """寫入響應，並清理過期條目和超出上限的最久未訪問條目"""
+        now = time.time()
+        with self.db.transaction() as cursor:
+            cursor.execute('''
+                INSERT OR REPLACE INTO llm_response_cache
+                (cache_key, response, created_at, expires_at, last_access, hit_count)
+                VALUES (?, ?, ?, ?, ?, 0)
+            ''', (cache_key, response, now, now + self.ttl, now))
+            
+            cursor.execute('DELETE FROM llm_response_cache WHERE expires_at <= ?', (now,))
+            evicted = cursor.rowcount
+            cursor.execute('''
+                DELETE FROM llm_response_cache WHERE cache_key IN (
+                    SELECT cache_key FROM llm_response_cache
+                    ORDER BY last_access DESC
+                    LIMIT -1 OFFSET ?
+                )
+            ''', (self.max_entries,))
+            evicted += cursor.rowcount
+        
+        if evicted:
+            with self._stats_lock:
+                self.evictions += evicted
+    
+    def clear(self):
+        """清空緩存"""
+        with self.db.transaction() as cursor:
+            cursor.execute('DELETE FROM llm_response_cache')
+    
+    def stats(self) -> Dict:
+        """返回緩存統計"""
+        with self.db.transaction() as cursor:
+            cursor.execute('SELECT COUNT(*), COALESCE(SUM(LENGTH(response)), 0) FROM llm_response_cache')
+            entries, size = cursor.fetchone()
+        with self._stats_lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": entries,
+                "bytes": size,
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions
+            }
@@ -0,0 +1,107 @@
+"""
+Lookup Cache
+查詢緩存
+
+進程內的讀穿透緩存，用於按ID/郵箱的單行查詢：
+1. 容量上限，按LRU淘汰
+2. 條目TTL過期
+3. 條目版本：讀取時傳入版本（如數據庫中的共享代數），版本不符的條目視為未命中
+4. 命中/未命中計數
+5. 線程安全（Flask多線程服務器）
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+class LRUCache:
+    """帶TTL的線程安全LRU緩存
+    
+    讀穿透時記錄開始加載時的失效代數，加載期間若有失效發生則不寫入，
+    避免並發寫入後把舊值放回緩存。
+    """
+    
+    def __init__(self, max_size: int = 1024, ttl: Optional[float] = 300.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def get(self, key: Hashable, version: Optional[Hashable] = None) -> Optional[Any]:
+        """返回緩存值；不存在、已過期或版本不符時返回None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at, entry_version = entry
+                if expires_at is not None and expires_at <= time.monotonic():
+                    del self._entries[key]
+                    self.expirations += 1
+                elif entry_version == version:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+            self.misses += 1
+            return None
+    
+    def put(self, key: Hashable, value: Any, generation: Optional[int] = None,
+            version: Optional[Hashable] = None):
+        """寫入緩存；傳入generation時，若之後發生過失效則放棄寫入"""
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+            self._entries[key] = (value, expires_at, version)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def get_or_load(self, key: Hashable, loader: Callable[[], Optional[Any]],
+                    version: Optional[Hashable] = None) -> Optional[Any]:
+        """讀穿透：未命中時調用loader並以version緩存非None結果"""
+        value = self.get(key, version)
+        if value is not None:
+            return value
+        
+        generation = self._generation
+        value = loader()
+        if value is not None:
+            self.put(key, value, generation, version)
+        return value
+    
+    def invalidate(self, *keys: Hashable):
+        """刪除指定鍵，並使正在進行的加載不再寫入"""
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                self._entries.pop(key, None)
+    
+    def clear(self):
+        """清空緩存"""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+    
+    def stats(self) -> Dict:
+        """返回緩存統計"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
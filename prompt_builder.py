@@ -0,0 +1,155 @@
+"""
+Prompt Builder
+提示詞構建
+
+按token預算構建推薦提示詞，控制LLM的延遲和成本：
+1. 本地近似分詞器估算token數（不依賴模型的分詞器）
+2. 用戶描述和策展資源描述按預算截斷
+3. 只發送模型選擇所需的欄位（標題、類型、難度、標籤、簡短描述），不發送URL和優先級
+4. 策展資源以短ID（C1、C2…）引用，模型只需返回ID，合併時映射回資源
+5. max_tokens按請求的推薦數量計算，而不是固定值
+"""
+
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+from learning_resources import LearningResource
+
+# CJK字符、ASCII字母數字串、其他非空白字符
+TOKEN_PATTERN = re.compile(
+    '([\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af])|([A-Za-z0-9]+)|(\\S)'
+)
+
+def _token_cost(match: "re.Match") -> int:
+    word = match.group(2)
+    return (len(word) + 3) // 4 if word else 1
+
+def estimate_tokens(text: str) -> int:
+    """近似token數：CJK字符和標點各算1個，字母數字串每4個字符算1個"""
+    return sum(_token_cost(match) for match in TOKEN_PATTERN.finditer(text))
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """截斷到max_tokens以內（按近似token邊界），截斷時以省略號結尾"""
+    used = 0
+    for match in TOKEN_PATTERN.finditer(text):
+        used += _token_cost(match)
+        if used > max_tokens:
+            return text[:match.start()].rstrip(" ,，、;；:：") + "…"
+    return text
+
+@dataclass
+class PromptPlan:
+    """構建結果：提示詞、響應的max_tokens、token估算，以及短ID到策展資源的映射"""
+    prompt: str
+    max_tokens: int
+    prompt_tokens: int
+    unbudgeted_tokens: int
+    curated_ids: Dict[str, LearningResource] = field(default_factory=dict)
+
+class PromptBuilder:
+    """按token預算構建推薦提示詞"""
+    
+    # 提示詞總預算，以及用戶描述、每個策展資源描述的上限（近似token）
+    DEFAULT_PROMPT_BUDGET = 900
+    USER_DESCRIPTION_TOKENS = 150
+    DESCRIPTION_TOKENS = 40
+    # 最多列出的策展資源數和每個資源的標籤數
+    MAX_CURATED = 10
+    MAX_HASHTAGS = 4
+    # 請求的推薦數量；每個推薦和JSON數組本身在響應中的token估算
+    DEFAULT_ITEM_COUNT = 8
+    TOKENS_PER_ITEM = 110
+    RESPONSE_OVERHEAD = 20
+    
+    INSTRUCTIONS = """任務：
+1. 分析用戶的具體學習目標，返回{item_count}個推薦
+2. 優先選擇策展資源（只返回ID和分數）：{{"id": "C1", "relevanceScore": 9}}
+3. 策展資源不足時補充其他真實、可訪問的資源，返回：
+{{"title", "type" (Course/Book/Video/Article/Project/Tutorial/Podcast/Tool/Documentation), "url", "description" (一句話), "duration", "difficulty" (1-5), "relevanceScore" (1-10), "learningOutcome"}}
+只返回JSON數組，不要生成虛假的URL。"""
+    
+    def __init__(self, prompt_budget: int = DEFAULT_PROMPT_BUDGET, item_count: int = DEFAULT_ITEM_COUNT):
+        self.prompt_budget = prompt_budget
+        self.item_count = item_count
+        self._stats_lock = threading.Lock()
+        self.prompts_sent = 0
+        self.prompt_tokens_sent = 0
+        self.unbudgeted_tokens = 0
+        self.max_tokens_requested = 0
+    
+    def curated_ids(self, db_resources: List[LearningResource]) -> Dict[str, LearningResource]:
+        """策展資源的短ID（按db_resources順序編號，合併時以同樣方式還原）"""
+        return {f"C{i}": resource for i, resource in enumerate(db_resources[:self.MAX_CURATED], 1)}
+    
+    def build(self, user_description: str, topic: str, level: str, duration: int,
+              intensity: str, materials: List[str], db_resources: List[LearningResource]) -> PromptPlan:
+        """構建提示詞；預算不足時先截斷描述，再省略描述，最後減少列出的策展資源"""
+        header = (
+            f'用戶描述: "{truncate_to_tokens(user_description.strip(), self.USER_DESCRIPTION_TOKENS)}"\n'
+            f"主題: {topic} | 水平: {level} | {duration} 天 | 強度: {intensity} | "
+            f"材料: {', '.join(materials)}"
+        )
+        instructions = self.INSTRUCTIONS.format(item_count=self.item_count)
+        curated_title = "策展資源（優先推薦）："
+        remaining = (self.prompt_budget - estimate_tokens(header) - estimate_tokens(instructions)
+                     - estimate_tokens(curated_title))
+        unbudgeted = estimate_tokens(user_description) + estimate_tokens(instructions) + estimate_tokens(header)
+        
+        curated_ids = {}
+        lines = []
+        for short_id, resource in self.curated_ids(db_resources).items():
+            unbudgeted += estimate_tokens(' '.join((
+                resource.title, resource.description, resource.url, ' '.join(resource.hashtags)
+            ))) + 12
+            
+            summary = (f"{short_id} | {resource.title} | {resource.resource_type.value} | "
+                       f"難度{resource.difficulty.value} | {', '.join(resource.hashtags[:self.MAX_HASHTAGS])}")
+            description = truncate_to_tokens(' '.join(resource.description.split()), self.DESCRIPTION_TOKENS)
+            line = f"{summary}\n   {description}" if description else summary
+            cost = estimate_tokens(line)
+            if cost > remaining:
+                line = summary
+                cost = estimate_tokens(line)
+                if cost > remaining:
+                    continue
+            remaining -= cost
+            curated_ids[short_id] = resource
+            lines.append(line)
+        
+        sections = [header]
+        if lines:
+            sections.append(curated_title + "\n" + '\n'.join(lines))
+        sections.append(instructions)
+        prompt = '\n\n'.join(sections)
+        
+        return PromptPlan(
+            prompt=prompt,
+            max_tokens=self.RESPONSE_OVERHEAD + self.item_count * self.TOKENS_PER_ITEM,
+            prompt_tokens=estimate_tokens(prompt),
+            unbudgeted_tokens=unbudgeted,
+            curated_ids=curated_ids
+        )
+    
+    def record_sent(self, plan: PromptPlan):
+        """記錄實際發送給LLM的提示詞（緩存命中的不計）"""
+        with self._stats_lock:
+            self.prompts_sent += 1
+            self.prompt_tokens_sent += plan.prompt_tokens
+            self.unbudgeted_tokens += plan.unbudgeted_tokens
+            self.max_tokens_requested += plan.max_tokens
+    
+    def stats(self) -> Dict:
+        """返回已發送提示詞的token統計；saved_ratio相對於不截斷、發送全部欄位時的估算"""
+        with self._stats_lock:
+            sent = self.prompts_sent
+            return {
+                "prompts_sent": sent,
+                "avg_prompt_tokens": self.prompt_tokens_sent / sent if sent else 0.0,
+                "avg_unbudgeted_tokens": self.unbudgeted_tokens / sent if sent else 0.0,
+                "avg_max_tokens": self.max_tokens_requested / sent if sent else 0.0,
+                "saved_ratio": (
+                    1 - self.prompt_tokens_sent / self.unbudgeted_tokens if self.unbudgeted_tokens else 0.0
+                )
+            }
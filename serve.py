@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Production Server
+生產環境啟動腳本
+
+預派生（prefork）多個worker進程，共享同一個監聽端口，使API使用所有CPU核心：
+
+    python serve.py --workers 4 --port 5001
+    python serve.py --workers 8 --session-store signed   # 需設置SESSION_SECRET
+
+每個worker各自導入api_server（數據庫連接、事件循環線程、HTTP連接池都在fork之後創建）。
+多worker時會話必須存放在共享存儲中（sqlite或signed），否則在一個worker上登錄、
+在另一個worker上會被視為未登錄。worker異常退出時主進程會重新派生。
+
+也可以使用gunicorn：SESSION_STORE=sqlite gunicorn -w 4 -b 0.0.0.0:5001 api_server:app
+"""
+
+import argparse
+import os
+import signal
+import socket
+import sys
+
+def run_worker(sock: socket.socket, args):
+    """worker進程：導入應用並在繼承的監聽套接字上提供服務"""
+    # 主進程的信號處理器不適用於worker；SIGTERM/SIGINT時拋出SystemExit結束serve_forever
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    signal.signal(signal.SIGINT, lambda *_: sys.exit(0))
+    
+    from werkzeug.serving import make_server
+    from api_server import app, shutdown_async_loop
+    
+    server = make_server(args.host, args.port, app, threaded=True, fd=sock.fileno())
+    print(f"👷 worker {os.getpid()} 已啟動")
+    try:
+        server.serve_forever()
+    finally:
+        # worker以os._exit退出，不會執行atexit；在此關閉AI會話和事件循環。
+        # 清理期間忽略重複的信號（Ctrl-C會同時發給進程組和經主進程轉發）
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        server.server_close()
+        shutdown_async_loop()
+
+def main():
+    parser = argparse.ArgumentParser(description="Prioritized learning resources API server (prefork)")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5001)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--session-store", choices=["memory", "sqlite", "signed"],
+                        default=os.environ.get("SESSION_STORE", "sqlite"))
+    args = parser.parse_args()
+    
+    if args.workers > 1 and args.session_store == "memory":
+        parser.error("多個worker不能使用進程內會話存儲，請使用 --session-store sqlite 或 signed")
+    if args.session_store == "signed" and not os.environ.get("SESSION_SECRET"):
+        parser.error("signed會話存儲需要設置SESSION_SECRET環境變量")
+    if not hasattr(os, "fork"):
+        parser.error("當前平台不支持fork，請使用 python api_server.py 或其他WSGI服務器")
+    os.environ["SESSION_STORE"] = args.session_store
+    
+    # 主進程只負責監聽套接字和worker的生命週期
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(128)
+    sock.set_inheritable(True)
+    
+    children = set()
+    stopping = False
+    
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(sock, args)
+            except SystemExit as e:
+                code = e.code if isinstance(e.code, int) else 0
+            except BaseException as e:
+                print(f"❌ worker {os.getpid()} 錯誤: {e}")
+                code = 1
+            finally:
+                sys.stdout.flush()
+                os._exit(code)
+        children.add(pid)
+    
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+    
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    
+    print(f"🚀 API服務器運行在: http://{args.host}:{args.port}"
+          f"（{args.workers} 個worker，會話存儲: {args.session_store}）")
+    for _ in range(args.workers):
+        spawn()
+    
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        children.discard(pid)
+        if not stopping:
+            print(f"⚠️ worker {pid} 已退出（狀態 {status}），重新啟動")
+            spawn()
+    
+    sock.close()
+
+if __name__ == "__main__":
+    main()
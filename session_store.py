@@ -0,0 +1,327 @@
+"""
+Session Store
+會話存儲
+
+ContributorAuth的可插拔會話存儲，語義相同（創建、驗證時過期即失效、登出後失效）：
+1. MemorySessionStore：進程內字典（單進程開發服務器），按過期時間排序的堆惰性淘汰過期會話
+2. SQLiteSessionStore：與資源目錄同庫的會話表，按過期時間索引，後台線程定期清理；
+   多個worker進程共享
+3. SignedTokenSessionStore：HMAC簽名的無狀態令牌，驗證無需存儲；
+   登出的令牌記入撤銷表直到其過期
+"""
+
+import base64
+import hashlib
+import heapq
+import hmac
+import secrets
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from learning_resources import LearningResourcesDB, Contributor
+
+@dataclass
+class ContributorSession:
+    """貢獻者會話"""
+    session_id: str
+    contributor_id: str
+    expires_at: datetime
+    created_at: datetime
+    # 貢獻者快照及其讀取時間（time.monotonic），由ContributorAuth按刷新間隔更新
+    contributor: Optional[Contributor] = field(default=None, repr=False, compare=False)
+    contributor_loaded_at: float = field(default=0.0, repr=False, compare=False)
+
+class SessionStore(ABC):
+    """會話存儲接口（缺少create/get/delete的後端在實例化時即報錯）"""
+    
+    # 默認清理間隔（秒）
+    DEFAULT_SWEEP_INTERVAL = 300.0
+    
+    sweep_interval: Optional[float] = None
+    _sweeper: Optional[threading.Thread] = None
+    _stop: Optional[threading.Event] = None
+    
+    @abstractmethod
+    def create(self, contributor_id: str, duration: timedelta) -> ContributorSession:
+        """創建會話"""
+    
+    @abstractmethod
+    def get(self, session_id: str) -> Optional[ContributorSession]:
+        """返回未過期的會話；已過期的會話在此刪除"""
+    
+    @abstractmethod
+    def delete(self, session_id: str) -> bool:
+        """刪除會話，會話存在時返回True"""
+    
+    def purge_expired(self) -> int:
+        """刪除所有過期會話，返回刪除數量"""
+        return 0
+    
+    def stats(self) -> Dict:
+        """返回存儲統計"""
+        return {"backend": self.__class__.__name__}
+    
+    def start_sweeper(self):
+        """啟動定期清理過期會話的守護線程"""
+        if self._sweeper is not None and self._sweeper.is_alive():
+            return
+        self._stop = threading.Event()
+        self._sweeper = threading.Thread(target=self._sweep, name="session-sweeper", daemon=True)
+        self._sweeper.start()
+    
+    def stop_sweeper(self):
+        """停止清理線程"""
+        if self._stop is not None:
+            self._stop.set()
+    
+    def _sweep(self):
+        while not self._stop.wait(self.sweep_interval):
+            try:
+                self.purge_expired()
+            except Exception as e:
+                print(f"會話清理錯誤: {e}")
+    
+    def _new_session(self, session_id: str, contributor_id: str, duration: timedelta) -> ContributorSession:
+        now = datetime.now()
+        return ContributorSession(
+            session_id=session_id,
+            contributor_id=contributor_id,
+            expires_at=now + duration,
+            created_at=now
+        )
+
+class MemorySessionStore(SessionStore):
+    """進程內會話存儲（只適用於單個worker進程）
+    
+    會話按過期時間放入最小堆，創建和驗證時順帶彈出已過期的堆頂，
+    從未再被訪問的會話也會被淘汰，字典不會無限增長。
+    """
+    
+    # 堆中失效條目（已登出的會話）超過有效會話數的倍數時重建堆
+    HEAP_COMPACT_RATIO = 2
+    
+    def __init__(self):
+        self._sessions: Dict[str, ContributorSession] = {}
+        self._expiry_heap: List[Tuple[datetime, str]] = []
+        self._lock = threading.Lock()
+    
+    def create(self, contributor_id: str, duration: timedelta) -> ContributorSession:
+        session = self._new_session(secrets.token_urlsafe(32), contributor_id, duration)
+        with self._lock:
+            self._evict_expired(session.created_at)
+            self._sessions[session.session_id] = session
+            heapq.heappush(self._expiry_heap, (session.expires_at, session.session_id))
+        return session
+    
+    def get(self, session_id: str) -> Optional[ContributorSession]:
+        now = datetime.now()
+        with self._lock:
+            self._evict_expired(now)
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            if now > session.expires_at:
+                del self._sessions[session_id]
+                return None
+            return session
+    
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            removed = self._sessions.pop(session_id, None) is not None
+            # 登出的會話在堆中留下失效條目，過多時重建
+            if len(self._expiry_heap) > self.HEAP_COMPACT_RATIO * len(self._sessions) + 64:
+                self._expiry_heap = [(session.expires_at, key) for key, session in self._sessions.items()]
+                heapq.heapify(self._expiry_heap)
+            return removed
+    
+    def purge_expired(self) -> int:
+        with self._lock:
+            return self._evict_expired(datetime.now())
+    
+    def _evict_expired(self, now: datetime) -> int:
+        """彈出所有已過期的堆頂並刪除對應會話（調用方持有鎖）"""
+        evicted = 0
+        heap = self._expiry_heap
+        while heap and heap[0][0] < now:
+            expires_at, session_id = heapq.heappop(heap)
+            session = self._sessions.get(session_id)
+            # 會話可能已登出，只刪除與堆條目對應的那個會話
+            if session is not None and session.expires_at == expires_at:
+                del self._sessions[session_id]
+                evicted += 1
+        return evicted
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"backend": "memory", "sessions": len(self._sessions), "heap_entries": len(self._expiry_heap)}
+
+class SQLiteSessionStore(SessionStore):
+    """SQLite會話表：多個worker進程共享，過期時間有索引，後台線程定期清理"""
+    
+    def __init__(self, db: LearningResourcesDB,
+                 sweep_interval: Optional[float] = SessionStore.DEFAULT_SWEEP_INTERVAL):
+        self.db = db
+        self.sweep_interval = sweep_interval
+        self.init_table()
+        if sweep_interval:
+            self.start_sweeper()
+    
+    def init_table(self):
+        """創建會話表和過期時間索引"""
+        with self.db.transaction() as cursor:
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS contributor_sessions (
+                    session_id TEXT PRIMARY KEY,
+                    contributor_id TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    created_at REAL NOT NULL
+                ) WITHOUT ROWID
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_contributor_sessions_expires ON contributor_sessions(expires_at)')
+    
+    def create(self, contributor_id: str, duration: timedelta) -> ContributorSession:
+        session = self._new_session(secrets.token_urlsafe(32), contributor_id, duration)
+        with self.db.transaction() as cursor:
+            cursor.execute(
+                'INSERT INTO contributor_sessions (session_id, contributor_id, expires_at, created_at) VALUES (?, ?, ?, ?)',
+                (session.session_id, contributor_id, session.expires_at.timestamp(), session.created_at.timestamp())
+            )
+        return session
+    
+    def get(self, session_id: str) -> Optional[ContributorSession]:
+        with self.db.transaction() as cursor:
+            cursor.execute(
+                'SELECT contributor_id, expires_at, created_at FROM contributor_sessions WHERE session_id = ?',
+                (session_id,)
+            )
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            if time.time() > row[1]:
+                cursor.execute('DELETE FROM contributor_sessions WHERE session_id = ?', (session_id,))
+                return None
+        return ContributorSession(
+            session_id=session_id,
+            contributor_id=row[0],
+            expires_at=datetime.fromtimestamp(row[1]),
+            created_at=datetime.fromtimestamp(row[2])
+        )
+    
+    def delete(self, session_id: str) -> bool:
+        with self.db.transaction() as cursor:
+            cursor.execute('DELETE FROM contributor_sessions WHERE session_id = ?', (session_id,))
+            return cursor.rowcount > 0
+    
+    def purge_expired(self) -> int:
+        with self.db.transaction() as cursor:
+            cursor.execute('DELETE FROM contributor_sessions WHERE expires_at <= ?', (time.time(),))
+            return cursor.rowcount
+    
+    def stats(self) -> Dict:
+        with self.db.transaction() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM contributor_sessions')
+            count = cursor.fetchone()[0]
+        return {"backend": "sqlite", "sessions": count, "sweep_interval": self.sweep_interval}
+
+class SignedTokenSessionStore(SessionStore):
+    """HMAC-SHA256簽名的無狀態會話令牌
+    
+    令牌為"載荷.簽名"，載荷包含貢獻者ID、創建和過期時間及隨機數，驗證只需密鑰；
+    所有worker使用同一密鑰即可互相驗證。登出的令牌記入撤銷表直到過期，
+    撤銷表存放在數據庫中，因此在所有worker上同樣生效。
+    """
+    
+    def __init__(self, secret: str, db: LearningResourcesDB,
+                 sweep_interval: Optional[float] = SessionStore.DEFAULT_SWEEP_INTERVAL):
+        if not secret:
+            raise ValueError("簽名令牌需要密鑰")
+        self._secret = secret.encode("utf-8")
+        self.db = db
+        self.sweep_interval = sweep_interval
+        self.init_table()
+        if sweep_interval:
+            self.start_sweeper()
+    
+    def init_table(self):
+        """創建撤銷表"""
+        with self.db.transaction() as cursor:
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS revoked_session_tokens (
+                    token_hash TEXT PRIMARY KEY,
+                    expires_at REAL NOT NULL
+                ) WITHOUT ROWID
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_revoked_session_tokens_expires ON revoked_session_tokens(expires_at)')
+    
+    def _sign(self, payload: str) -> str:
+        digest = hmac.new(self._secret, payload.encode("ascii"), hashlib.sha256).digest()
+        return base64.urlsafe_b64encode(digest).rstrip(b"=").decode("ascii")
+    
+    def create(self, contributor_id: str, duration: timedelta) -> ContributorSession:
+        now = datetime.now()
+        expires_at = now + duration
+        raw = f"{contributor_id}|{now.timestamp():.0f}|{expires_at.timestamp():.0f}|{secrets.token_hex(8)}"
+        payload = base64.urlsafe_b64encode(raw.encode("utf-8")).rstrip(b"=").decode("ascii")
+        return ContributorSession(
+            session_id=f"{payload}.{self._sign(payload)}",
+            contributor_id=contributor_id,
+            expires_at=expires_at,
+            created_at=now
+        )
+    
+    def _decode(self, session_id: str) -> Optional[ContributorSession]:
+        """驗證簽名並解析令牌；簽名無效或格式錯誤時返回None"""
+        payload, _, signature = session_id.rpartition(".")
+        if not payload or not hmac.compare_digest(signature, self._sign(payload)):
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)).decode("utf-8")
+            contributor_id, created_at, expires_at, _ = raw.rsplit("|", 3)
+            return ContributorSession(
+                session_id=session_id,
+                contributor_id=contributor_id,
+                expires_at=datetime.fromtimestamp(int(expires_at)),
+                created_at=datetime.fromtimestamp(int(created_at))
+            )
+        except ValueError:
+            return None
+    
+    def _token_hash(self, session_id: str) -> str:
+        return hashlib.sha256(session_id.encode("utf-8")).hexdigest()
+    
+    def get(self, session_id: str) -> Optional[ContributorSession]:
+        session = self._decode(session_id)
+        if session is None or datetime.now() > session.expires_at:
+            return None
+        with self.db.transaction() as cursor:
+            cursor.execute('SELECT 1 FROM revoked_session_tokens WHERE token_hash = ?', (self._token_hash(session_id),))
+            if cursor.fetchone():
+                return None
+        return session
+    
+    def delete(self, session_id: str) -> bool:
+        session = self.get(session_id)
+        if session is None:
+            return False
+        with self.db.transaction() as cursor:
+            cursor.execute(
+                'INSERT OR IGNORE INTO revoked_session_tokens (token_hash, expires_at) VALUES (?, ?)',
+                (self._token_hash(session_id), session.expires_at.timestamp())
+            )
+        return True
+    
+    def purge_expired(self) -> int:
+        """過期的令牌已無法通過驗證，撤銷記錄可以刪除"""
+        with self.db.transaction() as cursor:
+            cursor.execute('DELETE FROM revoked_session_tokens WHERE expires_at <= ?', (time.time(),))
+            return cursor.rowcount
+    
+    def stats(self) -> Dict:
+        with self.db.transaction() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM revoked_session_tokens')
+            revoked = cursor.fetchone()[0]
+        return {"backend": "signed", "revoked_tokens": revoked}
@@ -10,6 +10,7 @@ class PrioritizedResourcesManager {
         this.apiBaseUrl = 'http://localhost:5000/api'; // 在生產環境中應該使用實際的API URL
         this.isApiAvailable = false;
         this.fallbackMode = true;
+        this.recommendationId = null; // /ai/recommend返回的句柄，generate-plan復用同一批推薦
     }
 
     /**
@@ -78,6 +79,7 @@ class PrioritizedResourcesManager {
 
             if (data.success) {
                 const recommendations = data.recommendations;
+                this.recommendationId = data.recommendation_id || null;
                 console.log(`🎯 獲取到 ${recommendations.length} 個推薦資源`);
                 console.log(`📊 策展資源: ${data.curated_count} 個`);
                 console.log(`🤖 AI推薦資源: ${data.ai_count} 個`);
@@ -136,7 +138,8 @@ class PrioritizedResourcesManager {
                 level: this.learningPlan.level,
                 duration: this.learningPlan.duration,
                 intensity: this.learningPlan.intensity,
-                materials: this.learningPlan.materials
+                materials: this.learningPlan.materials,
+                recommendation_id: this.recommendationId
             };
 
             console.log('📤 發送學習計劃生成請求:', requestData);
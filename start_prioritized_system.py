@@ -26,6 +26,7 @@ def install_dependencies():
         "flask",
         "flask-cors", 
         "aiohttp",
+        "numpy",
         "requests"
     ]
     
@@ -0,0 +1,295 @@
+"""
+Learning Resources Search Tests
+學習資源搜索測試
+
+運行：python -m pytest -q test_learning_resources.py
+"""
+
+import os
+
+import pytest
+
+from learning_resources import LearningResourcesDB, LearningResource, Contributor, ResourceType, DifficultyLevel
+from contributor_management import ExtendedLearningResourcesDB
+
+def make_resource(index: int, title: str, description: str, hashtags=None, learning_outcomes=None) -> LearningResource:
+    return LearningResource(
+        id=f"resource-{index}",
+        title=title,
+        description=description,
+        url=f"https://resources.test/{index}",
+        resource_type=ResourceType.COURSE,
+        difficulty=DifficultyLevel.BEGINNER,
+        duration="4 weeks",
+        cost="Free",
+        hashtags=hashtags or [],
+        learning_outcomes=learning_outcomes or []
+    )
+
+@pytest.fixture
+def db(tmp_path):
+    database = LearningResourcesDB(str(tmp_path / "resources.db"))
+    database.add_learning_resource(make_resource(
+        1, "深度學習基礎課程", "從零開始學習神經網絡和深度學習的核心概念",
+        ["deep-learning", "ai"], ["理解神經網絡原理"]
+    ))
+    database.add_learning_resource(make_resource(
+        2, "Modern HTML and CSS", "Build responsive layouts with semantic markup",
+        ["web", "frontend"], ["write accessible pages"]
+    ))
+    database.add_learning_resource(make_resource(
+        3, "Python for Data Analysis", "Pandas and NumPy workflows",
+        ["python", "data"], ["clean datasets"]
+    ))
+    yield database
+    database.close()
+
+def search_titles(db: LearningResourcesDB, query: str):
+    resources, _ = db.search_resources_page(query, limit=10, use_cache=False)
+    return [resource.title for resource in resources]
+
+def test_search_index_enabled(db):
+    assert db.fts_enabled
+
+@pytest.mark.parametrize("query", ["深度學習", "神經網絡", "學習"])
+def test_cjk_substring_search(db, query):
+    assert search_titles(db, query) == ["深度學習基礎課程"]
+
+@pytest.mark.parametrize("query, title", [
+    ("tml", "Modern HTML and CSS"),
+    ("HTML", "Modern HTML and CSS"),
+    ("ponsiv", "Modern HTML and CSS"),
+    ("ython", "Python for Data Analysis"),
+])
+def test_mid_word_substring_search(db, query, title):
+    assert search_titles(db, query) == [title]
+
+def test_short_terms_fall_back_to_like(db):
+    assert search_titles(db, "ml") == ["Modern HTML and CSS"]
+
+def test_short_terms_keep_fts_for_long_terms(db):
+    # 深度神經網絡只出現在學習成果中（LIKE搜索不覆蓋），只能經全文索引匹配；學習是短詞，經LIKE補充
+    db.add_learning_resource(make_resource(4, "Vision models", "Image classification", [], ["訓練深度神經網絡"]))
+    assert search_titles(db, "學習 深度神經網絡") == ["Vision models", "深度學習基礎課程"]
+
+def test_semantic_first_page_adds_vector_matches(db):
+    pytest.importorskip("numpy")
+    db.add_learning_resource(make_resource(4, "Rust ownership", "Borrow checker in depth", ["rust"]))
+    # 換了說法的查詢沒有關鍵詞匹配，由向量相似度補充；補充的資源同樣按fields投影
+    assert db.search_resources_page("borrowing checkers", limit=5, use_cache=False)[0] == []
+    resources, next_cursor = db.semantic_search_page("borrowing checkers", limit=5, fields=["title", "hashtags"])
+    assert resources[0] == {"title": "Rust ownership", "hashtags": ["rust"]}
+    assert next_cursor is None
+
+def test_search_matches_baseline_like_search(db):
+    fts_results = {query: search_titles(db, query) for query in ["深度學習", "tml", "data", "神經網絡 python"]}
+    db.fts_enabled = False
+    for query, titles in fts_results.items():
+        assert sorted(titles) == sorted(search_titles(db, query))
+
+def relevance(db: LearningResourcesDB, interests):
+    # 高優先級的無關資源佔滿補足名額，結果只能來自候選召回
+    for index in range(100, 110):
+        filler = make_resource(index, f"Unrelated topic {index}", "Nothing in common")
+        filler.priority_score = 5.0
+        db.add_learning_resource(filler)
+    resources = db.get_prioritized_resources(interests, limit=5, use_cache=False)
+    return {resource.id: resource.ai_relevance_score for resource in resources if resource.ai_relevance_score > 0}
+
+def test_prioritized_cjk_substring_candidates(db):
+    # 標題/描述0.5 + 學習成果0.3
+    assert relevance(db, ["神經網絡"]) == {"resource-1": pytest.approx(0.8)}
+
+def test_prioritized_short_interest_candidates(db):
+    assert relevance(db, ["ml"]) == {"resource-2": pytest.approx(0.5)}
+
+def test_prioritized_outcome_only_candidates(db):
+    db.add_learning_resource(make_resource(4, "Statistics", "Probability basics", [], ["理解貝葉斯推斷", "掌握貝葉斯模型"]))
+    assert relevance(db, ["貝葉斯"]) == {"resource-4": pytest.approx(0.6)}
+
+def test_prioritized_matches_full_scan(db):
+    interests = ["learning", "ml", "神經", "data", "web"]
+    expected = {}
+    for resource in db.get_all_resources(limit=100):
+        score = db.calculate_relevance_score(resource, interests)
+        if score > 0:
+            expected[resource.id] = pytest.approx(score)
+    assert relevance(db, interests) == expected
+
+@pytest.mark.parametrize("scan_ratio", [0.0, 1.0])
+def test_prioritized_ranks_all_candidates(db, scan_ratio):
+    # 超過舊的20000候選上限：大量高優先級的弱匹配不能擠掉低優先級的強匹配（分別走全表掃描和候選召回）
+    db.PRIORITIZED_SCAN_RATIO = scan_ratio
+    with db.transaction() as cursor:
+        cursor.execute('''
+            WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 25000)
+            INSERT INTO learning_resources (id, title, description, url, resource_type, difficulty,
+                                            hashtags, learning_outcomes, status, priority_score)
+            SELECT 'weak-' || i, 'Kotlin notes ' || i, '', 'https://weak.test/' || i, 'course', 1,
+                   '[]', '[]', 'active', 5.0
+            FROM n
+        ''')
+    strong = make_resource(50, "Kotlin coroutines", "Structured concurrency", ["kotlin"], ["write kotlin flows"])
+    strong.priority_score = 0.1
+    db.add_learning_resource(strong)
+    
+    resources = db.get_prioritized_resources(["kotlin"], limit=3, use_cache=False)
+    assert resources[0].id == "resource-50"
+    assert resources[0].ai_relevance_score == pytest.approx(1.8)
+    assert [resource.ai_relevance_score for resource in resources[1:]] == [pytest.approx(0.5)] * 2
+
+def test_vector_index_persists_without_rebuild(tmp_path, monkeypatch):
+    pytest.importorskip("numpy")
+    from vector_index import ResourceVectorIndex
+    path = str(tmp_path / "resources.db")
+    first = LearningResourcesDB(path)
+    first.add_learning_resource(make_resource(1, "Kubernetes operators", "Cluster automation"))
+    first.get_vector_index()
+    first.add_learning_resource(make_resource(2, "Rust ownership", "Borrow checker in depth"))
+    first.save_vector_index()
+    assert [name for name in os.listdir(tmp_path) if name.endswith(".tmp")] == []
+    
+    def fail_rebuild(*args, **kwargs):
+        raise AssertionError("向量索引不應重建")
+    monkeypatch.setattr(ResourceVectorIndex, "rebuild", fail_rebuild)
+    restarted = LearningResourcesDB(path)
+    hits = restarted.vector_search("rust ownership", min_similarity=0.3)
+    assert hits[0][0].id == "resource-2"
+    first.close()
+    restarted.close()
+
+@pytest.fixture
+def workers(tmp_path):
+    # 同一數據庫文件上的兩個實例，模擬兩個worker進程
+    path = str(tmp_path / "shared.db")
+    worker_a, worker_b = ExtendedLearningResourcesDB(path), ExtendedLearningResourcesDB(path)
+    yield worker_a, worker_b
+    worker_a.close()
+    worker_b.close()
+
+def test_lookup_cache_sees_other_worker_writes(workers):
+    worker_a, worker_b = workers
+    worker_a.add_learning_resource(make_resource(1, "Old title", "Intro"))
+    assert worker_b.get_learning_resource("resource-1").title == "Old title"
+    
+    resource = worker_a.get_learning_resource("resource-1")
+    resource.title = "New title"
+    assert worker_a.update_learning_resource(resource)
+    assert worker_b.get_learning_resource("resource-1").title == "New title"
+    
+    assert worker_a.delete_learning_resource("resource-1")
+    assert worker_b.get_learning_resource("resource-1") is None
+
+def test_lookup_cache_invalidates_per_key(workers):
+    worker_a, worker_b = workers
+    worker_a.add_learning_resource(make_resource(1, "Cached title", "Intro"))
+    for index in (1, 2):
+        worker_a.add_contributor(Contributor(id=f"contributor-{index}", name=f"User {index}",
+                                             email=f"user{index}@example.com", expertise_areas=[]))
+    worker_b.get_learning_resource("resource-1")
+    worker_b.get_contributor_by_email("user2@example.com")
+    assert worker_b.get_contributor("contributor-1").last_active == ""
+    
+    # 登錄更新last_active只使該貢獻者的條目失效
+    assert worker_a.update_contributor_last_active("contributor-1")
+    hits = worker_b.get_cache_stats()
+    assert worker_b.get_contributor("contributor-1").last_active != ""
+    assert worker_b.get_contributor_by_email("user2@example.com").id == "contributor-2"
+    assert worker_b.get_learning_resource("resource-1").title == "Cached title"
+    stats = worker_b.get_cache_stats()
+    assert stats["resources"]["hits"] == hits["resources"]["hits"] + 1
+    # contributor-1重新加載；郵箱映射和contributor-2均命中
+    assert stats["contributors"]["hits"] == hits["contributors"]["hits"] + 2
+    assert stats["contributors"]["misses"] == hits["contributors"]["misses"] + 1
+
+def test_lookup_cache_clears_after_truncated_log(workers):
+    worker_a, worker_b = workers
+    worker_a.add_learning_resource(make_resource(1, "Old title", "Intro"))
+    worker_a.add_learning_resource(make_resource(2, "Other", "Intro"))
+    assert worker_b.get_learning_resource("resource-1").title == "Old title"
+    
+    resource = worker_a.get_learning_resource("resource-1")
+    resource.title = "New title"
+    assert worker_a.update_learning_resource(resource)
+    # 其他寫入把resource-1的失效記錄擠出日誌
+    for _ in range(worker_a.LOOKUP_INVALIDATION_LOG_SIZE):
+        worker_a.update_resource_priority("resource-2", 2.0)
+    assert worker_b.get_learning_resource("resource-1").title == "New title"
+
+def test_vector_index_sees_other_worker_writes(workers):
+    pytest.importorskip("numpy")
+    worker_a, worker_b = workers
+    
+    def top_hit(query):
+        hits = worker_b.vector_search(query, min_similarity=0.3)
+        return hits[0][0].id if hits else None
+    
+    worker_a.add_learning_resource(make_resource(1, "Kubernetes operators", "Cluster automation"))
+    assert top_hit("kubernetes operators") == "resource-1"
+    
+    worker_a.add_learning_resource(make_resource(2, "Rust ownership", "Borrow checker in depth"))
+    resource = worker_a.get_learning_resource("resource-1")
+    resource.title, resource.description = "Terraform modules", "Infrastructure as code"
+    worker_a.update_learning_resource(resource)
+    assert top_hit("rust ownership borrow checker") == "resource-2"
+    assert top_hit("terraform modules") == "resource-1"
+    assert top_hit("kubernetes operators") is None
+    
+    worker_a.delete_learning_resource("resource-2")
+    assert top_hit("rust ownership borrow checker") is None
+    assert "resource-2" not in worker_b.get_vector_index()._positions
+
+def test_bulk_reimport_updates_revision(workers):
+    worker_a, worker_b = workers
+    item = {"title": "Kubernetes operators", "url": "https://resources.test/k8s", "resource_type": "course", "difficulty": 1}
+    first = worker_a.add_learning_resources_bulk([item])
+    second = worker_a.add_learning_resources_bulk([dict(item, title="Terraform modules")])
+    assert [outcome["status"] for outcome in first + second] == ["inserted", "updated"]
+    assert second[0]["id"] == first[0]["id"]
+    assert worker_b.get_learning_resource(first[0]["id"]).title == "Terraform modules"
+    if worker_b.get_vector_index() is not None:
+        hits = worker_b.vector_search("terraform modules", min_similarity=0.3)
+        assert [resource.id for resource, _ in hits] == [first[0]["id"]]
+
+def bulk_item(url: str, **fields):
+    return dict({"title": "Imported", "url": url, "resource_type": "course", "difficulty": 1}, **fields)
+
+def test_bulk_import_inserts_and_reimports(db):
+    first = db.add_learning_resources_bulk([bulk_item("https://bulk.test/1"), bulk_item("https://bulk.test/2")])
+    assert [outcome["status"] for outcome in first] == ["inserted", "inserted"]
+    
+    second = db.add_learning_resources_bulk([bulk_item("https://bulk.test/1", title="Renamed")])
+    assert second[0]["status"] == "updated"
+    assert second[0]["id"] == first[0]["id"]
+    assert db.get_learning_resource(first[0]["id"]).title == "Renamed"
+
+def test_bulk_import_duplicate_url_in_batch(db):
+    outcomes = db.add_learning_resources_bulk([
+        bulk_item("https://bulk.test/dup", title="First"),
+        bulk_item("https://bulk.test/dup", title="Second"),
+    ])
+    assert [outcome["status"] for outcome in outcomes] == ["inserted", "updated"]
+    assert outcomes[0]["id"] == outcomes[1]["id"]
+    assert db.get_learning_resource(outcomes[0]["id"]).title == "Second"
+
+def test_bulk_import_case_duplicate_hashtags(db):
+    item = bulk_item("https://bulk.test/tags", hashtags=["Python", "python"])
+    outcomes = db.add_learning_resources_bulk([item, dict(item, hashtags=["Pandas", "PANDAS", "python"])])
+    assert [outcome["status"] for outcome in outcomes] == ["inserted", "updated"]
+    assert [resource.id for resource in db.search_resources_by_hashtags(["pandas"])] == [outcomes[0]["id"]]
+
+def test_bulk_import_reports_errors_per_row(db):
+    outcomes = db.add_learning_resources_bulk([
+        bulk_item("https://bulk.test/a", id="fixed-id"),
+        '{"title": "missing url"}',
+        "not json",
+        "",
+        bulk_item("https://bulk.test/b", id="fixed-id"),
+        bulk_item("https://bulk.test/c"),
+    ], batch_size=3)
+    assert [(outcome["index"], outcome["status"]) for outcome in outcomes] == [
+        (0, "inserted"), (1, "error"), (2, "error"), (4, "error"), (5, "inserted")
+    ]
+    assert "learning_resources.id" in outcomes[3]["message"]
+    assert db.get_learning_resource("fixed-id").url == "https://bulk.test/a"
+    assert db.get_learning_resource(outcomes[4]["id"]) is not None
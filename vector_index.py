@@ -0,0 +1,259 @@
+"""
+Local Vector Index
+本地向量索引
+
+基於哈希字符n-gram的TF-IDF向量，完全離線運行：
+1. 文本向量化（字符n-gram + 詞，哈希到固定維度）
+2. float32矩陣與ID列表一起存儲在數據庫旁的單個文件中
+3. 向量化矩陣乘法計算餘弦相似度，返回top-k
+4. 支持按資源增量更新和刪除
+"""
+
+import json
+import os
+import re
+import tempfile
+import threading
+import zipfile
+import zlib
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # NumPy不可用時向量索引停用
+    np = None
+
+NUMPY_AVAILABLE = np is not None
+
+class HashedNgramVectorizer:
+    """將文本哈希為固定維度的詞頻向量"""
+    
+    # 詞到哈希桶列表的緩存上限（詞彙在目錄中大量重複）
+    MAX_CACHED_WORDS = 200000
+    
+    def __init__(self, dim: int = 512, ngram_range: Tuple[int, int] = (2, 4)):
+        self.dim = dim
+        self.ngram_range = ngram_range
+        self._word_cache: Dict[str, List[int]] = {}
+    
+    def word_buckets(self, word: str) -> List[int]:
+        """一個詞的特徵桶：完整的詞，以及帶邊界標記的字符n-gram"""
+        buckets = self._word_cache.get(word)
+        if buckets is not None:
+            return buckets
+        
+        features = ["w:" + word]
+        padded = f"<{word}>"
+        min_n, max_n = self.ngram_range
+        for n in range(min_n, max_n + 1):
+            features.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+        # crc32在進程之間穩定，內置hash()則帶隨機種子
+        buckets = [zlib.crc32(feature.encode("utf-8")) % self.dim for feature in features]
+        
+        if len(self._word_cache) >= self.MAX_CACHED_WORDS:
+            self._word_cache.clear()
+        self._word_cache[word] = buckets
+        return buckets
+    
+    def transform(self, text: str) -> "np.ndarray":
+        """返回次線性詞頻（1 + log tf）向量"""
+        buckets: List[int] = []
+        weights: List[int] = []
+        for word, count in Counter(re.findall(r'\w+', text.lower())).items():
+            word_buckets = self.word_buckets(word)
+            buckets.extend(word_buckets)
+            weights.extend([count] * len(word_buckets))
+        
+        tf = np.bincount(buckets, weights, minlength=self.dim) if buckets else np.zeros(self.dim)
+        nonzero = tf > 0
+        tf[nonzero] = 1.0 + np.log(tf[nonzero])
+        return tf.astype(np.float32)
+
+class ResourceVectorIndex:
+    """資源向量索引
+    
+    矩陣保存原始詞頻，IDF在查詢時根據當前文檔頻率套用，
+    因此增量更新不需要重算已有向量。
+    """
+    
+    def __init__(self, path: Optional[str] = None, dim: int = 512):
+        if not NUMPY_AVAILABLE:
+            raise RuntimeError("向量索引需要NumPy")
+        self.path = path
+        self.vectorizer = HashedNgramVectorizer(dim)
+        self.dim = dim
+        self.signature: Optional[List] = None
+        self.revision = 0  # 已應用的數據庫資源修訂號，由LearningResourcesDB維護
+        self._lock = threading.RLock()
+        self._matrix = np.zeros((0, dim), dtype=np.float32)
+        self._size = 0
+        self._ids: List[str] = []
+        self._positions: Dict[str, int] = {}
+        self._doc_freq = np.zeros(dim, dtype=np.float64)
+        self._weighted_norms: Optional["np.ndarray"] = None  # 寫入後失效，查詢時重算
+        self.dirty = False
+    
+    def __len__(self):
+        return self._size
+    
+    # ---------- 寫入 ----------
+    
+    def upsert(self, resource_id: str, text: str):
+        """添加或替換一個資源的向量"""
+        vector = self.vectorizer.transform(text)
+        with self._lock:
+            position = self._positions.get(resource_id)
+            if position is None:
+                self._ensure_capacity(self._size + 1)
+                position = self._size
+                self._size += 1
+                self._ids.append(resource_id)
+                self._positions[resource_id] = position
+            else:
+                self._doc_freq -= self._matrix[position] > 0
+            self._matrix[position] = vector
+            self._doc_freq += vector > 0
+            self._weighted_norms = None
+            self.dirty = True
+    
+    def remove(self, resource_id: str) -> bool:
+        """刪除一個資源的向量（與最後一行交換後截斷）"""
+        with self._lock:
+            position = self._positions.pop(resource_id, None)
+            if position is None:
+                return False
+            self._doc_freq -= self._matrix[position] > 0
+            last = self._size - 1
+            if position != last:
+                self._matrix[position] = self._matrix[last]
+                moved_id = self._ids[last]
+                self._ids[position] = moved_id
+                self._positions[moved_id] = position
+            self._ids.pop()
+            self._matrix[last] = 0
+            self._size = last
+            self._weighted_norms = None
+            self.dirty = True
+            return True
+    
+    def rebuild(self, documents: Iterable[Tuple[str, str]], signature: Optional[List] = None):
+        """從(資源ID, 文本)序列重建整個索引"""
+        with self._lock:
+            self._matrix = np.zeros((0, self.dim), dtype=np.float32)
+            self._size = 0
+            self._ids = []
+            self._positions = {}
+            self._doc_freq = np.zeros(self.dim, dtype=np.float64)
+            for resource_id, text in documents:
+                self.upsert(resource_id, text)
+            self.signature = signature
+            self.dirty = True
+    
+    def _ensure_capacity(self, size: int):
+        """按倍數擴容矩陣，使追加為均攤O(dim)"""
+        capacity = self._matrix.shape[0]
+        if size <= capacity:
+            return
+        new_capacity = max(size, capacity * 2, 64)
+        matrix = np.zeros((new_capacity, self.dim), dtype=np.float32)
+        matrix[:self._size] = self._matrix[:self._size]
+        self._matrix = matrix
+    
+    # ---------- 查詢 ----------
+    
+    def search(self, text: str, k: int = 10, min_similarity: float = 0.0) -> List[Tuple[str, float]]:
+        """返回與文本餘弦相似度最高的k個(資源ID, 相似度)"""
+        query = self.vectorizer.transform(text)
+        with self._lock:
+            if self._size == 0 or not query.any():
+                return []
+            
+            idf = self._idf()
+            weighted_query = query * idf
+            query_norm = float(np.linalg.norm(weighted_query))
+            if query_norm == 0.0:
+                return []
+            
+            matrix = self._matrix[:self._size]
+            if self._weighted_norms is None:
+                # ||d ∘ idf|| = sqrt((d²) · idf²)
+                self._weighted_norms = np.sqrt(np.square(matrix) @ np.square(idf).astype(np.float32))
+            norms = self._weighted_norms
+            
+            scores = matrix @ (weighted_query * idf).astype(np.float32)
+            scores /= np.maximum(norms, 1e-12) * query_norm
+            
+            k = min(k, self._size)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [
+                (self._ids[i], float(scores[i]))
+                for i in top
+                if scores[i] > min_similarity
+            ]
+    
+    def _idf(self) -> "np.ndarray":
+        """平滑IDF：log((1 + N) / (1 + df)) + 1"""
+        return (np.log((1.0 + self._size) / (1.0 + self._doc_freq)) + 1.0).astype(np.float32)
+    
+    # ---------- 持久化 ----------
+    
+    def save(self):
+        """將矩陣、ID列表和修訂號寫入同一個文件
+        
+        先寫入唯一命名的臨時文件再原子替換：多個worker同時保存時互不覆蓋臨時文件，
+        讀者只會看到某一次完整保存的矩陣和ID列表。
+        """
+        if not self.path:
+            return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        with self._lock:
+            meta = {"dim": self.dim, "ids": self._ids, "signature": self.signature, "revision": self.revision}
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(self.path) + ".", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    np.savez(f, matrix=self._matrix[:self._size], meta=np.array(json.dumps(meta)))
+                os.replace(tmp_path, self.path + ".npz")
+            except BaseException:
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
+                raise
+            self.dirty = False
+    
+    def stored_meta(self) -> Optional[Dict]:
+        """讀取已保存文件的元數據（不載入矩陣）；文件不存在或損壞時返回None"""
+        if not self.path:
+            return None
+        try:
+            with np.load(self.path + ".npz", allow_pickle=False) as data:
+                return json.loads(str(data["meta"]))
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            return None
+    
+    def load(self) -> bool:
+        """從文件載入索引（含保存時已應用的修訂號）；文件不存在、損壞或維度不符時返回False"""
+        if not self.path:
+            return False
+        try:
+            with np.load(self.path + ".npz", allow_pickle=False) as data:
+                meta = json.loads(str(data["meta"]))
+                matrix = data["matrix"]
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            return False
+        if meta.get("dim") != self.dim or matrix.shape != (len(meta["ids"]), self.dim):
+            return False
+        
+        with self._lock:
+            self._matrix = matrix.astype(np.float32, copy=False)
+            self._size = matrix.shape[0]
+            self._ids = list(meta["ids"])
+            self._positions = {resource_id: i for i, resource_id in enumerate(self._ids)}
+            self._doc_freq = (self._matrix > 0).sum(axis=0).astype(np.float64)
+            self._weighted_norms = None
+            self.signature = meta.get("signature")
+            self.revision = meta.get("revision", 0)
+            self.dirty = False
+        return True